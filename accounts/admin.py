@@ -1,6 +1,6 @@
 from django.contrib import admin
-from django.utils.html import format_html
-from .models import Event, Round, Question, QuestionOption, CandidateEntry, CodeSubmission, CodingQuestion, TestCase, DubbingQuestion, DubbingTestCase
+from django.utils.html import format_html, format_html_join
+from .models import Event, Round, Question, QuestionOption, CandidateEntry, CodeSubmission, CodingQuestion, TestCase, DubbingQuestion, DubbingTestCase, GradingJob, QuestionTask
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
@@ -9,11 +9,36 @@ class EventAdmin(admin.ModelAdmin):
     list_filter = ('date', 'created_at')
     ordering = ('-created_at',)
 
+def _rescore_mcq(modeladmin, request, queryset, dry_run):
+    from .mcq import rescore_round
+
+    for round_obj in queryset:
+        changes, skipped = rescore_round(round_obj.id, dry_run=dry_run)
+        summary = ', '.join(f'{c.candidate} {c.old_score}/{c.old_total}→{c.new_score}/{c.new_total}' for c in changes[:20])
+        if len(changes) > 20:
+            summary += f' and {len(changes) - 20} more'
+        verb = 'would change' if dry_run else 'changed'
+        modeladmin.message_user(
+            request,
+            f'{round_obj}: {len(changes)} MCQ score(s) {verb}, {skipped} candidate(s) skipped'
+            + (f': {summary}' if summary else ''),
+        )
+
+@admin.action(description='Rescore MCQ answers against the current answer key')
+def rescore_mcq(modeladmin, request, queryset):
+    _rescore_mcq(modeladmin, request, queryset, dry_run=False)
+
+@admin.action(description='Rescore MCQ answers (dry run: show score changes only)')
+def rescore_mcq_dry_run(modeladmin, request, queryset):
+    _rescore_mcq(modeladmin, request, queryset, dry_run=True)
+
 @admin.register(Round)
 class RoundAdmin(admin.ModelAdmin):
     list_display = ('event', 'round_number', 'duration_minutes', 'created_at')
     search_fields = ('event__name',)
     list_filter = ('event', 'round_number')
+    readonly_fields = ('content_version',)
+    actions = [rescore_mcq_dry_run, rescore_mcq]
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
@@ -27,23 +52,52 @@ class QuestionOptionAdmin(admin.ModelAdmin):
     search_fields = ('question__question_text', 'option_text')
     list_filter = ('question__round__event', 'is_correct')
 
+def _schedule(modeladmin, request, queryset, kind):
+    """Queue a QuestionTask per selected question for the grade worker (see question_tasks.py)"""
+    from .question_tasks import schedule
+
+    question_type = 'coding' if queryset.model is CodingQuestion else 'dubbing'
+    queued = schedule(kind, question_type, list(queryset.values_list('id', flat=True)), request.user.get_username())
+    modeladmin.message_user(
+        request,
+        f'{queued} task(s) queued. The grade worker runs them; see Question tasks for the results.',
+    )
+
+@admin.action(description='Calibrate limits from the reference solution')
+def calibrate_limits(modeladmin, request, queryset):
+    _schedule(modeladmin, request, queryset, QuestionTask.KIND_CALIBRATE)
+
+@admin.action(description='Regrade submissions against the current test cases')
+def regrade_submissions(modeladmin, request, queryset):
+    _schedule(modeladmin, request, queryset, QuestionTask.KIND_REGRADE)
+
+@admin.action(description='Regrade submissions (dry run: show score changes only)')
+def regrade_submissions_dry_run(modeladmin, request, queryset):
+    _schedule(modeladmin, request, queryset, QuestionTask.KIND_REGRADE_DRY_RUN)
+
 @admin.register(CodingQuestion)
 class CodingQuestionAdmin(admin.ModelAdmin):
-    list_display = ('id', 'round', 'title', 'created_at')
+    list_display = ('id', 'round', 'title', 'time_limit_ms', 'memory_limit_mb', 'created_at')
     search_fields = ('title', 'round__event__name')
+    readonly_fields = ('reference_cpu_ms', 'calibrated_at')
+    actions = [calibrate_limits, regrade_submissions_dry_run, regrade_submissions]
 
 @admin.register(TestCase)
 class TestCaseAdmin(admin.ModelAdmin):
-    list_display = ('id', 'coding_question', 'order')
+    list_display = ('id', 'coding_question', 'order', 'is_sample')
+    list_filter = ('is_sample',)
 
 @admin.register(DubbingQuestion)
 class DubbingQuestionAdmin(admin.ModelAdmin):
-    list_display = ('id', 'round', 'title', 'language', 'created_at')
+    list_display = ('id', 'round', 'title', 'language', 'time_limit_ms', 'memory_limit_mb', 'created_at')
     search_fields = ('title', 'round__event__name')
+    readonly_fields = ('reference_cpu_ms', 'calibrated_at')
+    actions = [calibrate_limits, regrade_submissions_dry_run, regrade_submissions]
 
 @admin.register(DubbingTestCase)
 class DubbingTestCaseAdmin(admin.ModelAdmin):
-    list_display = ('id', 'dubbing_question', 'order')
+    list_display = ('id', 'dubbing_question', 'order', 'is_sample')
+    list_filter = ('is_sample',)
 
 @admin.register(CandidateEntry)
 class CandidateEntryAdmin(admin.ModelAdmin):
@@ -147,10 +201,15 @@ class CandidateEntryAdmin(admin.ModelAdmin):
 
 @admin.register(CodeSubmission)
 class CodeSubmissionAdmin(admin.ModelAdmin):
-    list_display = ('candidate', 'question_title', 'question_type', 'display_score_breakdown', 'total_score', 'submitted_at')
+    list_display = (
+        'candidate', 'question_title', 'question_type', 'display_score_breakdown', 'display_verdicts', 'total_score',
+        'submitted_at',
+    )
     search_fields = ('candidate__candidate_name', 'question_title', 'question_type')
     list_filter = ('question_type', 'submitted_at', 'output_success', 'time_limit_met')
-    readonly_fields = ('candidate', 'question_type', 'question_id', 'submitted_at', 'code', 'display_scoring_info')
+    readonly_fields = (
+        'candidate', 'question_type', 'question_id', 'submitted_at', 'code', 'display_scoring_info', 'display_case_results'
+    )
     fieldsets = (
         ('Submission Details', {
             'fields': ('candidate', 'question_type', 'question_id', 'question_title', 'language')
@@ -160,10 +219,10 @@ class CodeSubmissionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Test Case Results', {
-            'fields': ('passed_test_cases', 'total_test_cases')
+            'fields': ('passed_test_cases', 'total_test_cases', 'display_case_results')
         }),
         ('Execution Results', {
-            'fields': ('output_success', 'execution_time_ms', 'time_limit_met')
+            'fields': ('output_success', 'execution_time_ms', 'cpu_time_ms', 'peak_memory_kb', 'time_limit_met')
         }),
         ('Scoring Details', {
             'fields': ('testcase_score', 'output_score', 'efficiency_score', 'total_score', 'display_scoring_info'),
@@ -182,6 +241,28 @@ class CodeSubmissionAdmin(admin.ModelAdmin):
             obj.efficiency_score
         )
     display_score_breakdown.short_description = "Score Breakdown"
+
+    def display_verdicts(self, obj):
+        from .execution.verdicts import LABELS, unpack
+
+        return ' '.join(LABELS.get(code, '?') for code, _ in unpack(obj.case_verdicts, obj.case_cpu_us)) or '—'
+    display_verdicts.short_description = "Verdicts"
+
+    def display_case_results(self, obj):
+        from .execution.verdicts import ACCEPTED, LABELS, NOT_RUN, unpack
+
+        cases = unpack(obj.case_verdicts, obj.case_cpu_us)
+        if not cases:
+            return '—'
+        colours = {ACCEPTED: '#15803d', NOT_RUN: '#94a3b8'}
+        return format_html(
+            '<table style="font-family: monospace;"><tr><th>#</th><th>Verdict</th><th>CPU</th></tr>{}</table>',
+            format_html_join('', '<tr><td>{}</td><td style="color: {}; font-weight: bold;">{}</td><td>{}</td></tr>', (
+                (i, colours.get(code, '#b91c1c'), LABELS.get(code, '?'), f'{cpu_ms:.1f} ms' if cpu_ms is not None else '')
+                for i, (code, cpu_ms) in enumerate(cases, 1)
+            )),
+        )
+    display_case_results.short_description = "Per-case Results"
     
     def display_scoring_info(self, obj):
         return format_html(
@@ -199,3 +280,23 @@ class CodeSubmissionAdmin(admin.ModelAdmin):
             obj.total_score
         )
     display_scoring_info.short_description = "Scoring Breakdown"
+
+
+@admin.register(GradingJob)
+class GradingJobAdmin(admin.ModelAdmin):
+    list_display = ('candidate', 'status', 'attempts', 'locked_by', 'created_at', 'finished_at')
+    search_fields = ('candidate__candidate_name',)
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('candidate', 'payload', 'result', 'error', 'attempts', 'locked_by', 'locked_until',
+                       'created_at', 'started_at', 'finished_at')
+
+
+@admin.register(QuestionTask)
+class QuestionTaskAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'result', 'error', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status', 'created_at')
+    readonly_fields = ('kind', 'question_type', 'question_id', 'requested_by', 'status', 'attempts', 'locked_by',
+                       'locked_until', 'result', 'error', 'created_at', 'started_at', 'finished_at')
+
+    def has_add_permission(self, request):
+        return False   # queued from the question admin's actions
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     name = 'accounts'
+
+    def ready(self):
+        # Find compilers/runtimes once per process instead of on every request
+        from .execution import toolchains
+        toolchains.resolve()
+        from . import signals  # noqa: F401  (bumps Round.content_version for cached grading bundles)
+        from . import checks  # noqa: F401  (warns about missing toolchains)
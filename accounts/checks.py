@@ -0,0 +1,22 @@
+"""
+System checks for the accounts app.
+
+Run by manage.py commands (check, migrate, runserver, grade_worker), so a
+host that cannot compile or run a language is reported when it is deployed
+or started, not again by every web worker process.
+"""
+from django.core.checks import Warning, register
+
+
+@register()
+def toolchains_check(app_configs, **kwargs):
+    from .execution.toolchains import get_registry
+
+    missing = [tc.label for tc in get_registry().toolchains.values() if not tc.available]
+    if not missing:
+        return []
+    return [Warning(
+        f'Toolchains not available on this host: {", ".join(missing)}',
+        hint='Candidates will not be offered these languages, and answers in them cannot be graded.',
+        id='accounts.W001',
+    )]
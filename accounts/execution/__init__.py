@@ -0,0 +1,4 @@
+"""
+Code execution shared by the Run button (run_code) and final grading (submit_quiz):
+executor.py is the entry point, runners.py holds the per-language parts
+"""
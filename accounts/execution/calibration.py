@@ -0,0 +1,238 @@
+"""
+Per-question time and memory limits calibrated from a reference solution.
+
+Every question used to get the same limits: EXECUTION_RUN_TIMEOUT per case,
+EXECUTION_MEMORY_LIMIT_MB, and a 1000 ms average CPU time for the efficiency
+marks, whatever the problem and however fast the host.  A question with a
+reference solution can instead be calibrated (`manage.py calibrate_limits`, or
+the admin action, which queues it for the grade worker): the reference is
+built with the grading profile and run against every test case a few times
+on this host, and the question stores
+
+  time_limit_ms    CPU time a case may take: the reference's slowest case
+                   times CALIBRATION_TIME_MULTIPLIER (at least
+                   CALIBRATION_MIN_TIME_MS)
+  memory_limit_mb  the reference's peak RSS times
+                   CALIBRATION_MEMORY_MULTIPLIER (at least
+                   CALIBRATION_MIN_MEMORY_MB), kept only if the reference
+                   still passes under it (RLIMIT_AS counts address space,
+                   not RSS)
+  reference_cpu_ms the reference's average CPU time per case; twice that is
+                   the efficiency target
+
+Most questions are small, so most wrong answers that loop forever are now
+killed within a fraction of a second instead of after the full timeout.
+The wall-clock timeout of a case is derived from its CPU limit with room for
+a busy host, and a case whose CPU time exceeds the limit counts as a Time
+Limit Exceeded even if it finished.
+
+CPU times are those of the program's own code: Java's are measured without
+the JVM's start-up whichever way it runs (see java_harness), so the same
+limits hold with and without the harness.
+
+Limits are measured in the reference's language and scaled for the others by
+CALIBRATION_LANGUAGE_FACTORS (e.g. Python gets several times C's limit).
+The memory limit only applies to the reference's own language, since peak
+memory does not scale across runtimes.  Uncalibrated questions keep the
+defaults.  Calibrate again after moving to different hardware.
+
+The reference also checks test cases when a question is authored:
+reference_outputs runs it on every input in parallel, so blank expected
+outputs can be filled in and typed ones compared with what it prints.
+"""
+import logging
+import math
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .compile_cache import GRADING
+from .executor import get_executor, run_timeout
+from .grading import TIME_LIMIT_MS, _scheduled, case_record, get_pool, normalize, run_batch, run_case
+from .scheduler import grading_slot
+from .workspaces import workspace
+
+logger = logging.getLogger(__name__)
+
+RUNS = 3                    # times the reference runs every case; the slowest run counts
+TIME_MULTIPLIER = 3
+MIN_TIME_MS = 250
+MEMORY_MULTIPLIER = 4
+MIN_MEMORY_MB = 128
+EFFICIENCY_MULTIPLIER = 2
+MIN_EFFICIENCY_MS = 100
+WALL_FACTOR = 2             # wall-clock timeout = CPU limit * WALL_FACTOR + WALL_SLACK
+WALL_SLACK = 1.0            # seconds, for process start-up and a busy host
+LANGUAGE_FACTORS = {'c': 1.0, 'java': 1.5, 'python': 5.0}
+
+# What a question's submissions run under: wall-clock timeout (seconds), CPU
+# limit per case (seconds, None for no limit besides the timeout), memory limit
+# (MB, None for EXECUTION_MEMORY_LIMIT_MB) and the average CPU ms per case
+# needed for the efficiency marks
+Limits = namedtuple('Limits', 'timeout cpu_limit memory_mb target_ms')
+
+
+class CalibrationError(Exception):
+    """The question cannot be calibrated (no reference, or the reference fails)"""
+
+
+def _setting(name, default):
+    return getattr(settings, f'CALIBRATION_{name}', None) or default
+
+
+def reference_language(question):
+    """Language of the question's reference solution (a dubbing question's own language by default)"""
+    return question.reference_language or getattr(question, 'language', '') or 'python'
+
+
+def _language_factor(language, reference):
+    factors = _setting('LANGUAGE_FACTORS', LANGUAGE_FACTORS)
+    return factors.get(language, 1.0) / factors.get(reference, 1.0)
+
+
+def default_limits():
+    return Limits(run_timeout(), None, None, TIME_LIMIT_MS)
+
+
+def question_limits(question, language):
+    """Limits for a submission to `question` in `language` (the defaults if it is not calibrated)"""
+    if question is None:
+        return default_limits()
+    reference = reference_language(question)
+    factor = _language_factor(language, reference)
+    timeout, cpu_limit, target_ms = run_timeout(), None, TIME_LIMIT_MS
+    # The floors apply after scaling, so a slow reference language does not squeeze the fast ones
+    if question.time_limit_ms:
+        cpu_limit = max(_setting('MIN_TIME_MS', MIN_TIME_MS), question.time_limit_ms * factor) / 1000
+        timeout = min(timeout, round(cpu_limit * WALL_FACTOR + WALL_SLACK, 2))
+    if question.reference_cpu_ms:
+        target_ms = max(
+            _setting('MIN_EFFICIENCY_MS', MIN_EFFICIENCY_MS),
+            question.reference_cpu_ms * _setting('EFFICIENCY_MULTIPLIER', EFFICIENCY_MULTIPLIER) * factor,
+        )
+    memory_mb = question.memory_limit_mb if language == reference else None
+    return Limits(timeout, cpu_limit, memory_mb, target_ms)
+
+
+def _run_all(executor, prepared, test_cases, limits):
+    """Case records of one pass of the reference over every test case"""
+    inputs = [normalize(tc.input_data) for tc in test_cases]
+    expected = [tc.expected_output for tc in test_cases]
+    if limits.memory_mb:
+        prepared = prepared._replace(memory_mb=limits.memory_mb)
+    with grading_slot():
+        if executor.batches(prepared):
+            runs = run_batch(executor, prepared, inputs, limits.timeout, expected, cpu_limit=limits.cpu_limit)
+        else:
+            runs = [
+                run_case(executor, prepared, stdin, limits.timeout, tc.expected_output, cpu_limit=limits.cpu_limit)
+                for stdin, tc in zip(inputs, test_cases)
+            ]
+    return [case_record(run, tc) for run, tc in zip(runs, test_cases)]
+
+
+def _failures(records, test_cases):
+    return [tc.order for tc, record in zip(test_cases, records) if not record['passed']]
+
+
+def _describe_failure(run):
+    if run.returncode is None:
+        return 'Time Limit Exceeded'
+    return f'exit code {run.returncode}: {run.stderr.strip()[:200]}'
+
+
+def reference_outputs(code, language, inputs, executor=None):
+    """
+    Run a reference solution on every input, in parallel on the grading pool,
+    and return what it prints for each (stripped, newlines normalised).
+    Raises CalibrationError if it does not compile or any run fails.
+    """
+    executor = executor or get_executor()
+    inputs = [normalize(stdin) for stdin in inputs]
+    timeout = run_timeout()
+    with workspace() as tmp_dir:
+        prepared, error = _scheduled(executor.prepare, code, language, tmp_dir, GRADING)
+        if error:
+            raise CalibrationError(f'Reference solution does not compile:\n{error}')
+        if not inputs:
+            return []
+        if executor.batches(prepared):
+            runs = _scheduled(run_batch, executor, prepared, inputs, timeout)
+        else:
+            pool = get_pool()
+            runs = [
+                f.result() for f in
+                [pool.submit(_scheduled, run_case, executor, prepared, stdin, timeout) for stdin in inputs]
+            ]
+
+    failed = [(i, run) for i, run in enumerate(runs, 1) if run.returncode != 0 or run.aborted]
+    if failed:
+        i, run = failed[0]
+        raise CalibrationError(f'Reference solution failed on input {i} ({_describe_failure(run)})')
+    return [normalize(run.stdout.strip()) for run in runs]
+
+
+def calibrate(question, executor=None, runs=None):
+    """
+    Run the question's reference solution on this host and store the limits
+    derived from it on the question.  Returns the question's new Limits in
+    the reference language; raises CalibrationError.
+    """
+    code = question.reference_solution.strip()
+    if not code:
+        raise CalibrationError('No reference solution')
+    test_cases = list(question.test_cases.all())
+    if not test_cases:
+        raise CalibrationError('No test cases')
+    executor = executor or get_executor()
+    language = reference_language(question)
+    runs = runs or _setting('RUNS', RUNS)
+
+    with workspace() as tmp_dir:
+        with grading_slot():
+            prepared, error = executor.prepare(code, language, tmp_dir, GRADING)
+        if error:
+            raise CalibrationError(f'Reference solution does not compile:\n{error}')
+
+        # Measured under the default limits, so a stale calibration does not skew it
+        cpu_ms, peak_kb, total_ms = 0.0, 0, 0.0
+        for _ in range(runs):
+            records = _run_all(executor, prepared, test_cases, default_limits())
+            failed = _failures(records, test_cases)
+            if failed:
+                raise CalibrationError(f'Reference solution fails test case(s) {failed}')
+            cpu_ms = max(cpu_ms, max(record['cpu_time'] for record in records) * 1000)
+            peak_kb = max(peak_kb, max(record['peak_rss_kb'] for record in records))
+            total_ms = max(total_ms, sum(record['cpu_time'] for record in records) * 1000)
+
+        question.time_limit_ms = max(
+            _setting('MIN_TIME_MS', MIN_TIME_MS),
+            math.ceil(cpu_ms * _setting('TIME_MULTIPLIER', TIME_MULTIPLIER)),
+        )
+        question.memory_limit_mb = max(
+            _setting('MIN_MEMORY_MB', MIN_MEMORY_MB),
+            math.ceil(peak_kb / 1024 * _setting('MEMORY_MULTIPLIER', MEMORY_MULTIPLIER)),
+        )
+        question.reference_cpu_ms = round(total_ms / len(test_cases), 3)
+
+        # The reference itself must pass under its own limits
+        limits = question_limits(question, language)
+        failed = _failures(_run_all(executor, prepared, test_cases, limits), test_cases)
+        if failed:
+            logger.warning(
+                f'Reference solution of {question} fails test case(s) {failed} under '
+                f'{question.memory_limit_mb} MB; keeping the default memory limit'
+            )
+            question.memory_limit_mb = None
+            limits = question_limits(question, language)
+            failed = _failures(_run_all(executor, prepared, test_cases, limits), test_cases)
+            if failed:
+                raise CalibrationError(
+                    f'Reference solution fails test case(s) {failed} under its calibrated time limit; '
+                    f'the host may be too busy to calibrate'
+                )
+
+    question.calibrated_at = timezone.now()
+    question.save(update_fields=['time_limit_ms', 'memory_limit_mb', 'reference_cpu_ms', 'calibrated_at'])
+    return limits
@@ -0,0 +1,101 @@
+"""
+Cancelling Run previews nobody is waiting for any more.
+
+Candidates often press Run again before the previous run has finished, or
+leave the page while it runs.  Each Run carries a CancelToken claimed under
+(candidate, question): claiming writes the run's id to a small file in the
+scheduler's lock directory, so an earlier Run of the same question, in any
+web worker or exec_worker, sees a different id there and stops.  A client
+disconnect (only detectable under ASGI) cancels the token directly.
+
+Process runners poll the token while they wait on a program; once it is
+cancelled they kill the program's process group and raise Cancelled.
+Compiles are not interrupted: they are short and cached, so the Run that
+replaced this one usually reuses the build.
+"""
+import hashlib
+import os
+import threading
+import uuid
+
+from .scheduler import _lock_dir
+
+
+class Cancelled(Exception):
+    """The run was superseded by a newer one or its client went away"""
+
+
+def _read(path):
+    try:
+        with open(path, encoding='ascii') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _claim_path(key):
+    digest = hashlib.sha1(str(key).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(_lock_dir(), f'run-{digest}.current')
+
+
+def _write(path, content):
+    tmp = f'{path}.{uuid.uuid4().hex}'
+    with open(tmp, 'w', encoding='ascii') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+class CancelToken:
+    """Cancellation state of one execution; see the module docstring"""
+
+    def __init__(self, run_id=None, path=None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.path = path
+        self._cancelled = threading.Event()
+
+    def claim(self, key):
+        """Become the current run for `key`, cancelling whichever run held it before"""
+        self.path = _claim_path(key)
+        _write(self.path, self.run_id)
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.path and _read(self.path) == self.run_id:
+            _write(self.path, '')   # so a worker process running this for us stops too
+
+    def cancelled(self):
+        if self._cancelled.is_set():
+            return True
+        if self.path:
+            current = _read(self.path)
+            if current is not None and current != self.run_id:
+                self._cancelled.set()
+                return True
+        return False
+
+    def check(self):
+        """Raise Cancelled if the run has been cancelled"""
+        if self.cancelled():
+            raise Cancelled('Run cancelled')
+
+    def release(self):
+        """Forget the claim once the run is over"""
+        if self.path and _read(self.path) == self.run_id:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def dump(self):
+        return {'run_id': self.run_id, 'path': self.path}
+
+    @classmethod
+    def load(cls, data):
+        return cls(data['run_id'], data['path']) if data else None
+
+
+def cancel_key(key):
+    """Cancel whichever run currently holds `key`, if any"""
+    path = _claim_path(key)
+    if _read(path):
+        _write(path, '')
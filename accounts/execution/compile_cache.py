@@ -0,0 +1,255 @@
+"""
+Content-addressed cache of compiled C and Java artifacts.
+
+Candidates press Run many times on the same source before submitting, so
+recompiling every time is wasted work.  Each compile result (binary, class files
+or the compiler error) is stored in a directory named after
+sha256(language, toolchain version, source file name, source), shared by every
+web worker.  The cache is kept under a size budget by evicting the least
+recently used entries.
+
+Each compile uses a profile: 'preview' for Run (no optimisation, so it builds
+as fast as possible) and 'grading' for final scores (optimised, with fixed
+flags so every candidate's binary is built the same way and efficiency marks
+stay comparable).  The profile's flags are part of the cache key and are
+written to the entry's meta.json.
+
+Compilers run in a workspace from the execution pool (see workspaces.py), on
+tmpfs where the host has one, with their temporary files there too.  Only the
+finished entry is copied into the cache directory, which stays on disk so
+builds outlive restarts without taking the pool's RAM.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from .java_compiler import compile_java
+from .toolchains import LANGUAGES, get_registry, probe_version
+from .workspaces import workspace
+
+logger = logging.getLogger(__name__)
+
+ERROR_FILE = 'compile_error.txt'
+USED_MARKER = '.last_used'
+META_FILE = 'meta.json'
+
+PREVIEW = 'preview'
+GRADING = 'grading'
+
+# Entries used this recently are never evicted, so a binary cannot disappear mid-run
+EVICTION_GRACE_SECONDS = 120
+# The eviction scan walks the whole cache, so each worker runs it at most this often
+EVICTION_INTERVAL_SECONDS = 60
+
+COMPILERS = {
+    'c': {
+        'compile_cmd': lambda source, flags: ['gcc'] + flags + [source, '-o', 'solution.exe', '-lm'],
+        'missing': LANGUAGES['c']['missing'],
+        # No -march=native or similar: grading builds must not depend on which host compiled them
+        'profiles': {PREVIEW: ['-O0'], GRADING: ['-O2']},
+    },
+    'java': {
+        'compile_cmd': lambda source, flags: ['javac'] + flags + [source],
+        'missing': LANGUAGES['java']['missing'],
+        # javac has no optimisation levels (the JIT does that at run time)
+        'profiles': {PREVIEW: [], GRADING: []},
+    },
+}
+
+_versions = {}
+_versions_lock = threading.Lock()
+_last_eviction = 0.0
+
+
+def get_cache_dir():
+    return getattr(settings, 'COMPILE_CACHE_DIR', None) or os.path.join(tempfile.gettempdir(), 'quiz_compile_cache')
+
+
+def toolchain_version(language, env=None):
+    """
+    Version banner of a language's toolchain, or None if it is missing.
+    Comes from the toolchain registry unless a different environment is given.
+    """
+    registry = get_registry()
+    if env is None or env is registry.env:
+        toolchain = registry.get(language)
+        return toolchain.version if toolchain and toolchain.available else None
+
+    path = env.get('PATH', '')
+    with _versions_lock:
+        if (language, path) in _versions:
+            return _versions[(language, path)]
+    version = probe_version(language, env)
+    with _versions_lock:
+        _versions[(language, path)] = version
+    return version
+
+
+def compile_flags(language, profile=GRADING):
+    """
+    Compiler flags of a profile, from COMPILE_PROFILES if it overrides them.
+    Empty for languages that are not compiled.
+    """
+    if language not in COMPILERS:
+        return []
+    overrides = (getattr(settings, 'COMPILE_PROFILES', None) or {}).get(language, {})
+    if profile in overrides:
+        return list(overrides[profile])
+    return list(COMPILERS[language]['profiles'][profile])
+
+
+def _daemon_enabled(env):
+    # The server runs with the registry's environment, so other environments get a plain javac
+    return getattr(settings, 'JAVA_COMPILE_DAEMON_ENABLED', True) and env is get_registry().env
+
+
+def cache_key(language, version, source_name, code, flags=()):
+    h = hashlib.sha256()
+    for part in (language, version, ' '.join(flags), source_name, code):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _touch(entry_dir):
+    try:
+        os.utime(os.path.join(entry_dir, USED_MARKER))
+    except OSError:
+        pass
+
+
+def _read_entry(entry_dir):
+    """Return (artifact_dir, compile_error) for a cached entry"""
+    _touch(entry_dir)
+    error_path = os.path.join(entry_dir, ERROR_FILE)
+    if os.path.exists(error_path):
+        with open(error_path, encoding='utf-8') as f:
+            return None, f.read()
+    return entry_dir, None
+
+
+def compile_source(language, code, source_name, env=None, timeout=30, profile=GRADING, use_daemon=True):
+    """
+    Compile `code` (saved as `source_name`) with the given profile, or reuse a
+    previous build of the same source with the same flags.  Java goes through
+    the resident compile server (java_compiler.py) when `use_daemon` is set,
+    JAVA_COMPILE_DAEMON_ENABLED is on and `env` is the registry's.
+
+    Returns (artifact_dir, compile_error).  On success artifact_dir holds the
+    compiled output (solution.exe for C, .class files for Java); on failure it
+    is None and compile_error holds the compiler's stderr.  Raises
+    subprocess.TimeoutExpired if the compiler does not finish in time.
+    """
+    spec = COMPILERS[language]
+    version = toolchain_version(language, env)
+    if version is None:
+        return None, spec['missing']
+
+    flags = compile_flags(language, profile)
+    cache_dir = get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_dir = os.path.join(cache_dir, cache_key(language, version, source_name, code, flags))
+    if os.path.isdir(entry_dir):
+        return _read_entry(entry_dir)
+
+    staging = None
+    try:
+        # Build in a tmpfs workspace (compiler temporaries included); only the finished entry is written to the cache
+        with workspace() as build_dir:
+            with open(os.path.join(build_dir, source_name), 'w', encoding='utf-8') as f:
+                f.write(code)
+            try:
+                if language == 'java' and use_daemon and _daemon_enabled(env):
+                    comp = compile_java(build_dir, source_name, code, flags, timeout, env=env)
+                else:
+                    comp = subprocess.run(
+                        spec['compile_cmd'](source_name, flags),
+                        capture_output=True, text=True, timeout=timeout, cwd=build_dir,
+                        env=dict(env if env is not None else os.environ, TMPDIR=build_dir),
+                    )
+            except FileNotFoundError:
+                return None, spec['missing']
+            staging = os.path.join(cache_dir, f'.staging-{uuid.uuid4().hex}')
+            shutil.copytree(build_dir, staging)
+
+        if comp.returncode != 0:
+            with open(os.path.join(staging, ERROR_FILE), 'w', encoding='utf-8') as f:
+                f.write(comp.stderr)
+        with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'language': language, 'toolchain': version, 'profile': profile, 'flags': flags,
+                'compiled_at': time.time(),
+            }, f)
+        open(os.path.join(staging, USED_MARKER), 'w').close()
+
+        try:
+            os.rename(staging, entry_dir)
+        except OSError:
+            pass  # another worker stored the same build first
+        else:
+            staging = None
+            _evict(cache_dir)
+        return _read_entry(entry_dir)
+    finally:
+        if staging:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _entry_size(entry_dir):
+    total = 0
+    for root, _, files in os.walk(entry_dir):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _evict(cache_dir):
+    """Drop least recently used entries until the cache fits its size budget"""
+    global _last_eviction
+    now = time.time()
+    if now - _last_eviction < EVICTION_INTERVAL_SECONDS:
+        return
+    _last_eviction = now
+
+    max_bytes = getattr(settings, 'COMPILE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            try:
+                last_used = os.stat(os.path.join(entry.path, USED_MARKER)).st_mtime
+            except OSError:
+                last_used = 0
+            size = _entry_size(entry.path)
+            total += size
+            entries.append((last_used, size, entry.path))
+
+    if total <= max_bytes:
+        return
+
+    cutoff = now - EVICTION_GRACE_SECONDS
+    for last_used, size, path in sorted(entries):
+        if total <= max_bytes or last_used > cutoff:
+            break
+        trash = os.path.join(cache_dir, f'.evict-{uuid.uuid4().hex}')
+        try:
+            os.rename(path, trash)
+        except OSError:
+            continue
+        shutil.rmtree(trash, ignore_errors=True)
+        total -= size
+    logger.info(f'Compile cache evicted down to {total} bytes')
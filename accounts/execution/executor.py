@@ -0,0 +1,191 @@
+"""
+The one way to compile and run a submission.
+
+Run previews (run_code) and final grading (grade_many) both go through an
+Executor, so they share timeouts, the toolchain environment and every
+execution path.  What changes per language lives in runners.py; how a
+program is launched is the backend, picked with EXECUTION_BACKEND:
+
+  local   - a plain subprocess per run (process.run_process)
+  warm    - the pre-imported fork-server for Python and native programs,
+            and one harness JVM for all cases of a Java submission (default)
+  socket  - forwards every call to `manage.py exec_worker` over a Unix
+            socket (see socket_worker.py), so programs are started by a
+            separate process that can run with its own user or limits
+
+Executors do not take scheduler slots; callers do that around each call.
+"""
+import logging
+import subprocess
+import threading
+
+from django.conf import settings
+
+from .compile_cache import GRADING
+from .forkserver import run_command, run_python
+from .java_harness import discount_startup, run_java_cases, startup_timeout
+from .process import run_process
+from .runners import get_runner
+from .toolchains import get_registry
+
+logger = logging.getLogger(__name__)
+
+RUN_TIMEOUT = 5          # seconds per test case, for Run and for grading
+COMPILE_TIMEOUT = 30     # seconds per compile
+
+_executor = None
+_lock = threading.Lock()
+
+
+def run_timeout():
+    return getattr(settings, 'EXECUTION_RUN_TIMEOUT', None) or RUN_TIMEOUT
+
+
+def compile_timeout():
+    return getattr(settings, 'EXECUTION_COMPILE_TIMEOUT', None) or COMPILE_TIMEOUT
+
+
+def toolchain_env():
+    """Environment for compilers and programs, from the toolchain registry (read-only)"""
+    return get_registry().env
+
+
+class Executor:
+    """
+    Compiles and runs submissions.  Subclasses implement run(); the rest has
+    working defaults built on the language runners.
+    """
+    name = None
+
+    def __init__(self, env=None):
+        self.env = env if env is not None else toolchain_env()
+
+    def _launch(self, prepared, timeout, launch):
+        """
+        launch(timeout) for one run of a submission.  A Java run starts its own
+        JVM, so it gets the JVM's start-up on top of its timeout and taken off
+        its times, to measure what the harness does (see java_harness).
+        """
+        if prepared.language != 'java':
+            return launch(timeout)
+        result = launch(startup_timeout(timeout, self.env, prepared.memory_mb))
+        return discount_startup(result, self.env, prepared.memory_mb)
+
+    def prepare(self, code, language, work_dir, profile=GRADING):
+        """
+        Write/compile a submission; previews pass profile=compile_cache.PREVIEW.
+        Returns (Prepared, None) or (None, error message).
+        """
+        runner = get_runner(language)
+        if runner is None:
+            return None, f'Unsupported language: {language}'
+        toolchain = get_registry().get(language)
+        if not toolchain.available:
+            return None, toolchain.missing
+        return runner.prepare(code, work_dir, env=self.env, timeout=compile_timeout(), profile=profile)
+
+    def run(self, prepared, stdin_data, timeout=None, expected=None, cancel=None):
+        """
+        Run a prepared submission once. Returns a ProcessResult; raises
+        subprocess.TimeoutExpired, or cancellation.Cancelled once the
+        `cancel` token is cancelled (the program is killed).
+        """
+        raise NotImplementedError
+
+    def batches(self, prepared):
+        """True if run_cases() runs all cases in one process, so it should be one task rather than many"""
+        return False
+
+    def run_cases(self, prepared, inputs, timeout=None, expected_outputs=None, cancel=None, on_result=None):
+        """
+        Run a prepared submission once per input.  Returns a list with a
+        ProcessResult, or the TimeoutExpired raised in its place, per input.
+        If given, on_result(index, result) is called as each one finishes.
+        """
+        timeout = timeout or run_timeout()
+        results = []
+        for i, stdin_data in enumerate(inputs):
+            expected = expected_outputs[i] if expected_outputs else None
+            try:
+                results.append(self.run(prepared, stdin_data, timeout, expected, cancel))
+            except subprocess.TimeoutExpired as e:
+                results.append(e)
+            if on_result:
+                on_result(i, results[-1])
+        return results
+
+
+class LocalExecutor(Executor):
+    """A fresh subprocess for every run"""
+    name = 'local'
+
+    def run(self, prepared, stdin_data, timeout=None, expected=None, cancel=None):
+        runner = get_runner(prepared.language)
+        return self._launch(prepared, timeout or run_timeout(), lambda t: run_process(
+            runner.command(prepared), stdin_data, t, prepared.work_dir, env=self.env,
+            limit_memory=runner.limit_memory, expected=expected, cancel=cancel, memory_mb=prepared.memory_mb,
+        ))
+
+
+class WarmExecutor(Executor):
+    """Fork-server for Python and native programs, one harness JVM per Java submission"""
+    name = 'warm'
+
+    def __init__(self, env=None, use_forkserver=None, use_java_harness=None):
+        super().__init__(env)
+        if use_forkserver is None:
+            use_forkserver = getattr(settings, 'PYTHON_FORKSERVER_ENABLED', True)
+        if use_java_harness is None:
+            use_java_harness = getattr(settings, 'JAVA_HARNESS_ENABLED', True)
+        self.use_forkserver = use_forkserver
+        self.use_java_harness = use_java_harness
+
+    def run(self, prepared, stdin_data, timeout=None, expected=None, cancel=None):
+        timeout = timeout or run_timeout()
+        if prepared.language == 'python':
+            return run_python(
+                prepared.args[0], stdin_data, timeout, prepared.work_dir, env=self.env,
+                use_forkserver=self.use_forkserver, expected=expected, cancel=cancel, memory_mb=prepared.memory_mb,
+            )
+        runner = get_runner(prepared.language)
+        return self._launch(prepared, timeout, lambda t: run_command(
+            runner.command(prepared), stdin_data, t, prepared.work_dir, env=self.env,
+            limit_memory=runner.limit_memory, use_forkserver=self.use_forkserver, expected=expected, cancel=cancel,
+            memory_mb=prepared.memory_mb,
+        ))
+
+    def batches(self, prepared):
+        return prepared.language == 'java' and self.use_java_harness
+
+    def run_cases(self, prepared, inputs, timeout=None, expected_outputs=None, cancel=None, on_result=None):
+        if not self.batches(prepared):
+            return super().run_cases(prepared, inputs, timeout, expected_outputs, cancel, on_result)
+        class_dir, class_name = prepared.args
+        return run_java_cases(
+            class_dir, class_name, inputs, timeout or run_timeout(), prepared.work_dir, env=self.env,
+            expected_outputs=expected_outputs, cancel=cancel, on_result=on_result, memory_mb=prepared.memory_mb,
+        )
+
+
+def create_executor(backend=None):
+    """New executor for a backend name ('local', 'warm' or 'socket'; default EXECUTION_BACKEND)"""
+    backend = backend or getattr(settings, 'EXECUTION_BACKEND', 'warm')
+    if backend == 'local':
+        return LocalExecutor()
+    if backend == 'warm':
+        return WarmExecutor()
+    if backend == 'socket':
+        from .socket_worker import SocketExecutor
+        return SocketExecutor()
+    raise ValueError(f'Unknown execution backend: {backend}')
+
+
+def get_executor():
+    """Process-wide executor for the configured backend"""
+    global _executor
+    if _executor is None:
+        executor = create_executor()
+        with _lock:
+            if _executor is None:
+                _executor = executor
+    return _executor
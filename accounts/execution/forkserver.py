@@ -0,0 +1,431 @@
+"""
+Warm fork-server for running Python submissions.
+
+Starting a fresh interpreter for every test case costs tens of milliseconds of
+startup and stdlib imports.  Instead we keep one pre-imported Python process per
+web worker and fork a clean child for each run.  The child gets its own
+stdin/stdout/stderr pipes (passed over a Unix socket), its own session so a timeout
+can kill everything it started, and runs the script as ``__main__`` exactly
+like ``python solution.py`` would.  Native programs (compiled C, java) can be
+started the same way, which is cheaper than forking the web worker and keeps
+its memory out of their peak-RSS figures.
+
+This file runs standalone as the server (``python forkserver.py <socket>``), so
+it must not import Django or anything from the accounts app at module level;
+the client-side functions import what they need from .process when called.
+"""
+import atexit
+import json
+import logging
+import os
+import resource
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Modules candidates commonly import - loaded once in the server so children start warm
+PRELOAD_MODULES = (
+    'array', 'bisect', 'collections', 'copy', 'datetime', 'decimal', 'fractions',
+    'functools', 'heapq', 'io', 'itertools', 'json', 'math', 'operator', 'random',
+    're', 'runpy', 'statistics', 'string', 'traceback', 'typing',
+)
+
+START_TIMEOUT = 10      # seconds to wait for the server to come up
+REPLY_GRACE = 5         # extra seconds on top of the run timeout before giving up on the server
+MAX_REQUEST_BYTES = 1 << 20
+
+
+# ── Server side ──────────────────────────────────────────────────────────────
+
+def _setup_child(cwd, fds, cpu_seconds=None, memory_bytes=None):
+    """Runs inside the forked grandchild: own session, rlimits, stdio from the client"""
+    os.setsid()
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(cwd)
+
+
+def _exec_program(argv, env):
+    """Runs inside the forked grandchild: replace it with a native program (compiled C, java, ...)"""
+    try:
+        if env is None:
+            os.execvp(argv[0], argv)
+        os.execvpe(argv[0], argv, env)
+    except OSError as e:
+        os.write(2, f'{argv[0]}: {e.strerror}\n'.encode('utf-8', errors='replace'))
+    os._exit(127)
+
+
+def _run_script(path):
+    """Runs inside the forked grandchild: execute the script as __main__ on the prepared stdio"""
+    import io
+    import random
+    import runpy
+    import traceback
+
+    sys.stdin = sys.__stdin__ = open(0, 'r', closefd=False)
+    sys.stdout = sys.__stdout__ = open(1, 'w', closefd=False)
+    sys.stderr = sys.__stderr__ = io.TextIOWrapper(
+        open(2, 'wb', closefd=False), errors='backslashreplace', line_buffering=True
+    )
+    sys.argv = [path]
+    sys.path[0] = os.path.dirname(path)
+    random.seed()  # the server's seed would otherwise be shared by every child
+
+    code = 0
+    try:
+        runpy.run_path(path, run_name='__main__')
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        # Hide runpy's own frames so the traceback looks like a plain `python solution.py`
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != path:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        code = 1
+
+    try:
+        import atexit as user_atexit
+        user_atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        code = 120
+    os._exit(code & 0xFF)
+
+
+def _wait_child(pid, timeout, conn):
+    """
+    Wait for the script process, killing its whole session on timeout or when
+    the client asks (a "kill" line, or hanging up).
+    Returns (status, rusage, timed_out); wait4 gives the script's own CPU time and peak RSS.
+    """
+    deadline = time.monotonic() + timeout
+    pidfd = None
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        pass
+
+    try:
+        while True:
+            wpid, status, usage = os.wait4(pid, os.WNOHANG)
+            if wpid:
+                return status, usage, False
+            remaining = deadline - time.monotonic()
+            killed = False
+            if remaining > 0:
+                waitables = [conn] if pidfd is None else [pidfd, conn]
+                readable, _, _ = select.select(waitables, [], [], remaining if pidfd is not None else min(remaining, 0.005))
+                if conn in readable:
+                    killed = True
+                    conn.recv(64)
+            if killed or remaining <= 0:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                _, status, usage = os.wait4(pid, 0)
+                return status, usage, not killed
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def _handle(conn):
+    """Runs inside the forked handler: start the script or program, enforce the timeout, report back"""
+    msg, fds, _, _ = socket.recv_fds(conn, MAX_REQUEST_BYTES, 3)
+    request = json.loads(msg.decode('utf-8'))
+
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        _setup_child(request['cwd'], fds, request.get('cpu_seconds'), request.get('memory_bytes'))
+        if 'argv' in request:
+            _exec_program(request['argv'], request.get('env'))
+        _run_script(request['path'])
+    for fd in fds:
+        os.close(fd)
+
+    status, usage, timed_out = _wait_child(pid, request['timeout'], conn)
+    reply = {
+        'returncode': os.waitstatus_to_exitcode(status),
+        'timed_out': timed_out,
+        'cpu_time': usage.ru_utime + usage.ru_stime,
+        'peak_rss_kb': usage.ru_maxrss,
+    }
+    try:
+        conn.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+    except OSError:
+        pass  # client already gave up on this run
+
+
+def serve(sock_path):
+    """Server main loop. Exits when the owning web worker closes our stdin."""
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(sock_path)
+    listener.listen(128)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # handlers are reaped automatically
+
+    sys.stdout.write('ready\n')
+    sys.stdout.flush()
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    while True:
+        readable, _, _ = select.select([listener, 0], [], [])
+        if 0 in readable and not os.read(0, 1):
+            break  # parent went away
+        if listener not in readable:
+            continue
+        conn, _ = listener.accept()
+        if os.fork() == 0:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            listener.close()
+            try:
+                _handle(conn)
+            finally:
+                os._exit(0)
+        conn.close()
+
+
+# ── Client side ──────────────────────────────────────────────────────────────
+
+class ForkServer:
+    """Handle to one fork-server process owned by the current web worker"""
+
+    def __init__(self, python=None):
+        self.python = python or shutil.which('python') or sys.executable
+        self.proc = None
+        self.sock_dir = None
+        self.sock_path = None
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        self.sock_dir = tempfile.mkdtemp(prefix='quiz_forkserver_')
+        self.sock_path = os.path.join(self.sock_dir, 'server.sock')
+        self.proc = subprocess.Popen(
+            [self.python, os.path.abspath(__file__), self.sock_path],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=self.sock_dir, start_new_session=True,
+        )
+        ready, _, _ = select.select([self.proc.stdout], [], [], START_TIMEOUT)
+        if not ready or self.proc.stdout.readline().strip() != b'ready':
+            self.stop()
+            raise RuntimeError('Python fork-server failed to start')
+
+    def stop(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=2)
+            except Exception:
+                self.proc.kill()
+            self.proc = None
+        if self.sock_dir:
+            shutil.rmtree(self.sock_dir, ignore_errors=True)
+            self.sock_dir = None
+
+    def run(self, script, stdin_data, timeout, cwd, cpu_seconds=None, memory_bytes=None, expected=None, cancel=None):
+        """
+        Run a script with the given stdin. Mirrors subprocess.run(..., capture_output=True, text=True)
+        and returns a ProcessResult with the script's CPU time and peak RSS.
+        Output is streamed and checked against `expected`, and the run stopped
+        if `cancel` is cancelled, like process.run_process does.
+        """
+        request = {'path': script}
+        return self._call(
+            request, ['python', script], stdin_data, timeout, cwd, cpu_seconds, memory_bytes, expected, cancel,
+        )
+
+    def run_program(self, argv, stdin_data, timeout, cwd, env=None, cpu_seconds=None, memory_bytes=None,
+                    expected=None, cancel=None):
+        """
+        Same as run(), but execs a native program.  Forking it from this small
+        server rather than from the web worker keeps the worker's memory out
+        of the program's peak RSS (Linux counts the pre-exec image in it).
+        """
+        request = {'argv': list(argv), 'env': dict(env) if env is not None else None}
+        return self._call(request, list(argv), stdin_data, timeout, cwd, cpu_seconds, memory_bytes, expected, cancel)
+
+    def _call(self, request, cmd, stdin_data, timeout, cwd, cpu_seconds, memory_bytes, expected, cancel=None):
+        from .process import OutputMonitor, ProcessResult, is_cpu_limit_kill, pump
+
+        started = time.monotonic()
+        request = json.dumps(dict(
+            request, cwd=cwd, timeout=timeout, cpu_seconds=cpu_seconds, memory_bytes=memory_bytes,
+        )).encode('utf-8')
+        if len(request) > MAX_REQUEST_BYTES:
+            raise ValueError('Fork-server request too large')
+
+        monitor = OutputMonitor(expected)
+        stdin_r, stdin_w = os.pipe()
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(self.sock_path)
+                socket.send_fds(sock, [request], [stdin_r, stdout_w, stderr_w])
+            except OSError:
+                for fd in (stdin_w, stdout_r, stderr_r):
+                    os.close(fd)
+                raise
+            finally:
+                # The child has its own copies now; ours would keep the pipes from reaching EOF
+                for fd in (stdin_r, stdout_w, stderr_w):
+                    os.close(fd)
+
+            def stop():
+                try:
+                    sock.sendall(b'kill\n')
+                except OSError:
+                    pass
+
+            timed_out = pump(stdin_w, stdout_r, stderr_r, stdin_data, monitor, started + timeout, stop, cancel)
+            if cancel is not None:
+                cancel.check()   # the server has been told to kill it; no need to wait for the reply
+
+            sock.settimeout(timeout + REPLY_GRACE)
+            reply = b''
+            while not reply.endswith(b'\n'):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise ConnectionError('Python fork-server closed the connection')
+                reply += chunk
+        reply = json.loads(reply.decode('utf-8'))
+        elapsed = time.monotonic() - started
+
+        timed_out = timed_out or reply['timed_out']
+        if timed_out or is_cpu_limit_kill(reply['returncode'], reply['cpu_time'], cpu_seconds):
+            raise subprocess.TimeoutExpired(cmd, timeout)
+
+        return ProcessResult(
+            cmd, reply['returncode'], monitor.stdout, monitor.stderr,
+            elapsed, reply['cpu_time'], reply['peak_rss_kb'], aborted=monitor.aborted,
+        )
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_forkserver():
+    """Return this worker's fork-server, starting (or restarting) it if needed"""
+    global _server
+    with _server_lock:
+        if _server is not None and _server.alive():
+            return _server
+        if _server is not None:
+            _server.stop()
+        _server = ForkServer()
+        _server.start()
+        return _server
+
+
+def shutdown():
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.stop()
+            _server = None
+
+
+atexit.register(shutdown)
+
+
+def run_python(script, stdin_data, timeout, cwd, env=None, use_forkserver=True, expected=None, cancel=None,
+               memory_mb=None):
+    """
+    Run a Python solution file and capture its output.
+
+    Uses the warm fork-server when possible and falls back to a plain
+    `python script` subprocess if the server cannot be started or reached.
+    Either way the run gets CPU-time and memory rlimits (memory_mb, else
+    EXECUTION_MEMORY_LIMIT_MB), its output is capped
+    and, if `expected` is given, checked as it streams in (see
+    process.OutputMonitor); the result is a ProcessResult.  Raises subprocess.TimeoutExpired on timeout, same as
+    subprocess.run, and cancellation.Cancelled once `cancel` is cancelled.
+    """
+    from .process import cpu_limit_seconds, memory_limit_bytes, run_process
+
+    if use_forkserver and hasattr(socket, 'send_fds') and hasattr(os, 'fork'):
+        try:
+            return get_forkserver().run(
+                script, stdin_data, timeout, cwd,
+                cpu_seconds=cpu_limit_seconds(timeout), memory_bytes=memory_limit_bytes(memory_mb), expected=expected,
+                cancel=cancel,
+            )
+        except subprocess.TimeoutExpired:
+            raise
+        except (OSError, RuntimeError, ValueError) as e:
+            logger.warning(f'Fork-server unavailable, using subprocess: {e}')
+            shutdown()
+
+    return run_process(
+        ['python', script], stdin_data, timeout, cwd, env=env, expected=expected, cancel=cancel, memory_mb=memory_mb,
+    )
+
+
+def run_command(cmd, stdin_data, timeout, cwd, env=None, limit_memory=True, use_forkserver=True, expected=None,
+                cancel=None, memory_mb=None):
+    """
+    Run a native program (compiled C, java, ...) with CPU-time and memory
+    rlimits and capture its output as a ProcessResult, streaming and checking
+    it against `expected` like run_python.
+
+    Goes through the fork-server when possible, see ForkServer.run_program;
+    otherwise runs it with process.run_process.  Raises
+    subprocess.TimeoutExpired on timeout and cancellation.Cancelled if
+    `cancel` is cancelled.
+    """
+    from .process import cpu_limit_seconds, memory_limit_bytes, run_process
+
+    if use_forkserver and hasattr(socket, 'send_fds') and hasattr(os, 'fork'):
+        try:
+            return get_forkserver().run_program(
+                cmd, stdin_data, timeout, cwd, env=env, cpu_seconds=cpu_limit_seconds(timeout),
+                memory_bytes=memory_limit_bytes(memory_mb) if limit_memory else None, expected=expected, cancel=cancel,
+            )
+        except subprocess.TimeoutExpired:
+            raise
+        except (OSError, RuntimeError, ValueError) as e:
+            logger.warning(f'Fork-server unavailable, using subprocess: {e}')
+            shutdown()
+
+    return run_process(
+        cmd, stdin_data, timeout, cwd, env=env, limit_memory=limit_memory, expected=expected, cancel=cancel,
+        memory_mb=memory_mb,
+    )
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1])
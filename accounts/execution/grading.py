@@ -0,0 +1,255 @@
+"""
+Grading engine for coding and dubbing submissions.
+
+A final submission can contain several questions with up to 10 test cases
+each.  Instead of compiling and running them one after another inside the
+request, every compile and every test case becomes a task on a bounded worker
+pool.  The pool's threads only wait on child processes (compilers, the Python
+fork-server, the JVM harness, native binaries), so its size caps how many
+processes one web worker runs at once.  Results are gathered back in
+submission order, so scoring is deterministic.  Each task also takes a
+grading slot from the shared scheduler, which caps executions across all
+workers on the host.  The compiling and running itself is done by the
+configured Executor (see executor.py), the same one Run previews use.
+
+Efficiency marks are based on CPU time (user+sys of the submission's own
+process, from wait4), not wall time, so a busy host does not cost candidates
+marks.  Wall time is still recorded for display.  Questions calibrated from a
+reference solution (see calibration.py) get their own timeout, CPU and memory
+limits and efficiency target; the rest use the defaults.
+
+Each case's stdout is checked against its expected output as it streams in,
+so a wrong answer or runaway output stops the program early instead of
+holding a slot until the timeout.
+
+Per-case results are kept in the shared result cache, so code the candidate
+already ran with Run is not executed again at submit time, unless Run built
+it differently (see result_cache).
+"""
+import logging
+import os
+import subprocess
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .executor import get_executor, run_timeout
+from .process import OUTPUT_LIMIT_EXCEEDED, WRONG_ANSWER
+from .result_cache import get_results, store_results
+from .scheduler import grading_slot
+
+logger = logging.getLogger(__name__)
+
+TIME_LIMIT_MS = 1000.0   # average CPU time per case needed for the efficiency marks
+
+# `records` are the per-case records (see case_record) in test-case order; empty if nothing ran
+GradeResult = namedtuple(
+    'GradeResult', 'passed total output_success execution_time_ms time_limit_met cpu_time_ms peak_memory_kb records'
+)
+# One executed test case; returncode is None when it ran out of time, and
+# aborted says why a run was stopped early (process.WRONG_ANSWER / OUTPUT_LIMIT_EXCEEDED)
+CaseRun = namedtuple('CaseRun', 'returncode stdout stderr elapsed cpu_time peak_rss_kb aborted')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide bounded pool shared by every grading request in this worker"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            size = getattr(settings, 'GRADING_POOL_SIZE', None) or os.cpu_count() or 2
+            _pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='grading')
+        return _pool
+
+
+def normalize(text):
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def to_case_run(res, timeout, cpu_limit=None):
+    """
+    CaseRun from a ProcessResult, or from the TimeoutExpired raised in its
+    place.  A run that used more than cpu_limit seconds of CPU ran out of time too.
+    """
+    if isinstance(res, subprocess.TimeoutExpired):
+        return CaseRun(None, '', '', timeout, timeout, 0, None)
+    returncode = None if cpu_limit and res.cpu_time > cpu_limit else res.returncode
+    return CaseRun(returncode, res.stdout, res.stderr, res.elapsed, res.cpu_time, res.peak_rss_kb, res.aborted)
+
+
+def run_case(executor, prepared, stdin_data, timeout, expected=None, cancel=None, cpu_limit=None):
+    """Run one test case and return a CaseRun"""
+    try:
+        res = executor.run(prepared, stdin_data, timeout, expected, cancel)
+    except subprocess.TimeoutExpired as e:
+        res = e
+    return to_case_run(res, timeout, cpu_limit)
+
+
+def run_batch(executor, prepared, inputs, timeout, expected_outputs=None, cancel=None, on_run=None, cpu_limit=None):
+    """
+    Run all cases of a submission in one go (e.g. one harness JVM). Returns a list of CaseRun.
+    If given, on_run(index, CaseRun) is called as each case finishes.
+    """
+    on_result = on_run and (lambda i, res: on_run(i, to_case_run(res, timeout, cpu_limit)))
+    results = executor.run_cases(prepared, inputs, timeout, expected_outputs, cancel, on_result)
+    return [to_case_run(res, timeout, cpu_limit) for res in results]
+
+
+def case_record(run, tc):
+    """
+    Verdict and measurements for one test case, as a plain dict so it can go
+    in the result cache.  stdout/stderr are cut to what the Run panel shows.
+    """
+    actual = normalize(run.stdout.strip())
+    passed = (
+        run.returncode == 0 and not run.aborted
+        and actual == normalize(tc.expected_output.strip())
+    )
+    return {
+        'passed': passed,
+        'returncode': run.returncode,
+        'aborted': run.aborted,
+        'elapsed': run.elapsed,
+        'cpu_time': run.cpu_time,
+        'peak_rss_kb': run.peak_rss_kb,
+        'stdout': actual[:200],
+        'stderr': run.stderr[:200],
+    }
+
+
+def score_records(records, time_limit_ms=None):
+    """
+    Turn per-case records into the GradeResult stored on CodeSubmission.
+    time_limit_ms is the average CPU time per case needed for the efficiency
+    marks (TIME_LIMIT_MS by default).
+    """
+    passed = 0
+    total_time = 0.0
+    total_cpu = 0.0
+    peak_memory_kb = 0
+    output_success = False
+    for record in records:
+        total_time += record['elapsed']
+        total_cpu += record['cpu_time']
+        peak_memory_kb = max(peak_memory_kb, record['peak_rss_kb'])
+        if record['returncode'] is None or record['aborted'] == OUTPUT_LIMIT_EXCEEDED:
+            continue
+        # A run stopped for a wrong answer was still running cleanly, so it counts as having run
+        if record['returncode'] == 0 or record['aborted'] == WRONG_ANSWER:
+            output_success = True
+        if record['passed']:
+            passed += 1
+
+    count = len(records)
+    avg_time_ms = (total_time / count * 1000) if count else 0.0
+    avg_cpu_ms = (total_cpu / count * 1000) if count else 0.0
+    time_met = avg_cpu_ms < (time_limit_ms or TIME_LIMIT_MS) if count else False
+    return GradeResult(passed, count, output_success, avg_time_ms, time_met, avg_cpu_ms, peak_memory_kb, records)
+
+
+def failure_rate(runs, failures):
+    """
+    Observed failure rate of a test case across graded submissions, smoothed
+    so that cases with little history sit in the middle (0.5 with none).
+    """
+    return (failures + 1) / (runs + 2)
+
+
+def order_by_failure_rate(test_cases, stats):
+    """
+    Test cases with the likeliest failures first (stable for equal rates).
+    `stats` maps test case id to (run_count, failure_count); cases without
+    an entry count as having no history.
+    """
+    return sorted(test_cases, key=lambda tc: failure_rate(*stats.get(tc.id, (0, 0))), reverse=True)
+
+
+def _scheduled(fn, *args):
+    """Run a compile or test-case task once the shared scheduler grants a grading slot"""
+    with grading_slot():
+        return fn(*args)
+
+
+def grade_many(submissions, tmp_dir, executor=None, timeout=None, limits=None):
+    """
+    Grade a batch of submissions in parallel.
+
+    `submissions` is a list of (code, language, test_cases).  `limits` is an
+    optional list of calibration.Limits, one per submission (its timeout wins
+    over `timeout`).  Returns a list of GradeResult in the same order.  Each submission works in its own
+    subdirectory of tmp_dir, so questions never overwrite each other's files.
+    Test cases with cached results (e.g. samples the candidate already ran)
+    are not run again, and a submission with every case cached is not even
+    compiled.  A submission whose compile times out or crashes counts as not
+    compiling; it does not stop the others from being graded.
+    """
+    executor = executor or get_executor()
+    timeout = timeout or run_timeout()
+    limits = limits or [None] * len(submissions)
+    timeouts = [lim.timeout if lim else timeout for lim in limits]
+    cpu_limits = [lim and lim.cpu_limit for lim in limits]
+    env = executor.env
+    pool = get_pool()
+    cached = [
+        (get_results(code, language, test_cases, t, env, limits=lim) if code else None) or [None] * len(test_cases)
+        for (code, language, test_cases), t, lim in zip(submissions, timeouts, limits)
+    ]
+    # Indices of the cases each submission still has to run
+    missing = [[i for i, record in enumerate(records) if record is None] for records in cached]
+
+    def _prepare(index):
+        code, language, _ = submissions[index]
+        if not code or not missing[index]:
+            return None
+        try:
+            prep, _ = _scheduled(executor.prepare, code, language, os.path.join(tmp_dir, f'q{index}'))
+        except (subprocess.TimeoutExpired, OSError, RuntimeError) as e:
+            # Scored as not compiling; the other answers are still graded
+            logger.warning(f'Compiling {language} submission {index} failed: {e!r}')
+            return None
+        if prep is not None and limits[index] and limits[index].memory_mb:
+            prep = prep._replace(memory_mb=limits[index].memory_mb)
+        return prep
+
+    prepared = list(pool.map(_prepare, range(len(submissions))))
+
+    pending = []
+    for (code, language, test_cases), prep, todo, t, cpu in zip(submissions, prepared, missing, timeouts, cpu_limits):
+        to_run = [test_cases[i] for i in todo]
+        if not to_run or prep is None:
+            pending.append(None)
+        elif executor.batches(prep):
+            inputs = [normalize(tc.input_data) for tc in to_run]
+            expected = [tc.expected_output for tc in to_run]
+            pending.append(pool.submit(_scheduled, run_batch, executor, prep, inputs, t, expected, None, None, cpu))
+        else:
+            pending.append([
+                pool.submit(
+                    _scheduled, run_case, executor, prep, normalize(tc.input_data), t, tc.expected_output, None, cpu,
+                )
+                for tc in to_run
+            ])
+
+    results = []
+    for (code, language, test_cases), work, records, todo, t, lim in zip(
+            submissions, pending, cached, missing, timeouts, limits):
+        if not code:
+            results.append(GradeResult(0, 0, False, 0.0, False, 0.0, 0, []))
+        elif todo and work is None:
+            # did not compile
+            results.append(GradeResult(0, len(test_cases), False, 0.0, False, 0.0, 0, []))
+        else:
+            if todo:
+                runs = [f.result() for f in work] if isinstance(work, list) else work.result()
+                to_run = [test_cases[i] for i in todo]
+                fresh = [case_record(run, tc) for run, tc in zip(runs, to_run)]
+                store_results(code, language, to_run, t, fresh, env, limits=lim)
+                for i, record in zip(todo, fresh):
+                    records[i] = record
+            results.append(score_records(records, lim and lim.target_ms))
+    return results
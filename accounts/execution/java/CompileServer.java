@@ -0,0 +1,180 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintWriter;
+import java.io.StringWriter;
+import java.net.InetAddress;
+import java.net.ServerSocket;
+import java.net.Socket;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+
+/**
+ * Long-lived javac: keeps the system Java compiler loaded and JIT-warmed and
+ * compiles source files sent to it over a loopback socket.
+ *
+ * The first line on stdin is a secret token; every request must start with it.
+ * Once ready the server prints "PORT n" on stdout.  It exits when stdin is
+ * closed, i.e. when the process that started it goes away.
+ *
+ * Request (UTF-8 lines, then the raw source bytes):
+ *   token
+ *   outputDir          directory the source is written to and the classes go to,
+ *                      laid out as the javac command run in it would leave them
+ *   sourceName         e.g. Main.java
+ *   n                  number of extra javac options, one per line after this
+ *   option...
+ *   length             byte length of the source that follows
+ * Reply:
+ *   RC rc length       rc is 0 on success, 1 on compile errors
+ *   diagnostics        exactly what the javac command prints, length bytes
+ *
+ * Usage: java CompileServer threads
+ */
+public class CompileServer {
+    private static final String WARM_UP_SOURCE =
+        "import java.util.*;\n"
+        + "public class WarmUp { public static void main(String[] a) {"
+        + " List<Integer> xs = new ArrayList<>(); for (int i = 0; i < 10; i++) xs.add(i);"
+        + " System.out.println(xs.stream().mapToInt(Integer::intValue).sum()); } }\n";
+
+    private static JavaCompiler compiler;
+    private static String token;
+    private static final ThreadLocal<StandardJavaFileManager> fileManagers = new ThreadLocal<>();
+
+    public static void main(String[] args) throws Exception {
+        int threads = Integer.parseInt(args[0]);
+        BufferedReader stdin = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        token = stdin.readLine();
+        compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null || token == null) {
+            System.err.println("No system Java compiler (is this a JRE?)");
+            System.exit(2);
+        }
+
+        warmUp();
+
+        ServerSocket server = new ServerSocket(0, 64, InetAddress.getLoopbackAddress());
+        System.out.println("PORT " + server.getLocalPort());
+        System.out.flush();
+
+        // Exit with our parent: it holds the other end of stdin
+        Thread watchdog = new Thread(() -> {
+            try {
+                while (stdin.readLine() != null) { }
+            } catch (IOException e) {
+                // fall through
+            }
+            System.exit(0);
+        });
+        watchdog.setDaemon(true);
+        watchdog.start();
+
+        ExecutorService pool = Executors.newFixedThreadPool(threads);
+        while (true) {
+            Socket socket = server.accept();
+            pool.submit(() -> handle(socket));
+        }
+    }
+
+    /** Compile a small program a few times so the compiler's own code is loaded and JIT-compiled */
+    private static void warmUp() throws IOException {
+        File dir = Files.createTempDirectory("javac-warmup").toFile();
+        try {
+            for (int i = 0; i < 3; i++) {
+                compile(dir, "WarmUp.java", new ArrayList<>(), WARM_UP_SOURCE.getBytes(StandardCharsets.UTF_8));
+            }
+        } finally {
+            File[] files = dir.listFiles();
+            if (files != null) {
+                for (File f : files) {
+                    f.delete();
+                }
+            }
+            dir.delete();
+        }
+    }
+
+    private static void handle(Socket socket) {
+        try (Socket s = socket) {
+            DataInputStream in = new DataInputStream(new BufferedInputStream(s.getInputStream()));
+            if (!token.equals(readLine(in))) {
+                return;
+            }
+            File outputDir = new File(readLine(in));
+            String sourceName = readLine(in);
+            int optionCount = Integer.parseInt(readLine(in));
+            List<String> options = new ArrayList<>();
+            for (int i = 0; i < optionCount; i++) {
+                options.add(readLine(in));
+            }
+            byte[] source = new byte[Integer.parseInt(readLine(in))];
+            in.readFully(source);
+
+            Object[] result = compile(outputDir, sourceName, options, source);
+            byte[] diagnostics = ((String) result[1]).getBytes(StandardCharsets.UTF_8);
+            OutputStream out = s.getOutputStream();
+            out.write(("RC " + result[0] + " " + diagnostics.length + "\n").getBytes(StandardCharsets.UTF_8));
+            out.write(diagnostics);
+            out.flush();
+        } catch (Exception e) {
+            // the client sees the connection close without a reply and falls back to javac
+        }
+    }
+
+    /** Returns {exit code, diagnostics as javac would print them} */
+    private static Object[] compile(File outputDir, String sourceName, List<String> options, byte[] source)
+            throws IOException {
+        File sourceFile = new File(outputDir, sourceName);
+        Files.write(sourceFile.toPath(), source);
+
+        StandardJavaFileManager fileManager = fileManagers.get();
+        if (fileManager == null) {
+            fileManager = compiler.getStandardFileManager(null, null, null);
+            fileManagers.set(fileManager);
+        }
+        // What `javac sourceName` run in outputDir would use: classes go next to the source (no -d,
+        // so a `package` line does not move them into package directories) and the class path is
+        // that directory alone, never this server's own class path or working directory
+        List<String> args = new ArrayList<>(options);
+        args.add("-classpath");
+        args.add(outputDir.getPath());
+
+        StringWriter diagnostics = new StringWriter();
+        Iterable<? extends JavaFileObject> units = fileManager.getJavaFileObjects(sourceFile);
+        boolean ok;
+        try (PrintWriter writer = new PrintWriter(diagnostics)) {
+            ok = compiler.getTask(writer, fileManager, null, args, null, units).call();
+        } catch (RuntimeException e) {
+            diagnostics.write(e.toString());
+            ok = false;
+        }
+        return new Object[] { ok ? 0 : 1, diagnostics.toString() };
+    }
+
+    private static String readLine(InputStream in) throws IOException {
+        ByteArrayOutputStream line = new ByteArrayOutputStream();
+        int b;
+        while ((b = in.read()) != -1 && b != '\n') {
+            line.write(b);
+        }
+        if (b == -1 && line.size() == 0) {
+            throw new IOException("connection closed");
+        }
+        return new String(line.toByteArray(), StandardCharsets.UTF_8);
+    }
+}
@@ -0,0 +1,284 @@
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayInputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.FilterOutputStream;
+import java.io.IOException;
+import java.io.PrintStream;
+import java.lang.management.ManagementFactory;
+import java.lang.management.ThreadMXBean;
+import java.lang.reflect.Field;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.file.Files;
+import java.util.ArrayList;
+import java.util.Collections;
+import java.util.IdentityHashMap;
+import java.util.List;
+import java.util.Locale;
+import java.util.Map;
+import java.util.Properties;
+import java.util.Set;
+import java.util.TimeZone;
+
+/**
+ * Runs a compiled submission's main() once per test case inside a single JVM.
+ *
+ * Every case gets a fresh class loader (so static state starts clean) and its own
+ * stdin/stdout/stderr files in caseDir: case_N.in, case_N.out, case_N.err.
+ * Progress is reported on the real stdout, one line per event:
+ *
+ *   START n             case n is about to run
+ *   CASE n rc nanos cpu case n finished with exit code rc after nanos of wall time,
+ *                       of which cpu nanos were CPU time of its main thread
+ *   TIMEOUT n           case n overran its time limit; the JVM halts right after
+ *   LIMIT n             case n wrote more than outputLimitBytes to stdout or stderr;
+ *                       the JVM halts right after
+ *
+ * If the submission calls System.exit() the JVM exits with that code after a
+ * START line; the caller restarts the harness for the remaining cases.
+ *
+ * A case ends the way its own JVM would: once main() has returned, the threads
+ * it started that are not daemons have finished (within the time limit) and the
+ * shutdown hooks it registered have run.  Everything they print belongs to that
+ * case.  JDK-wide state a program can change (system properties, default
+ * locale and time zone, the default uncaught exception handler) is put back
+ * before every case.  A case that leaves threads running, which could write into
+ * the next case's output, is the last one its JVM runs: the harness halts after
+ * its CASE line, as it does after every case if the shutdown hooks cannot be
+ * inspected (that needs --add-opens java.base/java.lang=ALL-UNNAMED).
+ *
+ * Usage: java QuizHarness classDir className caseDir first count timeoutMillis outputLimitBytes
+ */
+public class QuizHarness {
+    private static volatile PrintStream caseOut;
+    private static volatile PrintStream caseErr;
+    private static PrintStream control;
+    private static long outputLimit;
+    private static int currentCase;
+    private static Object hooksLock;
+    private static Map<Thread, Thread> hooks;
+
+    public static void main(String[] args) throws Exception {
+        URL[] classPath = { new File(args[0]).toURI().toURL() };
+        String className = args[1];
+        File caseDir = new File(args[2]);
+        int first = Integer.parseInt(args[3]);
+        int count = Integer.parseInt(args[4]);
+        long timeoutMillis = Long.parseLong(args[5]);
+        outputLimit = Long.parseLong(args[6]);
+
+        control = new PrintStream(new FileOutputStream(FileDescriptor.out), true);
+        ThreadMXBean threads = ManagementFactory.getThreadMXBean();
+        boolean cpuTimeSupported = threads.isThreadCpuTimeSupported();
+        Runtime.getRuntime().addShutdownHook(new Thread(QuizHarness::flushCase));
+        findShutdownHooks();
+        Set<Thread> harnessHooks = Collections.newSetFromMap(new IdentityHashMap<>());
+        if (hooks != null) {
+            synchronized (hooksLock) {
+                harnessHooks.addAll(hooks.keySet());
+            }
+        }
+
+        Properties properties = (Properties) System.getProperties().clone();
+        Locale locale = Locale.getDefault();
+        Locale displayLocale = Locale.getDefault(Locale.Category.DISPLAY);
+        Locale formatLocale = Locale.getDefault(Locale.Category.FORMAT);
+        TimeZone timeZone = (TimeZone) TimeZone.getDefault().clone();
+        Thread.UncaughtExceptionHandler uncaughtHandler = Thread.getDefaultUncaughtExceptionHandler();
+
+        for (int i = first; i < count; i++) {
+            System.setProperties((Properties) properties.clone());
+            Locale.setDefault(locale);
+            Locale.setDefault(Locale.Category.DISPLAY, displayLocale);
+            Locale.setDefault(Locale.Category.FORMAT, formatLocale);
+            TimeZone.setDefault((TimeZone) timeZone.clone());
+            Thread.setDefaultUncaughtExceptionHandler(uncaughtHandler);
+
+            byte[] input = Files.readAllBytes(new File(caseDir, "case_" + i + ".in").toPath());
+            caseOut = openCaseStream(new File(caseDir, "case_" + i + ".out"));
+            caseErr = openCaseStream(new File(caseDir, "case_" + i + ".err"));
+            System.setIn(new ByteArrayInputStream(input));
+            System.setOut(caseOut);
+            System.setErr(caseErr);
+            currentCase = i;
+            control.println("START " + i);
+
+            final int[] exitCode = {0};
+            final long[] cpuNanos = {-1};
+            final URLClassLoader loader = new URLClassLoader(classPath, ClassLoader.getPlatformClassLoader());
+            // Every thread the submission starts lands in this group, so they can be found afterwards
+            ThreadGroup group = new ThreadGroup("case-" + i);
+            Thread runner = new Thread(group, () -> {
+                try {
+                    Method entry = loader.loadClass(className).getMethod("main", String[].class);
+                    entry.invoke(null, (Object) new String[0]);
+                } catch (InvocationTargetException e) {
+                    reportUncaught(e.getCause());
+                    exitCode[0] = 1;
+                } catch (Throwable e) {
+                    reportUncaught(e);
+                    exitCode[0] = 1;
+                } finally {
+                    if (cpuTimeSupported) {
+                        cpuNanos[0] = threads.getCurrentThreadCpuTime();
+                    }
+                }
+            }, "main");
+            runner.setContextClassLoader(loader);
+
+            long start = System.nanoTime();
+            long deadline = start + timeoutMillis * 1_000_000L;
+            runner.start();
+            runner.join(timeoutMillis);
+            boolean finished = !runner.isAlive()
+                    && awaitNonDaemonThreads(group, deadline)
+                    && runNewShutdownHooks(harnessHooks, deadline);
+            long elapsed = System.nanoTime() - start;
+
+            flushCase();
+            if (!finished) {
+                control.println("TIMEOUT " + i);
+                Runtime.getRuntime().halt(0);
+            }
+            boolean leftovers = !liveThreads(group, true).isEmpty();
+            caseOut.close();
+            caseErr.close();
+            if (!leftovers) {
+                loader.close();
+            }
+            long cpu = cpuNanos[0] >= 0 ? cpuNanos[0] : elapsed;
+            control.println("CASE " + i + " " + exitCode[0] + " " + elapsed + " " + cpu);
+            if (leftovers || hooks == null) {
+                // The remaining cases get a fresh JVM
+                Runtime.getRuntime().halt(0);
+            }
+        }
+        Runtime.getRuntime().halt(0);
+    }
+
+    /** The live threads of a case's group; daemon threads only if includeDaemons. */
+    private static List<Thread> liveThreads(ThreadGroup group, boolean includeDaemons) {
+        Thread[] found = new Thread[group.activeCount() + 16];
+        int n = group.enumerate(found, true);
+        List<Thread> live = new ArrayList<>();
+        for (int k = 0; k < n; k++) {
+            if (found[k].isAlive() && (includeDaemons || !found[k].isDaemon())) {
+                live.add(found[k]);
+            }
+        }
+        return live;
+    }
+
+    /** Waits, until the deadline, for the case's non-daemon threads, as the JVM does before exiting. */
+    private static boolean awaitNonDaemonThreads(ThreadGroup group, long deadline) throws InterruptedException {
+        List<Thread> live;
+        while (!(live = liveThreads(group, false)).isEmpty()) {
+            for (Thread thread : live) {
+                long remaining = (deadline - System.nanoTime()) / 1_000_000L;
+                if (remaining <= 0) {
+                    return false;
+                }
+                thread.join(remaining);
+            }
+        }
+        return true;
+    }
+
+    /** Runs the shutdown hooks the case registered, as its JVM would on exit; false if they overrun the deadline. */
+    private static boolean runNewShutdownHooks(Set<Thread> harnessHooks, long deadline) throws InterruptedException {
+        if (hooks == null) {
+            return true;
+        }
+        List<Thread> added = new ArrayList<>();
+        synchronized (hooksLock) {
+            for (Thread hook : hooks.keySet()) {
+                if (!harnessHooks.contains(hook)) {
+                    added.add(hook);
+                }
+            }
+            hooks.keySet().removeAll(added);
+        }
+        for (Thread hook : added) {
+            hook.start();
+        }
+        for (Thread hook : added) {
+            long remaining = (deadline - System.nanoTime()) / 1_000_000L;
+            if (remaining <= 0) {
+                return false;
+            }
+            hook.join(remaining);
+            if (hook.isAlive()) {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    /** Finds the JDK's registry of shutdown hooks; leaves hooks null if this JVM does not let us read it. */
+    @SuppressWarnings("unchecked")
+    private static void findShutdownHooks() {
+        try {
+            Class<?> registry = Class.forName("java.lang.ApplicationShutdownHooks");
+            Field field = registry.getDeclaredField("hooks");
+            field.setAccessible(true);
+            hooks = (Map<Thread, Thread>) field.get(null);
+            hooksLock = registry;
+        } catch (ReflectiveOperationException | RuntimeException e) {
+            hooks = null;
+        }
+    }
+
+    private static PrintStream openCaseStream(File file) throws IOException {
+        return new PrintStream(new LimitedOutputStream(new BufferedOutputStream(new FileOutputStream(file))), true);
+    }
+
+    /** Stops the run once a case has written more than outputLimit bytes to one stream. */
+    private static final class LimitedOutputStream extends FilterOutputStream {
+        private long written;
+
+        LimitedOutputStream(BufferedOutputStream out) {
+            super(out);
+        }
+
+        @Override
+        public void write(int b) throws IOException {
+            count(1);
+            out.write(b);
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) throws IOException {
+            count(len);
+            out.write(b, off, len);
+        }
+
+        private void count(int len) throws IOException {
+            written += len;
+            if (written > outputLimit) {
+                out.flush();
+                control.println("LIMIT " + currentCase);
+                Runtime.getRuntime().halt(0);
+            }
+        }
+    }
+
+    private static void reportUncaught(Throwable t) {
+        caseErr.print("Exception in thread \"main\" ");
+        t.printStackTrace(caseErr);
+    }
+
+    private static void flushCase() {
+        PrintStream out = caseOut;
+        PrintStream err = caseErr;
+        if (out != null) {
+            out.flush();
+        }
+        if (err != null) {
+            err.flush();
+        }
+    }
+}
@@ -0,0 +1,184 @@
+"""
+Resident Java compiler.
+
+Every `javac` run starts a JVM and loads and JIT-compiles the compiler itself
+before it looks at the source, which is most of the time a typical submission
+takes to build.  Instead each worker process keeps one CompileServer JVM (see
+java/CompileServer.java) running with a warmed-up javax.tools compiler and
+sends it sources over a loopback socket.  Diagnostics come back exactly as
+the javac command prints them, and class files are laid out as `javac` run in
+the work directory leaves them (next to the source, with only that directory
+on the class path), so candidates see the same results either way.
+
+The server is bootstrapped with a plain javac (through the compile cache, so
+only once per JDK).  If it cannot be started or stops answering, compiles
+fall back to the javac subprocess.  JDK 11 has no Unix-domain sockets, so the
+server listens on 127.0.0.1 and requests carry a random token that only the
+owning process knows.
+"""
+import atexit
+import logging
+import os
+import secrets
+import select
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+SERVER_SOURCE = os.path.join(os.path.dirname(__file__), 'java', 'CompileServer.java')
+SERVER_CLASS = 'CompileServer'
+
+START_TIMEOUT = 30      # seconds for the JVM to start and warm up the compiler
+THREADS = 4             # compiles the server runs at once
+MAX_REPLY_BYTES = 1 << 20
+
+
+class CompileDaemon:
+    """Handle to one CompileServer JVM owned by the current process"""
+
+    def __init__(self, env=None):
+        self.env = env
+        self.proc = None
+        self.port = None
+        self.token = None
+        self.cwd = None
+        self.owner = os.getpid()
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None and self.owner == os.getpid()
+
+    def start(self):
+        from .compile_cache import compile_source
+
+        with open(SERVER_SOURCE, encoding='utf-8') as f:
+            source = f.read()
+        class_dir, error = compile_source('java', source, f'{SERVER_CLASS}.java', env=self.env, timeout=60,
+                                          use_daemon=False)
+        if error:
+            raise RuntimeError(f'Could not build Java compile server: {error}')
+
+        self.token = secrets.token_hex(16)
+        # Its own empty working directory, so nothing a compile resolves relative to it can leak in
+        self.cwd = tempfile.mkdtemp(prefix='javac-server-')
+        try:
+            self.proc = subprocess.Popen(
+                ['java', '-cp', class_dir, SERVER_CLASS, str(THREADS)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                cwd=self.cwd, env=self.env, start_new_session=True,
+            )
+        except OSError:
+            self.stop()
+            raise
+        self.proc.stdin.write(self.token.encode('ascii') + b'\n')
+        self.proc.stdin.flush()
+        ready, _, _ = select.select([self.proc.stdout], [], [], START_TIMEOUT)
+        line = self.proc.stdout.readline().split() if ready else []
+        if len(line) != 2 or line[0] != b'PORT':
+            self.stop()
+            raise RuntimeError('Java compile server failed to start')
+        self.port = int(line[1])
+
+    def stop(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()   # the server exits when its stdin closes
+                self.proc.wait(timeout=2)
+            except Exception:
+                self.proc.kill()
+            self.proc = None
+        if self.cwd is not None:
+            shutil.rmtree(self.cwd, ignore_errors=True)
+            self.cwd = None
+
+    def compile(self, work_dir, source_name, code, flags, timeout):
+        """
+        Compile `code` as `source_name`, writing the class files to work_dir.
+        Returns a CompletedProcess like subprocess.run(['javac', ...]) run in
+        work_dir would.  Raises subprocess.TimeoutExpired, or OSError /
+        ConnectionError if the server does not answer.
+        """
+        cmd = ['javac'] + list(flags) + [source_name]
+        source = code.encode('utf-8')
+        header = [self.token, os.path.abspath(work_dir), source_name, str(len(flags))] + list(flags) + [str(len(source))]
+        request = ''.join(f'{line}\n' for line in header).encode('utf-8') + source
+
+        with socket.create_connection(('127.0.0.1', self.port), timeout=timeout) as sock:
+            try:
+                sock.sendall(request)
+                reply = b''
+                while b'\n' not in reply:
+                    chunk = sock.recv(4096)
+                    if not chunk:
+                        raise ConnectionError('Java compile server closed the connection')
+                    reply += chunk
+                status, reply = reply.split(b'\n', 1)
+                _, returncode, length = status.split()
+                length = int(length)
+                if length > MAX_REPLY_BYTES:
+                    raise ConnectionError('Java compile server reply too large')
+                while len(reply) < length:
+                    chunk = sock.recv(length - len(reply))
+                    if not chunk:
+                        raise ConnectionError('Java compile server closed the connection')
+                    reply += chunk
+            except socket.timeout:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+
+        # The server names the source by its absolute path; javac run in work_dir names it relatively
+        diagnostics = reply.decode('utf-8', errors='replace').replace(os.path.abspath(work_dir) + os.sep, '')
+        return subprocess.CompletedProcess(cmd, int(returncode), '', diagnostics)
+
+
+_daemon = None
+_daemon_lock = threading.Lock()
+
+
+def get_daemon(env=None):
+    """Return this process's compile server, starting (or restarting) it if needed"""
+    global _daemon
+    with _daemon_lock:
+        if _daemon is not None and _daemon.alive():
+            return _daemon
+        if _daemon is not None and _daemon.owner == os.getpid():
+            _daemon.stop()
+        _daemon = CompileDaemon(env)
+        _daemon.start()
+        return _daemon
+
+
+def shutdown():
+    global _daemon
+    with _daemon_lock:
+        if _daemon is not None and _daemon.owner == os.getpid():
+            _daemon.stop()
+        _daemon = None
+
+
+atexit.register(shutdown)
+
+
+def compile_java(work_dir, source_name, code, flags, timeout, env=None):
+    """
+    Compile a Java source already saved in work_dir, through the compile
+    server when possible and with a `javac` subprocess otherwise.  Returns
+    the CompletedProcess; raises subprocess.TimeoutExpired, and
+    FileNotFoundError if there is no javac.
+    """
+    try:
+        return get_daemon(env).compile(work_dir, source_name, code, flags, timeout)
+    except subprocess.TimeoutExpired:
+        # The server cannot abandon a compile, so don't leave it holding a thread
+        shutdown()
+        raise
+    except (OSError, RuntimeError, ValueError) as e:
+        logger.warning(f'Java compile server unavailable, using javac: {e}')
+        shutdown()
+
+    return subprocess.run(
+        ['javac'] + list(flags) + [source_name],
+        capture_output=True, text=True, timeout=timeout, cwd=work_dir, env=env,
+    )
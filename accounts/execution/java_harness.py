@@ -0,0 +1,296 @@
+"""
+Single-JVM test harness for Java submissions.
+
+JVM startup dominates the cost of a Java test case, so instead of one
+`java -cp dir ClassName` per case we start QuizHarness once; it runs the
+submission's main() for each case in a fresh class loader with per-case
+stdin/stdout/stderr files and a per-case time limit.  A timeout or a
+System.exit() ends that JVM, in which case a new one picks up from the next
+case, so every case still gets the result it would have had in its own process.
+The harness also waits for a case's threads and shutdown hooks, resets the
+JDK's global defaults between cases, and ends its JVM after a case that
+leaves threads running (see QuizHarness.java).
+CPU time is measured per case on the submission's main thread; peak memory is
+the harness JVM's, shared by the cases it ran.
+
+Java limits and efficiency marks are defined on that measurement: the CPU
+time of the submission's own code, without the JVM's start-up.  Runs that
+start a JVM per case (the fallback below, the local backend, the warm
+backend with JAVA_HARNESS_ENABLED off) measure the whole JVM with wait4, so
+they are put on the same footing with discount_startup(): what an empty
+program costs a fresh JVM on this host (jvm_startup(), measured once per
+process) is taken off their CPU and wall time, and added to their timeout.
+"""
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+
+from .compile_cache import compile_source
+from django.conf import settings
+
+from .process import OUTPUT_LIMIT_BYTES, OUTPUT_LIMIT_EXCEEDED, ProcessResult, java_memory_options, run_process
+
+logger = logging.getLogger(__name__)
+
+HARNESS_SOURCE = os.path.join(os.path.dirname(__file__), 'java', 'QuizHarness.java')
+HARNESS_CLASS = 'QuizHarness'
+
+# Allowance for JVM startup on top of the per-case limits before we give up on a harness
+STARTUP_GRACE = 10
+# Lets the harness find the shutdown hooks a case registers, to run them when the case ends
+HARNESS_OPTIONS = ['--add-opens=java.base/java.lang=ALL-UNNAMED']
+
+# An empty program: what running it costs is the JVM's own start-up and exit
+STARTUP_PROBE_CLASS = 'QuizIdle'
+STARTUP_PROBE_SOURCE = 'public class QuizIdle { public static void main(String[] args) { } }\n'
+STARTUP_PROBE_RUNS = 3
+
+_startup = {}
+_startup_lock = threading.Lock()
+
+
+def _harness_dir(env):
+    with open(HARNESS_SOURCE, encoding='utf-8') as f:
+        source = f.read()
+    artifact_dir, error = compile_source('java', source, f'{HARNESS_CLASS}.java', env=env, timeout=60)
+    if error:
+        raise RuntimeError(f'Could not build Java harness: {error}')
+    return artifact_dir
+
+
+def _read(path, limit=-1):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(limit).decode('utf-8', errors='replace')
+    except OSError:
+        return ''
+
+
+def jvm_startup(env=None, memory_mb=None):
+    """
+    (CPU seconds, wall seconds) a fresh JVM spends running an empty program
+    on this host, the best of STARTUP_PROBE_RUNS runs; (0.0, 0.0) if it
+    cannot be measured.  Measured once per process for each environment and
+    heap limit.
+    """
+    options = java_memory_options(memory_mb)
+    key = (tuple(sorted((env or {}).items())), tuple(options))
+    with _startup_lock:
+        if key in _startup:
+            return _startup[key]
+        startup = (0.0, 0.0)
+        try:
+            probe_dir, error = compile_source(
+                'java', STARTUP_PROBE_SOURCE, f'{STARTUP_PROBE_CLASS}.java', env=env, timeout=60,
+            )
+            if error:
+                raise RuntimeError(error)
+            cmd = ['java'] + options + ['-cp', probe_dir, STARTUP_PROBE_CLASS]
+            runs = [
+                run_process(cmd, '', STARTUP_GRACE, probe_dir, env=env, limit_memory=False)
+                for _ in range(STARTUP_PROBE_RUNS)
+            ]
+            if any(run.returncode != 0 for run in runs):
+                raise RuntimeError(runs[0].stderr[:500])
+            startup = (min(run.cpu_time for run in runs), min(run.elapsed for run in runs))
+        except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+            logger.warning(f'Could not measure JVM start-up, Java runs outside the harness include it: {e}')
+        _startup[key] = startup
+        return startup
+
+
+def discount_startup(result, env=None, memory_mb=None):
+    """
+    Take the JVM's start-up off the CPU and wall time of a one-JVM-per-run
+    result (a ProcessResult; a TimeoutExpired is returned as it is), so it
+    measures what the harness measures.
+    """
+    if isinstance(result, ProcessResult):
+        startup_cpu, startup_wall = jvm_startup(env, memory_mb)
+        result.cpu_time = max(result.cpu_time - startup_cpu, 0.0)
+        result.elapsed = max(result.elapsed - startup_wall, 0.0)
+    return result
+
+
+def startup_timeout(timeout, env=None, memory_mb=None):
+    """Wall-clock timeout for a one-JVM-per-run case: `timeout` plus the JVM's start-up"""
+    return timeout + jvm_startup(env, memory_mb)[1]
+
+
+def _run_separately(class_dir, class_name, inputs, timeout, cwd, env, expected_outputs=None, cancel=None,
+                    on_result=None, memory_mb=None):
+    """Fallback: one JVM per test case, like the original runner"""
+    results = []
+    cmd = ['java'] + java_memory_options(memory_mb) + ['-cp', class_dir, class_name]
+    for stdin_data, expected in zip(inputs, expected_outputs or [None] * len(inputs)):
+        try:
+            results.append(discount_startup(run_process(
+                cmd, stdin_data, startup_timeout(timeout, env, memory_mb), cwd, env=env, limit_memory=False,
+                expected=expected, cancel=cancel,
+            ), env, memory_mb))
+        except subprocess.TimeoutExpired as e:
+            results.append(subprocess.TimeoutExpired(e.cmd, timeout))
+        if on_result:
+            on_result(len(results) - 1, results[-1])
+    return results
+
+
+def _residual(proc, output, env, memory_mb):
+    """Wall time of the case a harness JVM ended in: what it did not spend on finished cases or starting up"""
+    return max(proc.elapsed - output.spent - jvm_startup(env, memory_mb)[1], 0.0)
+
+
+class _HarnessOutput:
+    """
+    Reads the harness's progress lines (START/CASE/TIMEOUT/LIMIT) as they
+    arrive, so each case's result is known, and can be reported, as soon as
+    it finishes rather than when the JVM exits.
+    """
+
+    def __init__(self, cmd, case_dir, timeout, results, on_result=None):
+        self.cmd = cmd
+        self.case_dir = case_dir
+        self.timeout = timeout
+        self.results = results
+        self.on_result = on_result
+        self.finished = []      # cases whose results came from CASE lines, in order
+        self.current = None     # case started but not finished
+        self.limited = None     # case stopped for exceeding the output limit
+        self.spent = 0.0
+        self._buffer = b''
+
+    def feed(self, data):
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b'\n')
+        for line in lines:
+            self._line(line.decode('utf-8', errors='replace').split())
+
+    def _line(self, parts):
+        if len(parts) == 2 and parts[0] == 'START':
+            self.current = int(parts[1])
+        elif len(parts) == 5 and parts[0] == 'CASE':
+            i, elapsed, cpu_time = int(parts[1]), int(parts[3]) / 1e9, int(parts[4]) / 1e9
+            self.spent += elapsed
+            # Peak memory is the JVM's, filled in once it has exited
+            self.results[i] = ProcessResult(
+                self.cmd, int(parts[2]),
+                _read(os.path.join(self.case_dir, f'case_{i}.out')),
+                _read(os.path.join(self.case_dir, f'case_{i}.err')),
+                elapsed, cpu_time,
+            )
+            self.finished.append(i)
+            self.current = None
+            if self.on_result:
+                self.on_result(i, self.results[i])
+        elif len(parts) == 2 and parts[0] == 'TIMEOUT':
+            i = int(parts[1])
+            self.results[i] = subprocess.TimeoutExpired(self.cmd, self.timeout)
+            self.current = None
+            if self.on_result:
+                self.on_result(i, self.results[i])
+        elif len(parts) == 2 and parts[0] == 'LIMIT':
+            self.limited = int(parts[1])
+            self.current = None
+
+
+def run_java_cases(class_dir, class_name, inputs, timeout, cwd, env=None, expected_outputs=None, cancel=None,
+                   on_result=None, memory_mb=None):
+    """
+    Run a compiled Java class once per stdin in `inputs`.
+
+    Returns a list aligned with `inputs`; each item is a ProcessResult or a
+    subprocess.TimeoutExpired for cases that ran out of time.  The harness
+    caps each case's output (result.aborted is OUTPUT_LIMIT_EXCEEDED);
+    `expected_outputs` sizes that cap, and also enables early wrong-answer
+    aborts when cases fall back to one JVM each.  Raises
+    cancellation.Cancelled, with the JVM killed, once `cancel` is cancelled.
+    If given, on_result(index, result) is called as each case finishes.
+    memory_mb overrides EXECUTION_MEMORY_LIMIT_MB for the heap limit.
+    """
+    if not inputs:
+        return []
+    try:
+        harness_dir = _harness_dir(env)
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        logger.warning(f'Java harness unavailable, running cases separately: {e}')
+        return _run_separately(
+            class_dir, class_name, inputs, timeout, cwd, env, expected_outputs, cancel, on_result, memory_mb,
+        )
+
+    output_limit = getattr(settings, 'EXECUTION_OUTPUT_LIMIT_BYTES', OUTPUT_LIMIT_BYTES)
+    if expected_outputs:
+        # A correct answer must always fit, however long it is
+        output_limit = max([output_limit] + [2 * len(e.encode('utf-8')) for e in expected_outputs])
+    case_dir = tempfile.mkdtemp(prefix='java_cases_', dir=cwd)
+    try:
+        for i, stdin_data in enumerate(inputs):
+            with open(os.path.join(case_dir, f'case_{i}.in'), 'wb') as f:
+                f.write((stdin_data or '').encode('utf-8'))
+
+        cmd = ['java', '-cp', class_dir, class_name]
+        results = [None] * len(inputs)
+        first = 0
+        while first < len(inputs):
+            harness_cmd = ['java'] + java_memory_options(memory_mb) + HARNESS_OPTIONS + [
+                '-cp', harness_dir, HARNESS_CLASS,
+                class_dir, class_name, case_dir, str(first), str(len(inputs)), str(int(timeout * 1000)),
+                str(output_limit),
+            ]
+            budget = (len(inputs) - first) * timeout + STARTUP_GRACE
+            output = _HarnessOutput(cmd, case_dir, timeout, results, on_result)
+            proc = run_process(
+                harness_cmd, '', budget, cwd, env=env, limit_memory=False, raise_on_timeout=False, cancel=cancel,
+                on_output=output.feed,
+            )
+            for i in output.finished:
+                results[i].peak_rss_kb = proc.peak_rss_kb
+
+            # The case that was running when the JVM ended is only known now
+            late = None
+            if output.limited is not None:
+                late = i = output.limited
+                residual = _residual(proc, output, env, memory_mb)
+                results[i] = ProcessResult(
+                    cmd, -signal.SIGKILL,
+                    _read(os.path.join(case_dir, f'case_{i}.out'), output_limit),
+                    _read(os.path.join(case_dir, f'case_{i}.err'), output_limit),
+                    residual, residual, proc.peak_rss_kb, aborted=OUTPUT_LIMIT_EXCEEDED,
+                )
+            elif output.current is not None and results[output.current] is None:
+                late = current = output.current
+                if proc.returncode is not None and proc.returncode < 0:
+                    # Harness itself was killed while running this case
+                    results[current] = subprocess.TimeoutExpired(cmd, timeout)
+                else:
+                    # The submission called System.exit(); its exit code is the JVM's
+                    residual = _residual(proc, output, env, memory_mb)
+                    results[current] = ProcessResult(
+                        cmd, proc.returncode,
+                        _read(os.path.join(case_dir, f'case_{current}.out')),
+                        _read(os.path.join(case_dir, f'case_{current}.err')),
+                        # The JVM's own CPU (startup, JIT, GC threads) would swamp this case's, so
+                        # the leftover wall time is the best estimate for both
+                        residual, residual, proc.peak_rss_kb,
+                    )
+            if on_result and late is not None:
+                on_result(late, results[late])
+
+            pending = [i for i in range(first, len(inputs)) if results[i] is None]
+            if pending and pending[0] == first and output.current is None:
+                # Harness never got to run anything - fall back rather than loop
+                logger.warning(f'Java harness failed to start: {proc.stderr[:500]}')
+                offset = first
+                results[first:] = _run_separately(
+                    class_dir, class_name, inputs[first:], timeout, cwd, env,
+                    expected_outputs[first:] if expected_outputs else None, cancel,
+                    on_result and (lambda i, res: on_result(offset + i, res)), memory_mb,
+                )
+                break
+            first = pending[0] if pending else len(inputs)
+        return results
+    finally:
+        shutil.rmtree(case_dir, ignore_errors=True)
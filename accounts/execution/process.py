@@ -0,0 +1,297 @@
+"""
+Child-process runner with resource accounting and limits.
+
+Wall-clock time around subprocess.run includes queueing and contention on a
+busy host, so it is a poor basis for efficiency marks.  run_process reaps the
+child with wait4(), which reports the user+sys CPU time and peak resident
+memory of that child alone, and applies CPU-time and address-space rlimits
+before the program starts.
+
+Output is streamed rather than buffered whole: each stream is capped, and
+stdout is compared with the expected answer as it arrives, so a program
+stuck printing in a loop, or one that has already printed a wrong answer, is
+killed straight away instead of running (and filling memory) until the
+timeout.
+"""
+import codecs
+import math
+import os
+import resource
+import selectors
+import signal
+import subprocess
+import time
+
+from django.conf import settings
+
+MEMORY_LIMIT_MB = 256
+OUTPUT_LIMIT_BYTES = 1024 * 1024   # per stream
+CANCEL_POLL_INTERVAL = 0.05        # seconds between checks of a run's cancel token
+
+# Why a run was stopped before it finished on its own
+WRONG_ANSWER = 'wrong_answer'
+OUTPUT_LIMIT_EXCEEDED = 'output_limit_exceeded'
+
+
+class ProcessResult(subprocess.CompletedProcess):
+    """CompletedProcess plus wall time, CPU time (seconds) and peak RSS (KB) of the child"""
+
+    def __init__(self, args, returncode, stdout, stderr, elapsed, cpu_time=0.0, peak_rss_kb=0, timed_out=False,
+                 aborted=None):
+        super().__init__(args, returncode, stdout=stdout, stderr=stderr)
+        self.elapsed = elapsed
+        self.cpu_time = cpu_time
+        self.peak_rss_kb = peak_rss_kb
+        self.timed_out = timed_out
+        self.aborted = aborted     # WRONG_ANSWER / OUTPUT_LIMIT_EXCEEDED if we killed it early
+
+
+def memory_limit_bytes(mb=None):
+    """Address-space limit for a run: `mb` (e.g. a question's calibrated limit) or EXECUTION_MEMORY_LIMIT_MB"""
+    mb = mb or getattr(settings, 'EXECUTION_MEMORY_LIMIT_MB', MEMORY_LIMIT_MB)
+    return mb * 1024 * 1024 if mb else None
+
+
+def cpu_limit_seconds(timeout):
+    return max(1, math.ceil(timeout))
+
+
+def java_memory_options(mb=None):
+    """
+    The JVM reserves far more address space than it uses, so RLIMIT_AS would
+    stop it from starting; Java runs are capped with a heap limit instead.
+    """
+    mb = mb or getattr(settings, 'EXECUTION_MEMORY_LIMIT_MB', MEMORY_LIMIT_MB)
+    return [f'-Xmx{mb}m'] if mb else []
+
+
+def apply_limits(cpu_seconds=None, memory_bytes=None):
+    """Set rlimits on the current process; called in the child right before exec"""
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def is_cpu_limit_kill(returncode, cpu_time, cpu_seconds):
+    """True if the exit status means the child hit its CPU-time rlimit"""
+    if returncode == -signal.SIGXCPU:
+        return True
+    return bool(cpu_seconds) and returncode == -signal.SIGKILL and cpu_time >= cpu_seconds
+
+
+class OutputMonitor:
+    """
+    Collects a child's stdout/stderr as it arrives, at most `limit` bytes per
+    stream, and checks stdout against the expected output on the fly.
+
+    The check mirrors the final comparison (strip both sides, ignore CR/CRLF
+    differences): once stdout can no longer equal `expected`, feed() reports
+    WRONG_ANSWER; once a stream goes past its cap, OUTPUT_LIMIT_EXCEEDED.
+    """
+
+    def __init__(self, expected=None, limit=None, listener=None):
+        limit = limit or getattr(settings, 'EXECUTION_OUTPUT_LIMIT_BYTES', OUTPUT_LIMIT_BYTES)
+        self.expected = None if expected is None else expected.replace('\r\n', '\n').replace('\r', '\n').strip()
+        # A correct answer must always fit, however long it is
+        self.stdout_limit = max(limit, 2 * len(self.expected.encode('utf-8'))) if self.expected else limit
+        self.stderr_limit = limit
+        self.listener = listener    # called with each stdout chunk as it arrives
+        self.stdout_chunks, self.stderr_chunks = [], []
+        self.stdout_bytes = self.stderr_bytes = 0
+        self.aborted = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._held_cr = False   # a chunk ended in \r; the next one decides if it was \r\n
+        self._pos = -1          # chars of `expected` matched so far; -1 until leading whitespace is skipped
+
+    def feed(self, stream, data):
+        """Take a chunk read from 'stdout' or 'stderr'. Returns the abort reason, if any."""
+        if stream == 'stderr':
+            self.stderr_bytes += len(data)
+            if self.stderr_bytes > self.stderr_limit:
+                self.stderr_chunks.append(data[:len(data) - (self.stderr_bytes - self.stderr_limit)])
+                self.aborted = OUTPUT_LIMIT_EXCEEDED
+            else:
+                self.stderr_chunks.append(data)
+            return self.aborted
+
+        if self.listener:
+            self.listener(data)
+        self.stdout_bytes += len(data)
+        if self.stdout_bytes > self.stdout_limit:
+            self.stdout_chunks.append(data[:len(data) - (self.stdout_bytes - self.stdout_limit)])
+            self.aborted = OUTPUT_LIMIT_EXCEEDED
+            return self.aborted
+        self.stdout_chunks.append(data)
+        if self.expected is not None and not self._matches(self._decoder.decode(data)):
+            self.aborted = WRONG_ANSWER
+        return self.aborted
+
+    def _matches(self, text):
+        if self._held_cr:
+            text = '\r' + text
+            self._held_cr = False
+        if text.endswith('\r'):
+            text = text[:-1]
+            self._held_cr = True
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+        expected = self.expected
+        pos = self._pos
+        for ch in text:
+            if pos < 0:
+                if ch.isspace():
+                    continue
+                pos = 0
+            if pos < len(expected):
+                if ch != expected[pos]:
+                    return False
+                pos += 1
+            elif not ch.isspace():
+                return False    # extra output after the full answer
+        self._pos = pos
+        return True
+
+    @property
+    def stdout(self):
+        return b''.join(self.stdout_chunks).decode('utf-8', errors='replace')
+
+    @property
+    def stderr(self):
+        return b''.join(self.stderr_chunks).decode('utf-8', errors='replace')
+
+
+def pump(stdin_fd, stdout_fd, stderr_fd, stdin_data, monitor, deadline, stop, cancel=None):
+    """
+    Feed stdin_data to a child and stream its stdout/stderr into `monitor`
+    until both reach EOF, the monitor aborts, the deadline passes or the
+    `cancel` token (cancellation.CancelToken) is cancelled.  In all but the
+    first case `stop()` is called to kill the child before its pipes are
+    closed.  Closes all three fds.  Returns True if the deadline passed.
+    """
+    pending_input = memoryview((stdin_data or '').encode('utf-8'))
+    names = {stdout_fd: 'stdout', stderr_fd: 'stderr'}
+    timed_out = cancelled = False
+    with selectors.DefaultSelector() as sel:
+        sel.register(stdout_fd, selectors.EVENT_READ)
+        sel.register(stderr_fd, selectors.EVENT_READ)
+        if pending_input:
+            os.set_blocking(stdin_fd, False)
+            sel.register(stdin_fd, selectors.EVENT_WRITE)
+        else:
+            os.close(stdin_fd)
+
+        while sel.get_map() and not monitor.aborted:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            if cancel is not None:
+                if cancel.cancelled():
+                    cancelled = True
+                    break
+                remaining = min(remaining, CANCEL_POLL_INTERVAL)
+            for key, _ in sel.select(remaining):
+                fd = key.fd
+                if fd == stdin_fd:
+                    try:
+                        pending_input = pending_input[os.write(fd, pending_input[:65536]):]
+                    except BlockingIOError:
+                        continue
+                    except BrokenPipeError:
+                        pending_input = pending_input[:0]
+                    if not pending_input:
+                        sel.unregister(fd)
+                        os.close(fd)
+                else:
+                    data = os.read(fd, 65536)
+                    if not data:
+                        sel.unregister(fd)
+                        os.close(fd)
+                    elif monitor.feed(names[fd], data):
+                        break
+
+        if timed_out or cancelled or monitor.aborted:
+            stop()
+        for key in list(sel.get_map().values()):
+            os.close(key.fd)
+    return timed_out
+
+
+def run_process(cmd, stdin_data, timeout, cwd, env=None, limit_memory=True, cpu_seconds=None,
+                raise_on_timeout=True, expected=None, cancel=None, on_output=None, memory_mb=None):
+    """
+    Run `cmd` with the given stdin and capture its output, like
+    subprocess.run(..., capture_output=True, text=True, timeout=timeout).
+
+    Output is streamed through an OutputMonitor: capture is capped, and if
+    `expected` is given the program is killed as soon as its stdout cannot
+    match it; result.aborted then says why.  memory_mb overrides
+    EXECUTION_MEMORY_LIMIT_MB for this run.  on_output, if given, is called
+    with each chunk of stdout (bytes) as it arrives.
+
+    Returns a ProcessResult.  Raises subprocess.TimeoutExpired if the program
+    runs past `timeout` seconds of wall time or its CPU-time limit, unless
+    raise_on_timeout is False, in which case the result has timed_out set and
+    carries whatever output was produced.  Raises cancellation.Cancelled if
+    `cancel` is cancelled first; the program is killed in that case.
+    """
+    cpu_seconds = cpu_seconds or cpu_limit_seconds(timeout)
+    memory_bytes = memory_limit_bytes(memory_mb) if limit_memory else None
+
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        cwd=cwd, env=env, start_new_session=True,
+        preexec_fn=lambda: apply_limits(cpu_seconds, memory_bytes),
+    )
+    deadline = start + timeout
+    monitor = OutputMonitor(expected, listener=on_output)
+    # pump() owns the fds from here on
+    timed_out = pump(
+        _detach(proc.stdin), _detach(proc.stdout), _detach(proc.stderr), stdin_data, monitor, deadline,
+        stop=lambda: _kill_group(proc.pid), cancel=cancel,
+    )
+
+    # Reap with wait4 so we get this child's own rusage
+    status, usage = None, None
+    while status is None:
+        pid, wstatus, rusage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            status, usage = wstatus, rusage
+            break
+        if time.monotonic() >= deadline or (cancel is not None and cancel.cancelled()):
+            timed_out = time.monotonic() >= deadline
+            _kill_group(proc.pid)
+            _, status, usage = os.wait4(proc.pid, 0)
+            break
+        time.sleep(0.001)
+    elapsed = time.monotonic() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)  # already reaped; stop Popen from waiting again
+
+    if cancel is not None:
+        cancel.check()
+
+    cpu_time = usage.ru_utime + usage.ru_stime
+    timed_out = timed_out or is_cpu_limit_kill(proc.returncode, cpu_time, cpu_seconds)
+    if timed_out and raise_on_timeout:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+
+    return ProcessResult(
+        cmd, proc.returncode, monitor.stdout, monitor.stderr,
+        elapsed, cpu_time, usage.ru_maxrss, timed_out, monitor.aborted,
+    )
+
+
+def _detach(stream):
+    """Take the raw fd out of one of Popen's pipe file objects"""
+    fd = os.dup(stream.fileno())
+    stream.close()
+    return fd
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
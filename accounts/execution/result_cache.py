@@ -0,0 +1,120 @@
+"""
+Cache of per-test-case results, shared by Run previews and final grading
+where they build the code the same way.
+
+Candidates usually press Run on exactly the code they then submit, so the
+submission spike at the deadline mostly re-runs work that was just done.
+Each test case's result is stored under sha256(language, toolchain, compile
+flags, limits, code, case input, expected output) in a cache shared by every
+worker (the 'execution' cache alias, file based by default).  Keying by case
+rather than by the whole test set lets grading reuse the sample cases Run
+already executed and run only the hidden ones; editing a case changes its
+key, so old results are simply never read again.
+
+Only languages whose preview and grading compile profiles have the same
+flags (Python and Java by default) share results.  C previews are built with
+-O0, and a record's times are part of what grading marks, so grading runs C
+again on its -O2 build; repeated Runs and repeated gradings of the same C
+code still hit the cache.
+
+Each entry is one case record (see grading.case_record) plus the timeout it
+ran under.  An entry is only reused when it would have come out the same
+under the reader's timeout: the case finished well inside it, or it timed
+out with at least as long.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+from .compile_cache import GRADING, compile_flags, toolchain_version
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'execution'
+CACHE_VERSION = 3   # bump when the record format, or how its times are measured, changes
+
+
+def _cache():
+    if not getattr(settings, 'EXECUTION_RESULT_CACHE_ENABLED', True):
+        return None
+    try:
+        return caches[getattr(settings, 'EXECUTION_RESULT_CACHE_ALIAS', CACHE_ALIAS)]
+    except InvalidCacheBackendError:
+        return None
+
+
+def code_key(code, language, env=None, profile=GRADING, limits=None):
+    """
+    Hash of everything besides the test case that decides a result.
+    `limits` are the question's calibration.Limits, if it has its own.
+    """
+    toolchain = toolchain_version(language, env) or 'missing'
+    limits = (
+        (limits and limits.memory_mb) or getattr(settings, 'EXECUTION_MEMORY_LIMIT_MB', None),
+        getattr(settings, 'EXECUTION_OUTPUT_LIMIT_BYTES', None),
+        limits and limits.cpu_limit,
+    )
+    h = hashlib.sha256()
+    flags = ' '.join(compile_flags(language, profile))
+    for part in (language, toolchain, flags, repr(limits), code):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def result_key(prefix, test_case):
+    h = hashlib.sha256(prefix.encode('utf-8'))
+    for part in (test_case.input_data, test_case.expected_output):
+        h.update(b'\0')
+        h.update(part.encode('utf-8'))
+    return f'result:{CACHE_VERSION}:{h.hexdigest()}'
+
+
+def _usable(entry, timeout):
+    record = entry['record']
+    if record['returncode'] is None:
+        return entry['timeout'] >= timeout    # might have finished given longer
+    # would have timed out under a shorter limit
+    return record['elapsed'] < timeout and record['cpu_time'] < timeout
+
+
+def get_results(code, language, test_cases, timeout, env=None, profile=GRADING, limits=None):
+    """
+    Cached case records for this code, one per test case, with None for the
+    cases that still have to run.  None if nothing is cached.
+    """
+    cache = _cache()
+    if cache is None or not test_cases:
+        return None
+    prefix = code_key(code, language, env, profile, limits)
+    keys = [result_key(prefix, tc) for tc in test_cases]
+    try:
+        entries = cache.get_many(keys)
+    except Exception as e:
+        logger.warning(f'Result cache read failed: {e}')
+        return None
+    records = [
+        entries[key]['record'] if key in entries and _usable(entries[key], timeout) else None
+        for key in keys
+    ]
+    if all(record is None for record in records):
+        return None
+    return records
+
+
+def store_results(code, language, test_cases, timeout, records, env=None, profile=GRADING, limits=None):
+    """Cache the records of the cases that were just run (pairs up with test_cases)"""
+    cache = _cache()
+    if cache is None or not test_cases:
+        return
+    prefix = code_key(code, language, env, profile, limits)
+    try:
+        cache.set_many({
+            result_key(prefix, tc): {'timeout': timeout, 'record': record}
+            for tc, record in zip(test_cases, records)
+        })
+    except Exception as e:
+        logger.warning(f'Result cache write failed: {e}')
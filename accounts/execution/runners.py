@@ -0,0 +1,97 @@
+"""
+Per-language runners: how to turn a submission into something runnable
+(write the source, compile it through the compile cache) and which command
+runs it.  How that command is launched is up to the executor backend.
+"""
+import os
+import re
+from collections import namedtuple
+
+from .compile_cache import GRADING, compile_source
+from .process import java_memory_options
+from .toolchains import get_registry
+
+# A compiled (or written) submission.  `args` is language specific:
+# python [source path], c [binary path], java [class dir, class name].
+# memory_mb overrides EXECUTION_MEMORY_LIMIT_MB for its runs (a question's
+# calibrated limit; set with _replace).  Plain lists, strings and numbers only,
+# so it can be sent to an exec_worker.
+Prepared = namedtuple('Prepared', 'language args work_dir memory_mb', defaults=(None,))
+
+
+class Runner:
+    """Language-specific half of running a submission"""
+    language = None
+    # False for the JVM, which reserves far more address space than it uses
+    limit_memory = True
+
+    def prepare(self, code, work_dir, env=None, timeout=30, profile=GRADING):
+        """
+        Write/compile `code` under work_dir with a compile profile (compile_cache.PREVIEW / GRADING).
+        Returns (Prepared, None) or (None, compile error).
+        """
+        raise NotImplementedError
+
+    def command(self, prepared):
+        """argv that runs a prepared submission as a plain process"""
+        raise NotImplementedError
+
+
+class PythonRunner(Runner):
+    language = 'python'
+
+    def prepare(self, code, work_dir, env=None, timeout=30, profile=GRADING):
+        os.makedirs(work_dir, exist_ok=True)
+        src = os.path.join(work_dir, 'solution.py')
+        with open(src, 'w', encoding='utf-8') as f:
+            f.write(code)
+        return Prepared(self.language, [src], work_dir), None
+
+    def command(self, prepared):
+        return [get_registry().get('python').paths['python']] + prepared.args
+
+
+class CRunner(Runner):
+    language = 'c'
+
+    def prepare(self, code, work_dir, env=None, timeout=30, profile=GRADING):
+        os.makedirs(work_dir, exist_ok=True)
+        artifact_dir, compile_err = compile_source(
+            'c', code, 'solution.c', env=env, timeout=timeout, profile=profile,
+        )
+        if compile_err:
+            return None, compile_err
+        return Prepared(self.language, [os.path.join(artifact_dir, 'solution.exe')], work_dir), None
+
+    def command(self, prepared):
+        return list(prepared.args)
+
+
+class JavaRunner(Runner):
+    language = 'java'
+    limit_memory = False
+
+    def prepare(self, code, work_dir, env=None, timeout=30, profile=GRADING):
+        os.makedirs(work_dir, exist_ok=True)
+        m = re.search(r'public\s+class\s+(\w+)', code)
+        class_name = m.group(1) if m else 'Solution'
+        artifact_dir, compile_err = compile_source(
+            'java', code, f'{class_name}.java', env=env, timeout=timeout, profile=profile,
+        )
+        if compile_err:
+            return None, compile_err
+        return Prepared(self.language, [artifact_dir, class_name], work_dir), None
+
+    def command(self, prepared):
+        class_dir, class_name = prepared.args
+        return [get_registry().get('java').paths['java']] + java_memory_options(prepared.memory_mb) + [
+            '-cp', class_dir, class_name,
+        ]
+
+
+RUNNERS = {runner.language: runner for runner in (PythonRunner(), CRunner(), JavaRunner())}
+
+
+def get_runner(language):
+    """Runner for a language, or None if it is not supported"""
+    return RUNNERS.get(language)
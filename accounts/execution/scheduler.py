@@ -0,0 +1,151 @@
+"""
+Execution scheduler shared by Run previews and final grading.
+
+Every gunicorn worker and every grade_worker takes an execution slot before it
+compiles or runs candidate code, so the box never runs more than
+EXECUTION_MAX_CONCURRENCY programs at once.  Slots are lock files in a shared
+directory held with flock(), which works across processes and is released
+automatically if a process dies.
+
+Priorities:
+  * grading may use every slot and waits for one;
+  * previews may not use the slots reserved for grading, do not start while
+    any grader is waiting, may only have one run in flight per candidate, and
+    fail fast with Saturated (HTTP 429 + Retry-After) instead of queueing;
+    a newer Run of the same question replaces the one in flight (see
+    cancellation.py) rather than being turned away.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PREVIEW_WAIT_SECONDS = 2.0    # how long a preview may wait for a slot before giving up
+POLL_INTERVAL = 0.02
+
+
+class Saturated(Exception):
+    """No execution capacity for this request; retry after `retry_after` seconds"""
+
+    def __init__(self, message, retry_after=2):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _lock_dir():
+    path = getattr(settings, 'EXECUTION_LOCK_DIR', None) or os.path.join(tempfile.gettempdir(), 'quiz_scheduler')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def max_concurrency():
+    return getattr(settings, 'EXECUTION_MAX_CONCURRENCY', None) or os.cpu_count() or 2
+
+
+def grading_reserved_slots():
+    reserved = getattr(settings, 'EXECUTION_GRADING_RESERVED_SLOTS', None)
+    if reserved is None:
+        reserved = max(1, max_concurrency() // 4)
+    return min(reserved, max_concurrency() - 1) if max_concurrency() > 1 else 0
+
+
+def _try_lock(path, mode=fcntl.LOCK_EX):
+    """Open and flock `path` without blocking. Returns the fd, or None if it is held elsewhere."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        return fd
+    except BlockingIOError:
+        os.close(fd)
+        return None
+
+
+def _release(fd):
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+def _try_slot(indices):
+    lock_dir = _lock_dir()
+    for i in indices:
+        fd = _try_lock(os.path.join(lock_dir, f'slot-{i}.lock'))
+        if fd is not None:
+            return fd
+    return None
+
+
+def _graders_waiting():
+    """True while some grading task anywhere is waiting for a slot"""
+    fd = _try_lock(os.path.join(_lock_dir(), 'grading-waiting.lock'))
+    if fd is None:
+        return True
+    _release(fd)
+    return False
+
+
+@contextmanager
+def grading_slot():
+    """Hold an execution slot for final grading, waiting as long as needed"""
+    total = max_concurrency()
+    # Reserved slots first, so preview slots stay free for previews
+    order = list(range(total - 1, -1, -1))
+    fd = _try_slot(order)
+    if fd is None:
+        lock_dir = _lock_dir()
+        waiting = os.open(os.path.join(lock_dir, 'grading-waiting.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(waiting, fcntl.LOCK_SH)
+        try:
+            while fd is None:
+                time.sleep(POLL_INTERVAL)
+                fd = _try_slot(order)
+        finally:
+            _release(waiting)
+    try:
+        yield
+    finally:
+        _release(fd)
+
+
+@contextmanager
+def preview_slot(candidate_key, cancel=None):
+    """
+    Hold an execution slot for a Run preview.
+    Raises Saturated if this candidate already has a run in flight or no slot frees up quickly.
+
+    With a `cancel` token (cancellation.CancelToken) the candidate's previous
+    run is given the same short wait to notice it has been superseded and
+    stop, and cancellation.Cancelled is raised if this run is superseded in turn.
+    """
+    lock_dir = _lock_dir()
+    key = hashlib.sha1(str(candidate_key).encode('utf-8')).hexdigest()[:16]
+    deadline = time.monotonic() + getattr(settings, 'EXECUTION_PREVIEW_WAIT_SECONDS', PREVIEW_WAIT_SECONDS)
+    candidate_fd = _try_lock(os.path.join(lock_dir, f'candidate-{key}.lock'))
+    while candidate_fd is None:
+        if cancel is None or time.monotonic() >= deadline:
+            raise Saturated('A previous run is still in progress. Please wait for it to finish.', retry_after=1)
+        cancel.check()
+        time.sleep(POLL_INTERVAL)
+        candidate_fd = _try_lock(os.path.join(lock_dir, f'candidate-{key}.lock'))
+
+    try:
+        preview_slots = range(max_concurrency() - grading_reserved_slots())
+        fd = None
+        while fd is None:
+            if cancel is not None:
+                cancel.check()
+            if not _graders_waiting():
+                fd = _try_slot(preview_slots)
+            if fd is None:
+                if time.monotonic() >= deadline:
+                    raise Saturated('The code runner is busy right now. Please try again in a few seconds.')
+                time.sleep(POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            _release(fd)
+    finally:
+        _release(candidate_fd)
@@ -0,0 +1,206 @@
+"""
+Out-of-process execution over a Unix socket.
+
+`manage.py exec_worker` listens on EXECUTION_WORKER_SOCKET and runs every
+prepare/run/run_cases call it receives on a WarmExecutor of its own.
+SocketExecutor is the client side: web and grading workers keep their
+scheduler slots and workspaces, and only the compiling and running happens in
+the worker, which can be started under a separate user or with tighter
+limits.  Both sides must be on the same host, since paths in the workspace
+are passed as-is.
+
+Protocol: one connection per call, a JSON request line from the client and a
+JSON reply line from the worker, preceded for run_cases by one "progress"
+line per case as it finishes.  If the worker cannot be reached the client
+falls back to running the call itself.  Cancel tokens are file-based (see
+cancellation.py), so a run's token is passed along and the worker stops the
+run itself when it is cancelled.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import subprocess
+
+from django.conf import settings
+
+from .cancellation import Cancelled, CancelToken
+from .compile_cache import GRADING
+from .executor import Executor, WarmExecutor, compile_timeout, run_timeout
+from .process import ProcessResult
+from .runners import Prepared
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = '/tmp/quiz_exec_worker.sock'
+REPLY_GRACE = 10   # seconds on top of the call's own time budget before the client gives up
+RESULT_FIELDS = ('args', 'returncode', 'stdout', 'stderr', 'elapsed', 'cpu_time', 'peak_rss_kb', 'timed_out', 'aborted')
+
+
+def socket_path():
+    return getattr(settings, 'EXECUTION_WORKER_SOCKET', None) or DEFAULT_SOCKET
+
+
+def _dump_result(res):
+    if isinstance(res, subprocess.TimeoutExpired):
+        return {'timeout': res.timeout}
+    return {field: getattr(res, field) for field in RESULT_FIELDS}
+
+
+def _load_result(data):
+    if 'timeout' in data:
+        return subprocess.TimeoutExpired('submission', data['timeout'])
+    return ProcessResult(**data)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            reply = self.server.dispatch(request, self.send)
+        except Exception as e:
+            logger.exception('exec_worker request failed')
+            reply = {'failure': str(e)}
+        self.send(reply)
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+
+class WorkerServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, executor=None):
+        if os.path.exists(path):
+            os.unlink(path)   # left behind by a previous worker
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+        self.executor = executor or WarmExecutor()
+
+    def dispatch(self, request, send_progress=None):
+        op = request['op']
+        if op == 'prepare':
+            prepared, error = self.executor.prepare(
+                request['code'], request['language'], request['work_dir'], request.get('profile', GRADING),
+            )
+            return {'prepared': prepared and list(prepared), 'error': error}
+
+        prepared = Prepared(*request['prepared'])
+        cancel = CancelToken.load(request.get('cancel'))
+        try:
+            if op == 'run':
+                try:
+                    res = self.executor.run(
+                        prepared, request['stdin'], request['timeout'], request.get('expected'), cancel,
+                    )
+                except subprocess.TimeoutExpired as e:
+                    res = e
+                return {'result': _dump_result(res)}
+            if op == 'run_cases':
+                on_result = None
+                if send_progress and request.get('progress'):
+                    on_result = lambda i, res: send_progress({'progress': {'index': i, 'result': _dump_result(res)}})
+                results = self.executor.run_cases(
+                    prepared, request['inputs'], request['timeout'], request.get('expected_outputs'), cancel, on_result,
+                )
+                return {'results': [_dump_result(res) for res in results]}
+        except Cancelled:
+            return {'cancelled': True}
+        if op == 'batches':
+            return {'batches': self.executor.batches(prepared)}
+        raise ValueError(f'Unknown operation: {op}')
+
+
+class SocketExecutor(Executor):
+    """Executor that hands every call to an exec_worker process"""
+    name = 'socket'
+
+    def __init__(self, path=None, env=None):
+        super().__init__(env)
+        self.path = path or socket_path()
+        self._fallback = None
+
+    def _local(self):
+        if self._fallback is None:
+            self._fallback = WarmExecutor(env=self.env)
+        return self._fallback
+
+    def _call(self, request, budget, on_progress=None):
+        """
+        Send one request and return the reply, or None if the worker is not
+        running.  Progress lines before the reply go to on_progress.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            try:
+                sock.connect(self.path)
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                logger.warning(f'exec_worker unavailable at {self.path}, running locally: {e}')
+                return None
+            sock.settimeout(budget + REPLY_GRACE)
+            with sock.makefile('rwb') as f:
+                f.write(json.dumps(request).encode('utf-8') + b'\n')
+                f.flush()
+                reply = None
+                while reply is None or 'progress' in reply:
+                    line = f.readline()
+                    if not line:
+                        raise RuntimeError('exec_worker closed the connection without replying')
+                    reply = json.loads(line)
+                    if 'progress' in reply and on_progress:
+                        on_progress(reply['progress'])
+        finally:
+            sock.close()
+        if 'failure' in reply:
+            raise RuntimeError(f'exec_worker failed: {reply["failure"]}')
+        if reply.get('cancelled'):
+            raise Cancelled('Run cancelled')
+        return reply
+
+    def prepare(self, code, language, work_dir, profile=GRADING):
+        reply = self._call(
+            {'op': 'prepare', 'code': code, 'language': language, 'work_dir': work_dir, 'profile': profile},
+            compile_timeout(),
+        )
+        if reply is None:
+            return self._local().prepare(code, language, work_dir, profile)
+        prepared = reply['prepared']
+        return (Prepared(*prepared) if prepared else None), reply['error']
+
+    def run(self, prepared, stdin_data, timeout=None, expected=None, cancel=None):
+        timeout = timeout or run_timeout()
+        reply = self._call(
+            {
+                'op': 'run', 'prepared': list(prepared), 'stdin': stdin_data, 'timeout': timeout, 'expected': expected,
+                'cancel': cancel and cancel.dump(),
+            },
+            timeout,
+        )
+        if reply is None:
+            return self._local().run(prepared, stdin_data, timeout, expected, cancel)
+        res = _load_result(reply['result'])
+        if isinstance(res, subprocess.TimeoutExpired):
+            raise res
+        return res
+
+    def batches(self, prepared):
+        reply = self._call({'op': 'batches', 'prepared': list(prepared)}, 0)
+        if reply is None:
+            return self._local().batches(prepared)
+        return reply['batches']
+
+    def run_cases(self, prepared, inputs, timeout=None, expected_outputs=None, cancel=None, on_result=None):
+        timeout = timeout or run_timeout()
+        reply = self._call(
+            {
+                'op': 'run_cases', 'prepared': list(prepared), 'inputs': inputs, 'timeout': timeout,
+                'expected_outputs': expected_outputs, 'cancel': cancel and cancel.dump(), 'progress': bool(on_result),
+            },
+            timeout * max(1, len(inputs)),
+            on_progress=on_result and (lambda p: on_result(p['index'], _load_result(p['result']))),
+        )
+        if reply is None:
+            return self._local().run_cases(prepared, inputs, timeout, expected_outputs, cancel, on_result)
+        return [_load_result(data) for data in reply['results']]
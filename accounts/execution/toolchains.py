@@ -0,0 +1,134 @@
+"""
+Registry of the compilers and runtimes this host has.
+
+Resolved once per process when the app starts (AccountsConfig.ready): the
+environment programs run with (including a bundled Java install, if there is
+one), where each language's binaries are, and their version banners.  Requests
+only read it, so they never probe the filesystem or copy os.environ, the quiz
+page can hide languages this host cannot run, and cache keys get a version
+that stays the same for the life of the process.  Missing toolchains are
+reported by a system check (accounts/checks.py), not on every start.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from types import MappingProxyType
+
+# In the order the quiz page offers them
+LANGUAGES = {
+    'c': {
+        'label': 'C',
+        'binaries': ['gcc'],
+        'version_cmd': ['gcc', '--version'],
+        'missing': "C compiler (gcc) not found. System configuration error.",
+    },
+    'python': {
+        'label': 'Python',
+        'binaries': ['python'],
+        'version_cmd': ['python', '--version'],
+        'missing': "Python interpreter not found. System configuration error.",
+    },
+    'java': {
+        'label': 'Java',
+        'binaries': ['javac', 'java'],
+        'version_cmd': ['javac', '-version'],
+        'missing': "Java compiler (javac) not found. System configuration error.",
+    },
+}
+
+_registry = None
+_lock = threading.Lock()
+
+
+class Toolchain:
+    """Resolved binaries and version of one language; `version` is None if something is missing"""
+
+    def __init__(self, language, paths, version):
+        self.language = language
+        self.label = LANGUAGES[language]['label']
+        self.missing = LANGUAGES[language]['missing']
+        self.paths = paths   # binary name -> absolute path (None if not found)
+        self.version = version
+
+    @property
+    def available(self):
+        return self.version is not None and all(self.paths.values())
+
+
+class Registry:
+    def __init__(self, env, toolchains):
+        self.env = env                 # read-only; pass dict(env) to anything that needs to modify it
+        self.toolchains = toolchains   # language -> Toolchain
+
+    def get(self, language):
+        return self.toolchains.get(language)
+
+    def available_languages(self):
+        """[(language, label)] of the languages this host can compile and run"""
+        return [(lang, tc.label) for lang, tc in self.toolchains.items() if tc.available]
+
+
+def build_env():
+    """Process environment with a bundled Java install on PATH if present"""
+    env = os.environ.copy()
+
+    # Check for local Java installation (.java in project root)
+    # Render Python Native caches the project directory, so we store java there
+    local_java_home = os.path.join(os.getcwd(), '.java')
+    if os.path.exists(os.path.join(local_java_home, 'bin', 'javac')):
+        env['JAVA_HOME'] = local_java_home
+        env['PATH'] = os.path.join(local_java_home, 'bin') + ':' + env.get('PATH', '')
+    elif os.path.exists('/tmp/java/bin/javac'):
+        env['JAVA_HOME'] = '/tmp/java'
+        env['PATH'] = '/tmp/java/bin:' + env.get('PATH', '')
+    return env
+
+
+def probe_version(language, env=None):
+    """First line of the language's version banner, or None if the tool is missing"""
+    cmd = LANGUAGES[language]['version_cmd']
+    path = (env or os.environ).get('PATH')
+    binary = shutil.which(cmd[0], path=path)
+    if binary is None and language == 'python':
+        binary = sys.executable   # the interpreter running us, as the fork-server does
+    if binary is None:
+        return None
+    try:
+        res = subprocess.run([binary] + cmd[1:], capture_output=True, text=True, timeout=30, env=env)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    banner = (res.stdout or res.stderr).strip().splitlines()
+    return banner[0] if banner else 'unknown'
+
+
+def resolve():
+    """Probe every language and (re)build the registry. Returns it."""
+    global _registry
+    env = build_env()
+    toolchains = {}
+    for language, spec in LANGUAGES.items():
+        paths = {name: shutil.which(name, path=env.get('PATH')) for name in spec['binaries']}
+        if language == 'python' and not paths['python']:
+            paths['python'] = sys.executable
+        toolchains[language] = Toolchain(language, paths, probe_version(language, env))
+
+    registry = Registry(MappingProxyType(env), toolchains)
+    with _lock:
+        _registry = registry
+    return registry
+
+
+def get_registry():
+    """The process-wide registry, resolved on first use if the app did not do it at startup"""
+    if _registry is None:
+        with _lock:
+            pending = _registry is None
+        if pending:
+            return resolve()
+    return _registry
+
+
+def available_languages():
+    return get_registry().available_languages()
@@ -0,0 +1,67 @@
+"""
+Compact per-test-case results for CodeSubmission.
+
+A graded submission keeps, besides its aggregate scores, one verdict byte
+and one CPU time per test case (in test-case order) in two BinaryFields,
+rather than a row per case: at thousands of submissions that stays a few
+bytes per case and needs no extra queries to show.
+
+  case_verdicts  one byte per case, a verdict code below
+  case_cpu_us    little-endian uint32 per case, CPU time in microseconds
+"""
+import struct
+
+from .process import OUTPUT_LIMIT_EXCEEDED, WRONG_ANSWER
+
+ACCEPTED = 0
+WRONG = 1
+TIME_LIMIT = 2
+RUNTIME_ERROR = 3
+OUTPUT_LIMIT = 4
+NOT_RUN = 5         # did not compile, or no code
+
+LABELS = {
+    ACCEPTED: 'AC',
+    WRONG: 'WA',
+    TIME_LIMIT: 'TLE',
+    RUNTIME_ERROR: 'RE',
+    OUTPUT_LIMIT: 'OLE',
+    NOT_RUN: '—',
+}
+
+_MAX_US = 2 ** 32 - 1
+
+
+def verdict(record):
+    """Verdict code of one case record (see grading.case_record)"""
+    if record['passed']:
+        return ACCEPTED
+    if record['returncode'] is None:
+        return TIME_LIMIT
+    if record['aborted'] == OUTPUT_LIMIT_EXCEEDED:
+        return OUTPUT_LIMIT
+    if record['aborted'] == WRONG_ANSWER or record['returncode'] == 0:
+        return WRONG
+    return RUNTIME_ERROR
+
+
+def pack(records, total):
+    """
+    (case_verdicts, case_cpu_us) for a submission's case records; `total`
+    cases that never ran when there are no records.
+    """
+    if not records:
+        return bytes([NOT_RUN] * total), struct.pack(f'<{total}I', *([0] * total))
+    cpu_us = [min(_MAX_US, int(round(record['cpu_time'] * 1e6))) for record in records]
+    return bytes(verdict(record) for record in records), struct.pack(f'<{len(cpu_us)}I', *cpu_us)
+
+
+def unpack(case_verdicts, case_cpu_us):
+    """[(verdict code, CPU ms)] per case; CPU times missing from older rows read as None"""
+    verdicts = bytes(case_verdicts or b'')
+    raw = bytes(case_cpu_us or b'')
+    cpu_us = struct.unpack(f'<{len(raw) // 4}I', raw[:len(raw) // 4 * 4])
+    return [
+        (code, cpu_us[i] / 1000 if i < len(cpu_us) else None)
+        for i, code in enumerate(verdicts)
+    ]
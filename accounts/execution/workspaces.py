@@ -0,0 +1,109 @@
+"""
+Pool of scratch directories for compiling and running submissions.
+
+Creating a temp directory on disk for every Run and every graded submission,
+then deleting it again, puts filesystem work on the hot path and causes I/O
+spikes when a whole round submits at once.  Instead every host keeps a fixed
+set of workspaces, ws-0 .. ws-N, on a RAM-backed filesystem (/dev/shm when it
+is usable, otherwise /tmp/quiz_runs).  A workspace is claimed with flock() on
+its lock file, so all web and grading workers share one pool, and it is
+emptied when it is released.  If every workspace is busy a one-off directory
+is used instead, so callers never wait.
+"""
+import logging
+import os
+import random
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .scheduler import _release, _try_lock, max_concurrency
+
+logger = logging.getLogger(__name__)
+
+TMPFS_DIR = '/dev/shm'
+MIN_TMPFS_FREE_BYTES = 256 * 1024 * 1024   # Docker's default 64 MB /dev/shm is too small to use
+
+_provisioned = set()
+
+
+def workspace_root():
+    root = getattr(settings, 'EXECUTION_WORKSPACE_DIR', None)
+    if root:
+        return root
+    try:
+        stat = os.statvfs(TMPFS_DIR)
+        if os.access(TMPFS_DIR, os.W_OK) and stat.f_bavail * stat.f_frsize >= MIN_TMPFS_FREE_BYTES:
+            return os.path.join(TMPFS_DIR, 'quiz_runs')
+    except OSError:
+        pass
+    return os.path.join(tempfile.gettempdir(), 'quiz_runs')
+
+
+def pool_size():
+    return getattr(settings, 'EXECUTION_WORKSPACE_POOL_SIZE', None) or 2 * max_concurrency()
+
+
+def provision():
+    """Create every workspace in the pool up front. Returns the pool's root directory."""
+    root = workspace_root()
+    if root not in _provisioned:
+        for i in range(pool_size()):
+            os.makedirs(os.path.join(root, f'ws-{i}'), exist_ok=True)
+        _provisioned.add(root)
+    return root
+
+
+def _wipe(path):
+    """Empty a workspace, replacing it outright if something in it cannot be removed"""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+    if os.listdir(path):
+        # e.g. the submission chmod-ed a directory; move it out of the way and start fresh
+        trash = f'{path}.trash-{uuid.uuid4().hex[:8]}'
+        os.rename(path, trash)
+        shutil.rmtree(trash, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+@contextmanager
+def workspace():
+    """Hold an empty working directory from the pool for the duration of the block"""
+    root = provision()
+    size = pool_size()
+    offset = random.randrange(size)   # spread workers over the pool instead of all probing ws-0 first
+    for n in range(size):
+        i = (offset + n) % size
+        fd = _try_lock(os.path.join(root, f'ws-{i}.lock'))
+        if fd is not None:
+            break
+    else:
+        logger.warning(f'All {size} workspaces in {root} are busy; using a temporary directory')
+        path = tempfile.mkdtemp(prefix='overflow-', dir=root)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+        return
+
+    path = os.path.join(root, f'ws-{i}')
+    try:
+        os.makedirs(path, exist_ok=True)
+        if os.listdir(path):
+            _wipe(path)   # left behind by a worker that died while holding it
+        yield path
+    finally:
+        try:
+            _wipe(path)
+        finally:
+            _release(fd)
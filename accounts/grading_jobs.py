@@ -0,0 +1,335 @@
+"""
+DB-backed queue for grading code answers outside the submit request.
+
+submit_quiz scores the MCQs, stores the code answers in a GradingJob and
+returns straight away; the grade_worker management command claims jobs,
+compiles and runs the code and writes the final score.  A claim is a lease:
+if a worker dies mid-job the lease runs out and another worker picks the job
+up again.  While a job is being graded its worker keeps renewing the lease,
+so a job that waits long for execution slots is not taken over by another
+worker while it is still making progress.  CodeSubmission rows, the candidate's score and the job's status
+are written in one transaction that only commits while the worker still owns
+the job, so a submission is never graded twice.
+"""
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CandidateEntry, CodeSubmission, GradingJob
+from .execution.calibration import question_limits
+from .execution.grading import grade_many
+from .execution.verdicts import pack as pack_verdicts
+from .execution.workspaces import workspace
+from .round_bundle import question_bundle
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job while we were grading it"""
+
+
+def score_question(result):
+    """Marks for one graded question: (tc_marks, out_marks, eff_marks, q_score, q_max_score)"""
+    passed, total, out_ok, time_met = result.passed, result.total, result.output_success, result.time_limit_met
+
+    # Test Cases: 2 marks per passing test case
+    tc_marks = passed * 2
+
+    # Output Success: 2 marks if output is correct
+    out_marks = 2 if out_ok else 0
+
+    # Efficiency: 2 marks if the CPU time limit is met
+    eff_marks = 2 if (time_met and passed > 0) else 0
+
+    # Total: sum of all marks
+    q_score = tc_marks + out_marks + eff_marks
+
+    # Max possible score for this question
+    # = (test_cases * 2) + 2 (output) + 2 (efficiency)
+    q_max_score = (total * 2) + 2 + 2
+    return tc_marks, out_marks, eff_marks, q_score, q_max_score
+
+
+def test_set_version(test_cases, limits):
+    """
+    Fingerprint of what a question's answers are graded against: its test
+    cases and limits.  Stored on CodeSubmission so regrade.py can tell which
+    submissions are stale after a test case is fixed.
+    """
+    h = hashlib.sha256(repr(tuple(limits)).encode('utf-8'))
+    for tc in test_cases:
+        for part in (str(tc.order), tc.input_data, tc.expected_output):
+            h.update(b'\0')
+            h.update(part.encode('utf-8'))
+    return h.hexdigest()
+
+
+def enqueue(candidate_entry, coding_subs, dubbing_subs, mcq_score, mcq_total, attended, time_taken_seconds,
+            mcq_responses=None):
+    """
+    Record a submission: mark the candidate submitted with the MCQ score and
+    responses (see mcq.pack_responses) and queue code grading.
+    Returns the GradingJob.
+    """
+    percentage = (mcq_score / mcq_total * 100) if mcq_total > 0 else 0
+    with transaction.atomic():
+        candidate_entry.is_submitted = True
+        candidate_entry.score = mcq_score
+        candidate_entry.percentage = percentage
+        candidate_entry.total_questions = mcq_total
+        candidate_entry.time_taken_seconds = time_taken_seconds
+        candidate_entry.mcq_responses = mcq_responses
+        candidate_entry.save(update_fields=[
+            'is_submitted', 'score', 'percentage', 'total_questions', 'time_taken_seconds', 'mcq_responses',
+        ])
+        return GradingJob.objects.create(
+            candidate=candidate_entry,
+            payload={
+                'coding': {str(qid): sub for qid, sub in coding_subs.items()},
+                'dubbing': {str(qid): sub for qid, sub in dubbing_subs.items()},
+            },
+            mcq_score=mcq_score,
+            mcq_total=mcq_total,
+            attended=attended,
+        )
+
+
+def lease_seconds():
+    return getattr(settings, 'GRADING_JOB_LEASE_SECONDS', None) or LEASE_SECONDS
+
+
+def claim(job_id, worker_id):
+    """Try to take the lease on one job. Returns True if this worker now owns it."""
+    now = timezone.now()
+    return GradingJob.objects.filter(
+        Q(status=GradingJob.STATUS_PENDING) |
+        Q(status=GradingJob.STATUS_RUNNING, locked_until__lt=now),
+        id=job_id,
+    ).update(
+        status=GradingJob.STATUS_RUNNING,
+        locked_by=worker_id,
+        locked_until=now + timedelta(seconds=lease_seconds()),
+        attempts=F('attempts') + 1,
+        started_at=now,
+    ) == 1
+
+
+def renew_lease(job_id, worker_id, model=GradingJob):
+    """
+    Push back the expiry of a lease. Returns False if this worker no longer
+    owns the job.  `model` is GradingJob or another leased queue (QuestionTask).
+    """
+    return model.objects.filter(
+        id=job_id, status=model.STATUS_RUNNING, locked_by=worker_id
+    ).update(
+        locked_until=timezone.now() + timedelta(seconds=lease_seconds())
+    ) == 1
+
+
+@contextmanager
+def keep_lease(job_id, worker_id, model=GradingJob):
+    """Renew the job's lease every third of its length until the block exits"""
+    stop = threading.Event()
+    name = model._meta.verbose_name
+
+    def renew():
+        try:
+            while not stop.wait(lease_seconds() / 3):
+                try:
+                    if not renew_lease(job_id, worker_id, model):
+                        logger.warning(f'Lost the lease on {name} {job_id}')
+                        return
+                except Exception as e:
+                    logger.error(f'Could not renew the lease on {name} {job_id}: {str(e)}')
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=renew, name=f'lease-{job_id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def claim_next(worker_id):
+    """Claim the oldest runnable job, or return None if the queue is empty"""
+    now = timezone.now()
+    # Jobs whose worker keeps dying on them are not retried forever
+    GradingJob.objects.filter(
+        status=GradingJob.STATUS_RUNNING, locked_until__lt=now, attempts__gte=MAX_ATTEMPTS
+    ).update(status=GradingJob.STATUS_FAILED, error='Gave up after repeated worker failures')
+
+    candidates = GradingJob.objects.filter(
+        Q(status=GradingJob.STATUS_PENDING) |
+        Q(status=GradingJob.STATUS_RUNNING, locked_until__lt=now)
+    ).order_by('created_at').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        if claim(job_id, worker_id):
+            return GradingJob.objects.select_related('candidate').get(id=job_id)
+    return None
+
+
+def record_case_outcomes(outcomes):
+    """
+    Add graded submissions' per-case pass/fail to the test cases' failure
+    statistics.  `outcomes` is a list of (test case model, test_cases,
+    records); submissions that did not compile have no records and are not
+    counted.
+    """
+    for model, test_cases, records in outcomes:
+        if not records:
+            continue
+        failed = [tc.id for tc, record in zip(test_cases, records) if not record['passed']]
+        passed = [tc.id for tc, record in zip(test_cases, records) if record['passed']]
+        if failed:
+            model.objects.filter(id__in=failed).update(
+                run_count=F('run_count') + 1, failure_count=F('failure_count') + 1
+            )
+        if passed:
+            model.objects.filter(id__in=passed).update(run_count=F('run_count') + 1)
+
+
+def _grade(job):
+    """
+    Run every queued code answer.  Returns the CodeSubmission rows, the score
+    breakdown and the per-case outcomes for record_case_outcomes.
+    """
+    graded = []
+    for q_type in ('coding', 'dubbing'):
+        for qid, payload in job.payload.get(q_type, {}).items():
+            # Questions and their (normalised) test cases come from the round's cached grading bundle
+            bundled = question_bundle(q_type, qid)
+            if bundled is None:
+                logger.warning(f"{q_type.capitalize()} question {qid} not found")
+                continue
+            graded.append((q_type, int(qid), payload, bundled, list(bundled.cases)))
+
+    limits = [question_limits(bundled.question, payload['lang']) for _, _, payload, bundled, _ in graded]
+    with workspace() as tmp_dir:
+        grade_results = grade_many(
+            [(payload['code'], payload['lang'], tcs) for _, _, payload, _, tcs in graded],
+            tmp_dir,
+            limits=limits,
+        )
+
+    breakdown = {
+        'score': job.mcq_score,
+        'total_questions': job.mcq_total,
+        'attended': job.attended,
+        'testcase_score': 0,
+        'output_score': 0,
+        'efficiency_score': 0,
+        'test_cases_passed': 0,
+        'test_cases_total': 0,
+        'max_score': job.mcq_total,
+    }
+    submissions = []
+    for (q_type, qid, payload, bundled, tcs), result, q_limits in zip(graded, grade_results, limits):
+        passed, total = result.passed, result.total
+        case_verdicts, case_cpu_us = pack_verdicts(result.records, total)
+        tc_marks, out_marks, eff_marks, q_score, q_max_score = score_question(result)
+
+        breakdown['score'] += q_score
+        breakdown['max_score'] += q_max_score
+        breakdown['testcase_score'] += tc_marks
+        breakdown['output_score'] += out_marks
+        breakdown['efficiency_score'] += eff_marks
+        breakdown['test_cases_passed'] += passed
+        breakdown['test_cases_total'] += total
+
+        submissions.append(CodeSubmission(
+            candidate=job.candidate,
+            question_type=q_type,
+            question_id=qid,
+            question_title=bundled.question.title,
+            code=payload['code'],
+            language=payload['lang'],
+            passed_test_cases=passed,
+            total_test_cases=total,
+            output_success=result.output_success,
+            execution_time_ms=result.execution_time_ms,
+            cpu_time_ms=result.cpu_time_ms,
+            peak_memory_kb=result.peak_memory_kb,
+            time_limit_met=result.time_limit_met,
+            testcase_score=tc_marks,
+            output_score=out_marks,
+            efficiency_score=eff_marks,
+            total_score=q_score,
+            case_verdicts=case_verdicts,
+            case_cpu_us=case_cpu_us,
+            test_set_version=test_set_version(tcs, q_limits),
+        ))
+
+    max_score = breakdown['max_score']
+    breakdown['percentage'] = (breakdown['score'] / max_score * 100) if max_score > 0 else 0
+    outcomes = [
+        (bundled.case_model, tcs, result.records) for (_, _, _, bundled, tcs), result in zip(graded, grade_results)
+    ]
+    return submissions, breakdown, outcomes
+
+
+def process(job, worker_id, retry=True):
+    """
+    Grade a claimed job and commit its results. Returns the job's final status.
+    Answers that fail to compile or crash are scored by grade_many; an error
+    here is the host's (database, scheduler, workspace), so the job is
+    released to be tried again, up to MAX_ATTEMPTS.  With retry=False (inline
+    grading, where no worker would pick it up again) it fails at once.
+    """
+    try:
+        with keep_lease(job.id, worker_id):
+            submissions, breakdown, outcomes = _grade(job)
+        with transaction.atomic():
+            # Only the current lease holder may commit; otherwise roll everything back
+            owned = GradingJob.objects.filter(
+                id=job.id, status=GradingJob.STATUS_RUNNING, locked_by=worker_id
+            ).update(
+                status=GradingJob.STATUS_DONE, result=breakdown, error='', finished_at=timezone.now()
+            )
+            if not owned:
+                raise LeaseLost(f'Grading job {job.id} is no longer owned by {worker_id}')
+
+            CodeSubmission.objects.filter(candidate=job.candidate).delete()
+            CodeSubmission.objects.bulk_create(submissions)
+            record_case_outcomes(outcomes)
+            CandidateEntry.objects.filter(id=job.candidate_id).update(
+                score=breakdown['score'],
+                percentage=breakdown['percentage'],  # Save percentage
+                total_questions=breakdown['max_score'],  # Store max possible score for display
+            )
+        return GradingJob.STATUS_DONE
+    except LeaseLost as e:
+        logger.warning(str(e))
+        return GradingJob.STATUS_RUNNING
+    except Exception as e:
+        logger.error(f"Error grading job {job.id}: {str(e)}")
+        # Give up after MAX_ATTEMPTS, otherwise release the lease so it is retried
+        give_up = not retry or job.attempts >= MAX_ATTEMPTS
+        status = GradingJob.STATUS_FAILED if give_up else GradingJob.STATUS_PENDING
+        GradingJob.objects.filter(id=job.id, locked_by=worker_id).update(
+            status=status, error=str(e), locked_until=None
+        )
+        return status
+
+
+def status_payload(job):
+    """JSON-ready view of a job for the quiz page's status polling"""
+    data = {'success': True, 'status': job.status}
+    if job.status == GradingJob.STATUS_DONE:
+        data.update(job.result)
+    elif job.status == GradingJob.STATUS_FAILED:
+        data['error'] = 'Code grading failed. Your MCQ answers have been recorded.'
+    return data
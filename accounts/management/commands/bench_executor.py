@@ -0,0 +1,342 @@
+"""
+Management command that benchmarks the code execution engine.
+
+Runs a fixed corpus of C/Python/Java solutions, including slow and noisy
+ones, through the same paths as run_code (preview slot, workspace, prepare,
+one run per test case) and submit_quiz (grade_many), at several concurrency
+levels, and prints latency percentiles, throughput and the compile/run split
+as JSON so runs before and after an executor change can be compared.
+
+  "cold" makes every job's source unique, so nothing comes from the compile
+  cache; "warm" repeats the same sources.  The result cache is bypassed in
+  both, otherwise grading would only measure cache reads.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from accounts.execution.compile_cache import GRADING, PREVIEW
+from accounts.execution.executor import Executor, get_executor, run_timeout
+from accounts.execution.grading import case_record, grade_many, normalize, run_batch, run_case
+from accounts.execution.scheduler import Saturated, preview_slot
+from accounts.execution.toolchains import get_registry
+from accounts.execution.workspaces import workspace
+
+BenchCase = namedtuple('BenchCase', 'order input_data expected_output')
+
+
+def _mod7_sum(n):
+    """sum(i % 7 for i in range(n)), the answer of the 'slow' programs"""
+    return n // 7 * 21 + sum(range(n % 7))
+
+
+SUM_CASES = [BenchCase(i, f'{a} {b}\n', f'{a + b}\n') for i, (a, b) in enumerate([(1, 2), (40, 2), (-5, 5), (10**6, 7)], 1)]
+NOISY_CASES = [BenchCase(i, f'{n}\n', f'{n * (n + 1) // 2}\n') for i, n in enumerate([10, 1000, 5000], 1)]
+SLOW_INPUTS = {'c': 60_000_000, 'java': 60_000_000, 'python': 1_500_000}
+
+CORPUS = {
+    'c': {
+        'sum': '#include <stdio.h>\nint main(){long a,b;scanf("%ld %ld",&a,&b);printf("%ld\\n",a+b);return 0;}\n',
+        'slow': (
+            '#include <stdio.h>\nint main(){long n,s=0;scanf("%ld",&n);'
+            'for(long i=0;i<n;i++)s+=i%7;printf("%ld\\n",s);return 0;}\n'
+        ),
+        # debug output on stderr for every step, answer on stdout
+        'noisy': (
+            '#include <stdio.h>\nint main(){long n,s=0;scanf("%ld",&n);'
+            'for(long i=1;i<=n;i++){s+=i;fprintf(stderr,"step %ld total %ld\\n",i,s);}'
+            'printf("%ld\\n",s);return 0;}\n'
+        ),
+        # off by one, then keeps printing: stopped early as a wrong answer
+        'wrong': (
+            '#include <stdio.h>\nint main(){long n,s=0;scanf("%ld",&n);'
+            'for(long i=1;i<n;i++)s+=i;printf("%ld\\n",s);for(long i=0;i<n*100;i++)printf("%ld\\n",i);return 0;}\n'
+        ),
+    },
+    'python': {
+        'sum': 'a, b = map(int, input().split())\nprint(a + b)\n',
+        'slow': 'n = int(input())\ns = 0\nfor i in range(n):\n    s += i % 7\nprint(s)\n',
+        'noisy': (
+            'import sys\nn = int(input())\ns = 0\nfor i in range(1, n + 1):\n    s += i\n'
+            '    print(f"step {i} total {s}", file=sys.stderr)\nprint(s)\n'
+        ),
+        'wrong': 'n = int(input())\nprint(sum(range(n)))\nfor i in range(n * 100):\n    print(i)\n',
+    },
+    'java': {
+        'sum': (
+            'import java.util.*;\npublic class Main { public static void main(String[] a) {'
+            ' Scanner sc = new Scanner(System.in); long x = sc.nextLong(), y = sc.nextLong();'
+            ' System.out.println(x + y); } }\n'
+        ),
+        'slow': (
+            'import java.util.*;\npublic class Main { public static void main(String[] a) {'
+            ' long n = new Scanner(System.in).nextLong(), s = 0; for (long i = 0; i < n; i++) s += i % 7;'
+            ' System.out.println(s); } }\n'
+        ),
+        'noisy': (
+            'import java.util.*;\npublic class Main { public static void main(String[] a) {'
+            ' long n = new Scanner(System.in).nextLong(), s = 0;'
+            ' for (long i = 1; i <= n; i++) { s += i; System.err.println("step " + i + " total " + s); }'
+            ' System.out.println(s); } }\n'
+        ),
+        'wrong': (
+            'import java.util.*;\npublic class Main { public static void main(String[] a) {'
+            ' long n = new Scanner(System.in).nextLong(), s = 0; for (long i = 1; i < n; i++) s += i;'
+            ' System.out.println(s); for (long i = 0; i < n * 100; i++) System.out.println(i); } }\n'
+        ),
+    },
+}
+
+
+def _cases(language, program):
+    if program == 'sum':
+        return SUM_CASES
+    if program == 'slow':
+        n = SLOW_INPUTS[language]
+        return [BenchCase(1, f'{n}\n', f'{_mod7_sum(n)}\n'), BenchCase(2, f'{n // 2}\n', f'{_mod7_sum(n // 2)}\n')]
+    return NOISY_CASES
+
+
+def _unique(code, language):
+    """Same program, different source text, so the compile cache cannot have it"""
+    comment = f'# {uuid.uuid4().hex}' if language == 'python' else f'// {uuid.uuid4().hex}'
+    return f'{comment}\n{code}'
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))   # ceil
+    return ordered[int(rank) - 1]
+
+
+class _TimedExecutor(Executor):
+    """Wraps the real executor for one job and adds up the time spent compiling and running"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.env = inner.env
+        self.name = inner.name
+        self.compile_time = 0.0
+        self.run_time = 0.0
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def _add(self, field, started, runs=0):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + time.perf_counter() - started)
+            self.runs += runs
+
+    def prepare(self, code, language, work_dir, profile=GRADING):
+        started = time.perf_counter()
+        try:
+            return self.inner.prepare(code, language, work_dir, profile)
+        finally:
+            self._add('compile_time', started)
+
+    def run(self, prepared, stdin_data, timeout=None, expected=None, cancel=None):
+        started = time.perf_counter()
+        try:
+            return self.inner.run(prepared, stdin_data, timeout, expected, cancel)
+        finally:
+            self._add('run_time', started, runs=1)
+
+    def batches(self, prepared):
+        return self.inner.batches(prepared)
+
+    def run_cases(self, prepared, inputs, timeout=None, expected_outputs=None, cancel=None, on_result=None):
+        if not self.batches(prepared):
+            return super().run_cases(prepared, inputs, timeout, expected_outputs, cancel, on_result)
+        started = time.perf_counter()
+        try:
+            return self.inner.run_cases(prepared, inputs, timeout, expected_outputs, cancel, on_result)
+        finally:
+            self._add('run_time', started, runs=len(inputs))
+
+
+def _preview_job(executor, code, language, cases, key):
+    """What run_code does for a Run against a question's test cases"""
+    timeout = run_timeout()
+    with preview_slot(key):
+        with workspace() as tmp_dir:
+            prepared, compile_err = executor.prepare(code, language, tmp_dir, profile=PREVIEW)
+            if compile_err:
+                raise RuntimeError(compile_err)
+            inputs = [normalize(tc.input_data) for tc in cases]
+            expected = [tc.expected_output for tc in cases]
+            if executor.batches(prepared):
+                runs = run_batch(executor, prepared, inputs, timeout, expected)
+            else:
+                runs = [run_case(executor, prepared, i, timeout, e) for i, e in zip(inputs, expected)]
+            return sum(case_record(run, tc)['passed'] for run, tc in zip(runs, cases))
+
+
+def _grading_job(executor, code, language, cases):
+    """What a grade worker does for one submitted code answer"""
+    with workspace() as tmp_dir:
+        return grade_many([(code, language, cases)], tmp_dir, executor=executor)[0].passed
+
+
+def _summary(samples, wall):
+    latencies = [s['latency'] for s in samples if s['status'] == 'ok']
+    done = [s for s in samples if s['status'] == 'ok']
+    runs = sum(s['runs'] for s in done)
+    return {
+        'jobs': len(samples),
+        'ok': len(done),
+        'rejected': sum(1 for s in samples if s['status'] == 'rejected'),
+        'errors': sum(1 for s in samples if s['status'] == 'error'),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+            'max': round(max(latencies, default=0.0) * 1000, 2),
+        },
+        'jobs_per_second': round(len(done) / wall, 2) if wall else 0.0,
+        'runs_per_second': round(runs / wall, 2) if wall else 0.0,
+        'compile_ms_mean': round(sum(s['compile'] for s in done) / len(done) * 1000, 2) if done else 0.0,
+        'run_ms_mean': round(sum(s['run'] for s in done) / len(done) * 1000, 2) if done else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark code execution (Run and grading paths) across languages and concurrency levels'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            default='1,2,4,8',
+            help='Comma-separated numbers of jobs in flight at once (default: 1,2,4,8)',
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=24,
+            help='Jobs per concurrency level, spread over the corpus (default: 24)',
+        )
+        parser.add_argument(
+            '--languages',
+            default='',
+            help='Comma-separated languages to include (default: every language available on this host)',
+        )
+        parser.add_argument(
+            '--modes',
+            default='run,grade',
+            help="Code paths to exercise: 'run' (Run button), 'grade' (final grading) (default: both)",
+        )
+        parser.add_argument(
+            '--variants',
+            default='cold,warm',
+            help="'cold' (every source new to the compile cache), 'warm' (repeated sources) (default: both)",
+        )
+        parser.add_argument(
+            '--output',
+            default='',
+            help='Write the JSON report to this file instead of stdout',
+        )
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        available = [lang for lang, _ in registry.available_languages()]
+        languages = [l for l in options['languages'].split(',') if l] or available
+        for language in languages:
+            if language not in CORPUS:
+                raise CommandError(f'No benchmark corpus for {language}')
+            if language not in available:
+                raise CommandError(f'{language} is not available on this host')
+        try:
+            levels = [int(c) for c in options['concurrency'].split(',') if c]
+        except ValueError:
+            raise CommandError('--concurrency must be a comma-separated list of integers')
+        modes = [m for m in options['modes'].split(',') if m]
+        variants = [v for v in options['variants'].split(',') if v]
+        if set(modes) - {'run', 'grade'} or set(variants) - {'cold', 'warm'}:
+            raise CommandError("--modes takes 'run'/'grade' and --variants takes 'cold'/'warm'")
+
+        corpus = [
+            (language, program, CORPUS[language][program], _cases(language, program))
+            for language in languages for program in CORPUS[language]
+        ]
+        executor = get_executor()
+        report = {
+            'host': {
+                'cpu_count': os.cpu_count(),
+                'backend': executor.name,
+                'run_timeout': run_timeout(),
+                'toolchains': {lang: registry.get(lang).version for lang in languages},
+            },
+            'results': [],
+        }
+
+        with override_settings(EXECUTION_RESULT_CACHE_ENABLED=False):
+            for mode in modes:
+                for variant in variants:
+                    if variant == 'warm':
+                        # Compile every source once so the timed jobs all hit the compile cache
+                        for language, _, code, cases in corpus:
+                            self._job(mode, executor, code, language, cases)
+                    for level in levels:
+                        report['results'].append(
+                            self._level(mode, variant, level, options['jobs'], executor, corpus)
+                        )
+                        self.stderr.write(f'  - {mode}/{variant} x{level} done')
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f'✓ Benchmark report written to {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    def _job(self, mode, executor, code, language, cases):
+        timed = _TimedExecutor(executor)
+        started = time.perf_counter()
+        status = 'ok'
+        try:
+            if mode == 'run':
+                _preview_job(timed, code, language, cases, f'bench-{uuid.uuid4().hex}')
+            else:
+                _grading_job(timed, code, language, cases)
+        except Saturated:
+            status = 'rejected'
+        except Exception as e:
+            self.stderr.write(f'  ! {language} job failed: {e}')
+            status = 'error'
+        return {
+            'language': language,
+            'status': status,
+            'latency': time.perf_counter() - started,
+            'compile': timed.compile_time,
+            'run': timed.run_time,
+            'runs': timed.runs,
+        }
+
+    def _level(self, mode, variant, level, jobs, executor, corpus):
+        work = []
+        for i in range(jobs):
+            language, _, code, cases = corpus[i % len(corpus)]
+            work.append((language, _unique(code, language) if variant == 'cold' else code, cases))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            samples = list(pool.map(lambda job: self._job(mode, executor, job[1], job[0], job[2]), work))
+        wall = time.perf_counter() - started
+
+        by_language = defaultdict(list)
+        for sample in samples:
+            by_language[sample['language']].append(sample)
+        return dict(
+            {'mode': mode, 'variant': variant, 'concurrency': level, 'wall_seconds': round(wall, 3)},
+            **_summary(samples, wall),
+            languages={language: _summary(s, wall) for language, s in by_language.items()},
+        )
@@ -0,0 +1,73 @@
+"""
+Management command that calibrates per-question time and memory limits.
+Runs each question's reference solution on this host and stores the limits
+derived from it (see accounts/execution/calibration.py).  Run it on the
+grading hosts before a round, and again after moving to different hardware.
+"""
+import logging
+
+from django.core.management.base import BaseCommand
+
+from accounts.execution.calibration import CalibrationError, calibrate
+from accounts.models import CodingQuestion, DubbingQuestion
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Calibrate coding/dubbing question limits from their reference solutions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--round',
+            type=int,
+            help='Only questions of this round (id)',
+        )
+        parser.add_argument(
+            '--type',
+            choices=('coding', 'dubbing'),
+            help='Only coding or only dubbing questions',
+        )
+        parser.add_argument(
+            '--ids',
+            type=int,
+            nargs='+',
+            help='Only these question ids (use with --type)',
+        )
+        parser.add_argument(
+            '--uncalibrated',
+            action='store_true',
+            help='Skip questions that were already calibrated',
+        )
+
+    def handle(self, *args, **options):
+        models = {'coding': CodingQuestion, 'dubbing': DubbingQuestion}
+        if options['type']:
+            models = {options['type']: models[options['type']]}
+
+        calibrated = failed = 0
+        for q_type, model in models.items():
+            questions = model.objects.exclude(reference_solution='').order_by('id')
+            if options['round']:
+                questions = questions.filter(round_id=options['round'])
+            if options['ids']:
+                questions = questions.filter(id__in=options['ids'])
+            if options['uncalibrated']:
+                questions = questions.filter(calibrated_at__isnull=True)
+
+            for question in questions:
+                try:
+                    limits = calibrate(question)
+                except CalibrationError as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'✗ {q_type} {question.id} "{question.title}": {e}'))
+                    continue
+                calibrated += 1
+                memory = f'{question.memory_limit_mb} MB' if question.memory_limit_mb else 'default memory'
+                self.stdout.write(
+                    f'  {q_type} {question.id} "{question.title}": {question.time_limit_ms} ms CPU, {memory}, '
+                    f'{limits.timeout}s timeout (reference {question.reference_cpu_ms:.1f} ms/case)'
+                )
+
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f'✓ Calibrated {calibrated} question(s), {failed} failed'))
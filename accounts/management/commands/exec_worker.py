@@ -0,0 +1,43 @@
+"""
+Management command that compiles and runs submissions on behalf of the web
+server and grade workers when EXECUTION_BACKEND is 'socket'.
+Run it on the same host, next to them (see accounts/execution/socket_worker.py).
+"""
+import logging
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from accounts.execution.socket_worker import WorkerServer, socket_path
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Serve code execution requests over a Unix socket'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            default=None,
+            help='Path of the Unix socket to listen on (default: EXECUTION_WORKER_SOCKET)',
+        )
+
+    def handle(self, *args, **options):
+        path = options['socket'] or socket_path()
+        server = WorkerServer(path)
+
+        def request_stop(signum, frame):
+            # shutdown() blocks until serve_forever returns, so it cannot run on this thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Exec worker listening on {path}'))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        self.stdout.write(self.style.SUCCESS('✓ Exec worker stopped'))
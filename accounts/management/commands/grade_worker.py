@@ -0,0 +1,78 @@
+"""
+Management command that drains the grading queue.
+Run it alongside the web server (see supervisord.conf); several workers can run at
+once, each job is leased to exactly one of them.  When no candidate is waiting
+to be graded it also runs the regrades and calibrations queued from the admin
+(see accounts/question_tasks.py).
+"""
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from accounts import grading_jobs, question_tasks
+from accounts.execution.workspaces import provision
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Grade queued code submissions (coding and dubbing answers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait before checking an empty queue again (default: 1.0)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit as soon as the queue is empty instead of waiting for new jobs',
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval']
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.stopping = False
+
+        def request_stop(signum, frame):
+            # Finish the job in hand, then exit
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        workspace_root = provision()
+        self.stdout.write(self.style.SUCCESS(f'✓ Grade worker {worker_id} started (workspaces in {workspace_root})'))
+        graded = 0
+        while not self.stopping:
+            job = grading_jobs.claim_next(worker_id)
+            if job is None:
+                task = question_tasks.claim_next(worker_id)
+                if task is not None:
+                    started = time.time()
+                    status = question_tasks.process(task, worker_id)
+                    self.stdout.write(
+                        f'  - Task {task.id} ({task.get_kind_display()}, {task.question_type} question '
+                        f'{task.question_id}): {status} in {time.time() - started:.2f}s'
+                    )
+                    continue
+                if options['once']:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            started = time.time()
+            status = grading_jobs.process(job, worker_id)
+            graded += 1
+            self.stdout.write(
+                f'  - Job {job.id} ({job.candidate.candidate_name}): {status} in {time.time() - started:.2f}s'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Grade worker stopped after {graded} jobs'))
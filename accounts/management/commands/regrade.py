@@ -0,0 +1,67 @@
+"""
+Management command to regrade a question's code submissions after its test
+cases (or limits) change.  Only submissions graded against a different test
+set are re-run; run it again after an interruption and it carries on with
+the rest.  Use --dry-run first to see whose scores would change.
+"""
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.regrade import QUESTION_MODELS, regrade
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Re-run a coding/dubbing question's submissions against its current test cases"
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_type', choices=sorted(QUESTION_MODELS))
+        parser.add_argument('question_id', type=int)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Grade and show the score changes without saving them',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regrade every submission, not only those graded against other test cases',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Submissions graded (and committed) together (default: 50)',
+        )
+
+    def handle(self, *args, **options):
+        question_type, question_id = options['question_type'], options['question_id']
+        dry_run = options['dry_run']
+        if not QUESTION_MODELS[question_type].objects.filter(id=question_id).exists():
+            raise CommandError(f'{question_type} question {question_id} not found')
+
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total} regraded')
+
+        changes = regrade(
+            question_type, question_id, dry_run=dry_run, everything=options['all'],
+            chunk_size=options['chunk_size'], on_chunk=progress,
+        )
+        if not changes:
+            self.stdout.write(self.style.SUCCESS('✓ No submissions need regrading'))
+            return
+
+        changed = [c for c in changes if (c.old_score, c.old_passed, c.old_total) != (c.new_score, c.new_passed, c.new_total)]
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'DRY RUN: {len(changed)} of {len(changes)} scores would change:'))
+        for c in changed:
+            self.stdout.write(
+                f'  - {c.candidate} (submission {c.submission_id}): {c.old_score} → {c.new_score} marks, '
+                f'{c.old_passed}/{c.old_total} → {c.new_passed}/{c.new_total} test cases'
+            )
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Regraded {len(changes)} submission(s), {len(changed)} score(s) changed'
+            ))
@@ -0,0 +1,46 @@
+"""
+Management command to re-mark a round's MCQ answers after its answer key
+changes (a correct option fixed, a question added or removed).  Candidates'
+totals move by the difference in MCQ marks.  Use --dry-run first to see
+whose scores would change.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.mcq import rescore_round
+from accounts.models import Round
+
+
+class Command(BaseCommand):
+    help = "Re-mark every submitted candidate's MCQ answers in a round against its current answer key"
+
+    def add_arguments(self, parser):
+        parser.add_argument('round_id', type=int)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the score changes without saving them',
+        )
+
+    def handle(self, *args, **options):
+        round_id, dry_run = options['round_id'], options['dry_run']
+        if not Round.objects.filter(id=round_id).exists():
+            raise CommandError(f'Round {round_id} not found')
+
+        changes, skipped = rescore_round(round_id, dry_run=dry_run)
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'{skipped} candidate(s) skipped: submitted before MCQ answers were stored, '
+                f'or code grading still in progress'
+            ))
+        if not changes:
+            self.stdout.write(self.style.SUCCESS('✓ No MCQ scores need changing'))
+            return
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'DRY RUN: {len(changes)} candidate(s) would change:'))
+        for c in changes:
+            self.stdout.write(
+                f'  - {c.candidate} (entry {c.candidate_id}): {c.old_score}/{c.old_total} → {c.new_score}/{c.new_total} MCQ marks'
+            )
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS(f'✓ Rescored {len(changes)} candidate(s)'))
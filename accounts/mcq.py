@@ -0,0 +1,122 @@
+"""
+Packed MCQ responses and rescoring a round when its answer key changes.
+
+submit_quiz keeps the options a candidate picked on their CandidateEntry
+(mcq_responses), written by the same UPDATE that records the MCQ score, as
+one little-endian uint64 per answer: question_id << 32 | option_id, sorted.
+One BinaryField per candidate instead of a row per answer keeps submit at
+the same two statements and a whole round's responses at a few KB.
+
+rescore_round() re-marks every response in a round against the current
+answer key (from the round's grading bundle) in one pass: all candidates'
+responses are decoded into a single array and checked against the set of
+correct (question, option) keys, and candidates' totals move by the
+difference.  Candidates who answered no MCQs are rescored too (0 marks, but
+the MCQ total moves with the answer key).  Candidates still being graded are
+skipped (the grade worker would overwrite their total); run it again once
+grading is done.
+"""
+import sys
+from array import array
+from collections import namedtuple
+from itertools import accumulate
+
+from django.db import transaction
+
+from .models import CandidateEntry, GradingJob
+from .round_bundle import get_bundle, mcq_total
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+# One rescored candidate: MCQ marks (out of the MCQ total) before and after
+Rescore = namedtuple('Rescore', 'candidate_id candidate old_score new_score old_total new_total')
+
+
+def _decode(packed):
+    keys = array('Q')
+    keys.frombytes(bytes(packed or b''))
+    if _BIG_ENDIAN:
+        keys.byteswap()
+    return keys
+
+
+def pack_responses(responses):
+    """Pack {question_id: option_id} for CandidateEntry.mcq_responses"""
+    keys = array('Q', sorted((int(qid) << 32) | int(oid) for qid, oid in responses.items()))
+    if _BIG_ENDIAN:
+        keys.byteswap()
+    return keys.tobytes()
+
+
+def unpack_responses(packed):
+    """{question_id: option_id} from CandidateEntry.mcq_responses"""
+    return {key >> 32: key & 0xFFFFFFFF for key in _decode(packed)}
+
+
+def correct_keys(bundle):
+    """The packed keys of every correct (question, option) pair in a round's answer key"""
+    return {
+        (question_id << 32) | option_id
+        for option_id, question_id, correct in zip(bundle.option_ids, bundle.option_questions, bundle.option_correct)
+        if correct
+    }
+
+
+def score_all(bundle, packed_responses):
+    """MCQ marks for each packed response set, in one pass over all of them"""
+    correct = correct_keys(bundle)
+    counts = [len(packed or b'') // 8 for packed in packed_responses]
+    hits = [key in correct for key in _decode(b''.join(bytes(p or b'') for p in packed_responses))]
+    totals = [0] + list(accumulate(hits))
+    ends = list(accumulate(counts))
+    return [totals[end] - totals[end - count] for end, count in zip(ends, counts)]
+
+
+def rescore_round(round_id, dry_run=False):
+    """
+    Re-mark the MCQ answers of every submitted candidate in the round.
+    Returns (changes, skipped): a Rescore per candidate whose score changes,
+    and the number of candidates skipped (submitted before responses were
+    stored, or grading still in progress).
+    """
+    bundle = get_bundle(round_id)
+    new_total = mcq_total(bundle)
+    with transaction.atomic():
+        jobs = list(
+            GradingJob.objects.select_for_update().select_related('candidate')
+            .filter(candidate__round_id=round_id, candidate__is_submitted=True)
+            .filter(candidate__mcq_responses__isnull=False)
+            .order_by('candidate_id')
+        )
+        skipped = CandidateEntry.objects.filter(round_id=round_id, is_submitted=True).count() - len(jobs)
+        busy = {GradingJob.STATUS_PENDING, GradingJob.STATUS_RUNNING}
+        skipped += sum(1 for job in jobs if job.status in busy)
+        jobs = [job for job in jobs if job.status not in busy]
+
+        scores = score_all(bundle, [job.candidate.mcq_responses for job in jobs])
+        changes = []
+        entries = []
+        rescored = []
+        for job, new_score in zip(jobs, scores):
+            if (new_score, new_total) == (job.mcq_score, job.mcq_total):
+                continue
+            changes.append(Rescore(
+                job.candidate_id, job.candidate.candidate_name, job.mcq_score, new_score, job.mcq_total, new_total,
+            ))
+            entry = job.candidate
+            entry.score += new_score - job.mcq_score
+            entry.total_questions += new_total - job.mcq_total
+            entry.percentage = (entry.score / entry.total_questions * 100) if entry.total_questions > 0 else 0
+            entries.append(entry)
+            if job.result:
+                job.result.update({
+                    'score': entry.score, 'max_score': entry.total_questions, 'percentage': entry.percentage,
+                    'total_questions': new_total,
+                })
+            job.mcq_score, job.mcq_total = new_score, new_total
+            rescored.append(job)
+
+        if not dry_run:
+            CandidateEntry.objects.bulk_update(entries, ['score', 'total_questions', 'percentage'])
+            GradingJob.objects.bulk_update(rescored, ['mcq_score', 'mcq_total', 'result'])
+    return changes, skipped
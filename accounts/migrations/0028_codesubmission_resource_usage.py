@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0027_gradingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codesubmission',
+            name='cpu_time_ms',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='codesubmission',
+            name='peak_memory_kb',
+            field=models.IntegerField(default=0),
+        ),
+    ]
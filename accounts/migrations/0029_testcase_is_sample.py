@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:21
+
+from django.db import migrations, models
+
+# Existing cases Run keeps checking: all of them ran before is_sample existed
+SAMPLES_PER_QUESTION = 2
+
+
+def mark_first_cases_as_samples(apps, schema_editor):
+    for model_name, question_field in (('TestCase', 'coding_question_id'), ('DubbingTestCase', 'dubbing_question_id')):
+        model = apps.get_model('accounts', model_name)
+        seen = {}
+        sample_ids = []
+        for case_id, question_id in model.objects.order_by(question_field, 'order', 'id').values_list('id', question_field):
+            seen[question_id] = seen.get(question_id, 0) + 1
+            if seen[question_id] <= SAMPLES_PER_QUESTION:
+                sample_ids.append(case_id)
+        model.objects.filter(id__in=sample_ids).update(is_sample=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0028_codesubmission_resource_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dubbingtestcase',
+            name='is_sample',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='is_sample',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_first_cases_as_samples, migrations.RunPython.noop),
+    ]
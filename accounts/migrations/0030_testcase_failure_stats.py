@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0029_testcase_is_sample'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dubbingtestcase',
+            name='failure_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dubbingtestcase',
+            name='run_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='failure_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='run_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0030_testcase_failure_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codingquestion',
+            name='calibrated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='codingquestion',
+            name='memory_limit_mb',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='codingquestion',
+            name='reference_cpu_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='codingquestion',
+            name='reference_language',
+            field=models.CharField(blank=True, choices=[('c', 'C'), ('python', 'Python'), ('java', 'Java')], default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='codingquestion',
+            name='reference_solution',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='codingquestion',
+            name='time_limit_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dubbingquestion',
+            name='calibrated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dubbingquestion',
+            name='memory_limit_mb',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dubbingquestion',
+            name='reference_cpu_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dubbingquestion',
+            name='reference_language',
+            field=models.CharField(blank=True, choices=[('c', 'C'), ('python', 'Python'), ('java', 'Java')], default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='dubbingquestion',
+            name='reference_solution',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='dubbingquestion',
+            name='time_limit_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
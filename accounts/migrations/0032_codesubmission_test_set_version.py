@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0031_question_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codesubmission',
+            name='test_set_version',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
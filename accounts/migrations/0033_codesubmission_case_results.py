@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0032_codesubmission_test_set_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codesubmission',
+            name='case_cpu_us',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='codesubmission',
+            name='case_verdicts',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+    ]
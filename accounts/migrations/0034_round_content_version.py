@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0033_codesubmission_case_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='content_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0034_round_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidateentry',
+            name='mcq_responses',
+            field=models.BinaryField(blank=True, default=None, null=True),
+        ),
+    ]
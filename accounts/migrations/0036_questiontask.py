@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0035_candidateentry_mcq_responses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('regrade', 'Regrade'), ('regrade_dry_run', 'Regrade (dry run)'), ('calibrate', 'Calibrate limits')], max_length=20)),
+                ('question_type', models.CharField(choices=[('coding', 'Coding'), ('dubbing', 'Dubbing')], max_length=10)),
+                ('question_id', models.IntegerField()),
+                ('requested_by', models.CharField(blank=True, default='', max_length=150)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('locked_by', models.CharField(blank=True, default='', max_length=100)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('result', models.TextField(blank=True, default='')),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='accounts_qu_status_e733f8_idx')],
+            },
+        ),
+    ]
@@ -30,11 +30,22 @@ class Round(models.Model):
     access_code = models.CharField(max_length=10, blank=True, null=True)
     is_started = models.BooleanField(default=False)
     is_hosting = models.BooleanField(default=False)
+    # Bumped on every change to the round's questions/test cases; invalidates cached grading bundles
+    content_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"{self.event.name} - Round {self.round_number}"
     
+    def save(self, *args, **kwargs):
+        # content_version is only ever bumped in the database (round_bundle.bump_version);
+        # a full save of an already-loaded Round must not write back the value it was loaded with
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'content_version'
+            ]
+        super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['round_number']
 
@@ -55,6 +66,8 @@ class CandidateEntry(models.Model):
     last_active = models.DateTimeField(auto_now_add=True)
     has_switched_tabs = models.BooleanField(default=False)
     quiz_started_at = models.DateTimeField(null=True, blank=True, db_index=True, default=None)
+    # MCQ answers as packed (question, option) keys, see mcq.py; None for entries submitted before it
+    mcq_responses = models.BinaryField(null=True, blank=True, default=None)
     
     def __str__(self):
         return f"{self.candidate_name} - {self.round}"
@@ -118,6 +131,14 @@ class CodingQuestion(models.Model):
     constraints = models.TextField(blank=True, default='')
     sample_input = models.TextField(blank=True, default='')
     sample_output = models.TextField(blank=True, default='')
+    # Optional model answer; `manage.py calibrate_limits` runs it to set the limits below
+    reference_solution = models.TextField(blank=True, default='')
+    reference_language = models.CharField(max_length=50, choices=CODING_LANGUAGE_CHOICES, blank=True, default='')
+    # Per-case CPU time and memory limits calibrated on this host (empty: the EXECUTION_* defaults)
+    time_limit_ms = models.PositiveIntegerField(null=True, blank=True)
+    memory_limit_mb = models.PositiveIntegerField(null=True, blank=True)
+    reference_cpu_ms = models.FloatField(null=True, blank=True)
+    calibrated_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -133,6 +154,11 @@ class TestCase(models.Model):
     input_data = models.TextField(blank=True, default='')
     expected_output = models.TextField()
     order = models.IntegerField(default=0)
+    # Sample cases are what Run checks against; the rest stay hidden until grading
+    is_sample = models.BooleanField(default=False)
+    # Graded submissions that ran / failed this case, used to run likely failures first
+    run_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"TestCase {self.order} for {self.coding_question.title}"
@@ -150,6 +176,14 @@ class DubbingQuestion(models.Model):
     code_snippet = models.TextField()
     sample_input = models.TextField(blank=True, default='')
     sample_output = models.TextField(blank=True, default='')
+    # Optional fixed version of the snippet; `manage.py calibrate_limits` runs it to set the limits below
+    reference_solution = models.TextField(blank=True, default='')
+    reference_language = models.CharField(max_length=50, choices=CODING_LANGUAGE_CHOICES, blank=True, default='')
+    # Per-case CPU time and memory limits calibrated on this host (empty: the EXECUTION_* defaults)
+    time_limit_ms = models.PositiveIntegerField(null=True, blank=True)
+    memory_limit_mb = models.PositiveIntegerField(null=True, blank=True)
+    reference_cpu_ms = models.FloatField(null=True, blank=True)
+    calibrated_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -165,6 +199,11 @@ class DubbingTestCase(models.Model):
     input_data = models.TextField(blank=True, default='')
     expected_output = models.TextField()
     order = models.IntegerField(default=0)
+    # Sample cases are what Run checks against; the rest stay hidden until grading
+    is_sample = models.BooleanField(default=False)
+    # Graded submissions that ran / failed this case, used to run likely failures first
+    run_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"DubbingTestCase {self.order} for {self.dubbing_question.title}"
@@ -195,8 +234,10 @@ class CodeSubmission(models.Model):
 
     # Execution
     output_success = models.BooleanField(default=False)   # True = code ran without errors
-    execution_time_ms = models.FloatField(default=0.0)    # avg ms across test cases
-    time_limit_met = models.BooleanField(default=False)   # True = avg < 1 000 ms
+    execution_time_ms = models.FloatField(default=0.0)    # avg wall-clock ms across test cases
+    cpu_time_ms = models.FloatField(default=0.0)          # avg user+sys CPU ms across test cases
+    peak_memory_kb = models.IntegerField(default=0)       # highest peak RSS of any test case
+    time_limit_met = models.BooleanField(default=False)   # True = avg CPU time < 1 000 ms
 
     # Computed sub-scores
     testcase_score = models.IntegerField(default=0)       # 2 × passed (max 2 if all pass)
@@ -204,6 +245,13 @@ class CodeSubmission(models.Model):
     efficiency_score = models.IntegerField(default=0)     # 0 or 2
     total_score = models.IntegerField(default=0)          # sum of above (max 6 per question)
 
+    # Per test case, in order (see execution/verdicts.py): a verdict byte each, CPU µs as uint32 each
+    case_verdicts = models.BinaryField(blank=True, default=b'')
+    case_cpu_us = models.BinaryField(blank=True, default=b'')
+
+    # Hash of the test cases and limits this was graded against; `manage.py regrade` re-runs stale ones
+    test_set_version = models.CharField(max_length=64, blank=True, default='')
+
     submitted_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -216,3 +264,87 @@ class CodeSubmission(models.Model):
     class Meta:
         ordering = ['submitted_at']
         unique_together = [['candidate', 'question_type', 'question_id']]
+
+
+class GradingJob(models.Model):
+    """Queued grading of a candidate's code answers, drained by the grade_worker command"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # One job per candidate, so a submission can never be queued (or graded) twice
+    candidate = models.OneToOneField(
+        CandidateEntry, on_delete=models.CASCADE, related_name='grading_job'
+    )
+    payload = models.JSONField(default=dict)        # {'coding': {qid: {code, lang}}, 'dubbing': {...}}
+    mcq_score = models.IntegerField(default=0)
+    mcq_total = models.IntegerField(default=0)
+    attended = models.IntegerField(default=0)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    attempts = models.IntegerField(default=0)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)  # lease; expired running jobs are picked up again
+    result = models.JSONField(default=dict, blank=True)         # final score breakdown returned to the quiz page
+    error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Grading {self.candidate.candidate_name} [{self.status}]"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+class QuestionTask(models.Model):
+    """Regrade or limit calibration of one question, queued from the admin and run by the grade_worker command"""
+    KIND_REGRADE = 'regrade'
+    KIND_REGRADE_DRY_RUN = 'regrade_dry_run'
+    KIND_CALIBRATE = 'calibrate'
+    KIND_CHOICES = [
+        (KIND_REGRADE, 'Regrade'),
+        (KIND_REGRADE_DRY_RUN, 'Regrade (dry run)'),
+        (KIND_CALIBRATE, 'Calibrate limits'),
+    ]
+    STATUS_PENDING = GradingJob.STATUS_PENDING
+    STATUS_RUNNING = GradingJob.STATUS_RUNNING
+    STATUS_DONE = GradingJob.STATUS_DONE
+    STATUS_FAILED = GradingJob.STATUS_FAILED
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    question_type = models.CharField(max_length=10, choices=[('coding', 'Coding'), ('dubbing', 'Dubbing')])
+    question_id = models.IntegerField()
+    requested_by = models.CharField(max_length=150, blank=True, default='')
+
+    status = models.CharField(max_length=10, choices=GradingJob.STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    attempts = models.IntegerField(default=0)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)  # lease, as on GradingJob
+    result = models.TextField(blank=True, default='')           # what changed, shown in the admin
+    error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.question_type} question {self.question_id} [{self.status}]"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
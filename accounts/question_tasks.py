@@ -0,0 +1,104 @@
+"""
+Regrades and limit calibrations requested from the admin.
+
+Both compile and run code many times over (every affected submission, or the
+reference solution against every test case), which takes far longer than an
+admin request may, and must share the host with candidates' grading.  So the
+admin actions only queue a QuestionTask; the grade_worker command runs it
+when no grading job is waiting, under the same scheduler slots, holding a
+lease like a grading job's.  What a task changed (or would change, for a
+dry run) is stored on it and shown in the admin.
+
+A task whose worker dies is picked up again once its lease runs out: a
+regrade carries on with the submissions not yet regraded, and calibrating
+again is harmless.
+"""
+import logging
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .grading_jobs import MAX_ATTEMPTS, keep_lease, lease_seconds
+from .models import QuestionTask
+from .regrade import QUESTION_MODELS, regrade
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_LIMIT = 20   # candidates named in a task's result
+
+
+def schedule(kind, question_type, question_ids, requested_by=''):
+    """Queue a task per question, unless one of the same kind is already waiting. Returns how many were queued."""
+    waiting = set(QuestionTask.objects.filter(
+        kind=kind, question_type=question_type, question_id__in=question_ids, status=QuestionTask.STATUS_PENDING,
+    ).values_list('question_id', flat=True))
+    tasks = [
+        QuestionTask(kind=kind, question_type=question_type, question_id=question_id, requested_by=requested_by)
+        for question_id in question_ids if question_id not in waiting
+    ]
+    QuestionTask.objects.bulk_create(tasks)
+    return len(tasks)
+
+
+def claim_next(worker_id):
+    """Claim the oldest runnable task, or return None if there is none"""
+    now = timezone.now()
+    QuestionTask.objects.filter(
+        status=QuestionTask.STATUS_RUNNING, locked_until__lt=now, attempts__gte=MAX_ATTEMPTS
+    ).update(status=QuestionTask.STATUS_FAILED, error='Gave up after repeated worker failures')
+
+    runnable = Q(status=QuestionTask.STATUS_PENDING) | Q(status=QuestionTask.STATUS_RUNNING, locked_until__lt=now)
+    for task_id in QuestionTask.objects.filter(runnable).order_by('created_at').values_list('id', flat=True)[:10]:
+        claimed = QuestionTask.objects.filter(runnable, id=task_id).update(
+            status=QuestionTask.STATUS_RUNNING,
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=lease_seconds()),
+            attempts=F('attempts') + 1,
+            started_at=now,
+        )
+        if claimed:
+            return QuestionTask.objects.get(id=task_id)
+    return None
+
+
+def _regrade(question_type, question, dry_run):
+    changes = regrade(question_type, question.id, dry_run=dry_run)
+    changed = [c for c in changes if (c.old_score, c.old_passed, c.old_total) != (c.new_score, c.new_passed, c.new_total)]
+    summary = ', '.join(f'{c.candidate} {c.old_score}→{c.new_score}' for c in changed[:SUMMARY_LIMIT])
+    if len(changed) > SUMMARY_LIMIT:
+        summary += f' and {len(changed) - SUMMARY_LIMIT} more'
+    verb = 'would change' if dry_run else 'changed'
+    return (
+        f'{question.title}: {len(changes)} submission(s) regraded, {len(changed)} score(s) {verb}'
+        + (f': {summary}' if summary else '')
+    )
+
+
+def _calibrate(question):
+    from .execution.calibration import calibrate
+
+    calibrate(question)
+    return f'{question.title}: {question.time_limit_ms} ms CPU, {question.memory_limit_mb or "default"} MB'
+
+
+def run(task):
+    """Do a task's work and return its result text; raises on failure"""
+    question = QUESTION_MODELS[task.question_type].objects.get(id=task.question_id)
+    if task.kind == QuestionTask.KIND_CALIBRATE:
+        return _calibrate(question)
+    return _regrade(task.question_type, question, dry_run=task.kind == QuestionTask.KIND_REGRADE_DRY_RUN)
+
+
+def process(task, worker_id):
+    """Run a claimed task and record how it went. Returns the task's final status."""
+    try:
+        with keep_lease(task.id, worker_id, QuestionTask):
+            result, error, status = run(task), '', QuestionTask.STATUS_DONE
+    except Exception as e:
+        logger.error(f'Error running {task}: {str(e)}')
+        result, error, status = '', str(e), QuestionTask.STATUS_FAILED
+    QuestionTask.objects.filter(id=task.id, status=QuestionTask.STATUS_RUNNING, locked_by=worker_id).update(
+        status=status, result=result, error=error, locked_until=None, finished_at=timezone.now(),
+    )
+    return status
@@ -0,0 +1,171 @@
+"""
+Regrading code submissions after a question's test cases change.
+
+CodeSubmission scores are written once, when the grade worker grades the
+candidate's answers.  If a test case turns out to be wrong after submissions
+have come in, regrade() re-runs the affected answers against the question's
+current test cases and limits and updates their sub-scores, plus the
+candidates' totals and the breakdown on their grading job (what the quiz
+page shows) by the difference.
+
+Every CodeSubmission records the test_set_version it was graded against, so
+the affected rows are the question's submissions whose version differs from
+the current one.  Submissions are regraded in chunks (each chunk in parallel
+through grade_many, like a grading job) and every chunk is committed on its
+own, so an interrupted regrade picks up where it stopped when run again.  A
+dry run grades the same way but only reports the differences.
+"""
+import logging
+from collections import namedtuple
+
+from django.db import transaction
+
+from .execution.calibration import question_limits
+from .execution.grading import grade_many
+from .execution.verdicts import pack as pack_verdicts
+from .execution.workspaces import workspace
+from .grading_jobs import score_question, test_set_version
+from .models import CandidateEntry, CodeSubmission, CodingQuestion, DubbingQuestion, GradingJob
+from .round_bundle import question_bundle
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 50
+QUESTION_MODELS = {'coding': CodingQuestion, 'dubbing': DubbingQuestion}
+
+# One regraded submission: its marks and passed/total test cases before and after
+Change = namedtuple('Change', 'submission_id candidate old_score new_score old_passed new_passed old_total new_total')
+
+_SCORE_FIELDS = [
+    'passed_test_cases', 'total_test_cases', 'output_success', 'execution_time_ms', 'cpu_time_ms',
+    'peak_memory_kb', 'time_limit_met', 'testcase_score', 'output_score', 'efficiency_score', 'total_score',
+    'case_verdicts', 'case_cpu_us', 'test_set_version',
+]
+# The parts of a grading job's result (see grading_jobs._grade) a regrade changes, besides percentage
+_BREAKDOWN_KEYS = [
+    'score', 'max_score', 'testcase_score', 'output_score', 'efficiency_score', 'test_cases_passed',
+    'test_cases_total',
+]
+
+
+def max_score(total_test_cases):
+    """Marks available for a question with this many test cases (see grading_jobs.score_question)"""
+    return total_test_cases * 2 + 2 + 2
+
+
+def affected_submissions(question_type, question, test_cases, everything=False):
+    """The question's submissions graded against other test cases or limits (all of them if everything)"""
+    submissions = list(
+        CodeSubmission.objects.filter(question_type=question_type, question_id=question.id)
+        .select_related('candidate').order_by('id')
+    )
+    if everything:
+        return submissions
+    # Limits, and so the version, depend on the language
+    return [
+        sub for sub in submissions
+        if sub.test_set_version != test_set_version(test_cases, question_limits(question, sub.language))
+    ]
+
+
+def _regrade_chunk(question, test_cases, chunk):
+    """Grade a chunk of submissions; returns [(submission, GradeResult, version)]"""
+    limits = [question_limits(question, sub.language) for sub in chunk]
+    with workspace() as tmp_dir:
+        results = grade_many(
+            [(sub.code, sub.language, test_cases) for sub in chunk], tmp_dir, limits=limits,
+        )
+    return [
+        (sub, result, test_set_version(test_cases, lim))
+        for sub, result, lim in zip(chunk, results, limits)
+    ]
+
+
+def _apply(graded):
+    """
+    Write one chunk's new scores and move each candidate's total, and their
+    grading job's breakdown, by the difference.  A submission that changed
+    meanwhile (e.g. a grading job re-wrote it) is left alone.
+    """
+    with transaction.atomic():
+        current = {
+            sub.id: sub for sub in
+            CodeSubmission.objects.select_for_update().filter(id__in=[sub.id for sub, _, _ in graded])
+        }
+        updated = []
+        deltas = {}     # candidate id -> {breakdown key: difference}
+        for sub, result, version in graded:
+            row = current.get(sub.id)
+            if row is None or (row.total_score, row.test_set_version) != (sub.total_score, sub.test_set_version):
+                continue
+            tc_marks, out_marks, eff_marks, q_score, q_max_score = score_question(result)
+            delta = deltas.setdefault(row.candidate_id, dict.fromkeys(_BREAKDOWN_KEYS, 0))
+            delta['score'] += q_score - row.total_score
+            delta['max_score'] += q_max_score - max_score(row.total_test_cases)
+            delta['testcase_score'] += tc_marks - row.testcase_score
+            delta['output_score'] += out_marks - row.output_score
+            delta['efficiency_score'] += eff_marks - row.efficiency_score
+            delta['test_cases_passed'] += result.passed - row.passed_test_cases
+            delta['test_cases_total'] += result.total - row.total_test_cases
+            row.passed_test_cases = result.passed
+            row.total_test_cases = result.total
+            row.output_success = result.output_success
+            row.execution_time_ms = result.execution_time_ms
+            row.cpu_time_ms = result.cpu_time_ms
+            row.peak_memory_kb = result.peak_memory_kb
+            row.time_limit_met = result.time_limit_met
+            row.testcase_score = tc_marks
+            row.output_score = out_marks
+            row.efficiency_score = eff_marks
+            row.total_score = q_score
+            row.case_verdicts, row.case_cpu_us = pack_verdicts(result.records, result.total)
+            row.test_set_version = version
+            updated.append(row)
+        CodeSubmission.objects.bulk_update(updated, _SCORE_FIELDS)
+
+        entries = list(CandidateEntry.objects.select_for_update().filter(id__in=deltas))
+        for entry in entries:
+            entry.score += deltas[entry.id]['score']
+            entry.total_questions += deltas[entry.id]['max_score']
+            entry.percentage = (entry.score / entry.total_questions * 100) if entry.total_questions > 0 else 0
+        CandidateEntry.objects.bulk_update(entries, ['score', 'total_questions', 'percentage'])
+
+        jobs = list(GradingJob.objects.select_for_update().filter(candidate_id__in=deltas).exclude(result={}))
+        for job in jobs:
+            for key, difference in deltas[job.candidate_id].items():
+                job.result[key] = job.result.get(key, 0) + difference
+            total = job.result['max_score']
+            job.result['percentage'] = (job.result['score'] / total * 100) if total > 0 else 0
+        GradingJob.objects.bulk_update(jobs, ['result'])
+    return len(updated)
+
+
+def regrade(question_type, question_id, dry_run=False, everything=False, chunk_size=None, on_chunk=None):
+    """
+    Regrade a question's stale submissions (all of them with everything=True).
+    Returns the list of Change, one per regraded submission.  With dry_run
+    nothing is written.  on_chunk(done, total) is called after each chunk.
+    """
+    # The same normalised test cases grading uses, so test_set_version matches
+    bundled = question_bundle(question_type, question_id)
+    if bundled is None:
+        raise QUESTION_MODELS[question_type].DoesNotExist(f'{question_type} question {question_id} not found')
+    question, test_cases = bundled.question, list(bundled.cases)
+    submissions = affected_submissions(question_type, question, test_cases, everything)
+    chunk_size = chunk_size or CHUNK_SIZE
+
+    changes = []
+    for start in range(0, len(submissions), chunk_size):
+        graded = _regrade_chunk(question, test_cases, submissions[start:start + chunk_size])
+        for sub, result, _ in graded:
+            changes.append(Change(
+                sub.id, sub.candidate.candidate_name, sub.total_score, score_question(result)[3],
+                sub.passed_test_cases, result.passed, sub.total_test_cases, result.total,
+            ))
+        if not dry_run:
+            written = _apply(graded)
+            if written < len(graded):
+                logger.warning(f'{len(graded) - written} submission(s) changed while being regraded; left as they are')
+        if on_chunk:
+            on_chunk(min(start + chunk_size, len(submissions)), len(submissions))
+    return changes
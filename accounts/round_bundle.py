@@ -0,0 +1,167 @@
+"""
+Per-round grading bundle, built once per process and reused until the round changes.
+
+Every submit used to fetch the round with all its questions and options and
+rebuild lookup dicts, and every Run and grading job re-queried the test
+cases and normalised their line endings again.  A round's content only
+changes while it is being authored, so get_bundle() keeps an immutable
+snapshot per round in each process:
+
+  - the MCQ answer key as parallel int arrays sorted by option id (option,
+    owning question, correct flag), scored with a binary search per answer
+  - each coding/dubbing question with its test cases and Run sample cases,
+    inputs and expected outputs already normalised (see grading.normalize)
+
+Round.content_version is bumped by signals (see signals.py) whenever a
+question, option, test case or coding/dubbing question of the round is
+saved or deleted, and a bundle is only used while its version is current,
+so every process picks up an edit on its next request.  Queryset.update()
+and bulk_create() send no signals; call bump_version() after using them on
+round content.
+
+Failure statistics (TestCase.run_count/failure_count) change with every
+graded submission, so they are not part of the bundle: failure_stats() reads
+a question's counts for Run's case order and keeps them for at most
+FAILURE_STATS_TTL seconds.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+from django.db.models import F
+
+from .execution.grading import normalize
+from .models import CodingQuestion, DubbingQuestion, Question, QuestionOption, Round
+
+MAX_BUNDLES = 32    # rounds kept per process
+FAILURE_STATS_TTL = 30   # seconds Run's case order may trail the grade workers
+
+# A test case with its text normalised; duck-types TestCase/DubbingTestCase for grading
+Case = namedtuple('Case', 'id order input_data expected_output is_sample')
+# A coding/dubbing question, its test cases (in order) and the cases Run checks
+QuestionBundle = namedtuple('QuestionBundle', 'question case_model cases samples')
+RoundBundle = namedtuple(
+    'RoundBundle', 'round_id version question_ids option_ids option_questions option_correct coding dubbing'
+)
+
+_bundles = OrderedDict()
+_round_of = {}      # (question type, question id) -> round id; questions never move between rounds
+_failure_stats = {}     # (case model, question id) -> (read at, stats)
+_lock = threading.Lock()
+
+
+def bump_version(round_id):
+    """Invalidate every process's bundle of this round"""
+    Round.objects.filter(id=round_id).update(content_version=F('content_version') + 1)
+
+
+def _case(tc):
+    return Case(tc.id, tc.order, normalize(tc.input_data), normalize(tc.expected_output.strip()), tc.is_sample)
+
+
+def _question_bundle(question):
+    cases = tuple(_case(tc) for tc in question.test_cases.all())
+    samples = [case for case in cases if case.is_sample]
+    if question.sample_output.strip():
+        # The example shown in the statement counts as a sample case too
+        samples.insert(0, Case(None, 0, normalize(question.sample_input), normalize(question.sample_output.strip()), True))
+    return QuestionBundle(question, question.test_cases.model, cases, tuple(samples))
+
+
+def _build(round_id, version):
+    options = sorted(
+        QuestionOption.objects.filter(question__round_id=round_id).values_list('id', 'question_id', 'is_correct')
+    )
+    return RoundBundle(
+        round_id,
+        version,
+        array('q', sorted(Question.objects.filter(round_id=round_id).values_list('id', flat=True))),
+        array('q', [option_id for option_id, _, _ in options]),
+        array('q', [question_id for _, question_id, _ in options]),
+        bytes(bool(correct) for _, _, correct in options),
+        {q.id: _question_bundle(q) for q in CodingQuestion.objects.filter(round_id=round_id).prefetch_related('test_cases')},
+        {q.id: _question_bundle(q) for q in DubbingQuestion.objects.filter(round_id=round_id).prefetch_related('test_cases')},
+    )
+
+
+def get_bundle(round_id, version=None):
+    """
+    The round's current bundle, building it if this process has none or an
+    outdated one.  Pass the round's content_version if it was just read, to
+    skip reading it again.  Raises Round.DoesNotExist.
+    """
+    if version is None:
+        version = Round.objects.filter(id=round_id).values_list('content_version', flat=True).first()
+        if version is None:
+            raise Round.DoesNotExist(f'Round {round_id} not found')
+    with _lock:
+        bundle = _bundles.get(round_id)
+        if bundle is not None and bundle.version == version:
+            _bundles.move_to_end(round_id)
+            return bundle
+    bundle = _build(round_id, version)
+    with _lock:
+        current = _bundles.get(round_id)
+        if current is None or current.version <= version:
+            _bundles[round_id] = bundle
+            _bundles.move_to_end(round_id)
+            while len(_bundles) > MAX_BUNDLES:
+                _bundles.popitem(last=False)
+        _round_of.update({('coding', qid): round_id for qid in bundle.coding})
+        _round_of.update({('dubbing', qid): round_id for qid in bundle.dubbing})
+    return bundle
+
+
+def question_bundle(question_type, question_id):
+    """The QuestionBundle of a coding/dubbing question by id, or None if there is no such question"""
+    question_id = int(question_id)
+    round_id = _round_of.get((question_type, question_id))
+    if round_id is None:
+        model = CodingQuestion if question_type == 'coding' else DubbingQuestion
+        round_id = model.objects.filter(id=question_id).values_list('round_id', flat=True).first()
+        if round_id is None:
+            return None
+    try:
+        bundle = get_bundle(round_id)
+    except Round.DoesNotExist:
+        return None
+    return (bundle.coding if question_type == 'coding' else bundle.dubbing).get(question_id)
+
+
+def failure_stats(bundled):
+    """
+    {test case id: (run_count, failure_count)} for a QuestionBundle's sample
+    cases, read from the database at most FAILURE_STATS_TTL seconds ago.
+    """
+    key = (bundled.case_model, bundled.question.id)
+    now = time.monotonic()
+    with _lock:
+        cached = _failure_stats.get(key)
+    if cached is not None and now - cached[0] < FAILURE_STATS_TTL:
+        return cached[1]
+    ids = [case.id for case in bundled.samples if case.id is not None]
+    stats = {
+        case_id: (runs, failures)
+        for case_id, runs, failures in bundled.case_model.objects.filter(id__in=ids)
+        .values_list('id', 'run_count', 'failure_count')
+    } if ids else {}
+    with _lock:
+        _failure_stats[key] = (now, stats)
+    return stats
+
+
+def mcq_total(bundle):
+    return len(bundle.question_ids)
+
+
+def is_correct(bundle, question_id, option_id):
+    """
+    None if option_id is not an option of question_id in this round,
+    otherwise whether it is a correct answer.
+    """
+    i = bisect_left(bundle.option_ids, option_id)
+    if i == len(bundle.option_ids) or bundle.option_ids[i] != option_id or bundle.option_questions[i] != question_id:
+        return None
+    return bool(bundle.option_correct[i])
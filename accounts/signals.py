@@ -0,0 +1,32 @@
+"""
+Keep Round.content_version current, so cached grading bundles (see
+round_bundle.py) are rebuilt after any change to a round's questions,
+options or test cases.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from .models import CodingQuestion, DubbingQuestion, DubbingTestCase, Question, QuestionOption, TestCase
+from .round_bundle import bump_version
+
+_CONTENT_MODELS = (Question, QuestionOption, CodingQuestion, DubbingQuestion, TestCase, DubbingTestCase)
+
+
+def _round_id(instance):
+    if isinstance(instance, QuestionOption):
+        return Question.objects.filter(id=instance.question_id).values_list('round_id', flat=True).first()
+    if isinstance(instance, TestCase):
+        return CodingQuestion.objects.filter(id=instance.coding_question_id).values_list('round_id', flat=True).first()
+    if isinstance(instance, DubbingTestCase):
+        return DubbingQuestion.objects.filter(id=instance.dubbing_question_id).values_list('round_id', flat=True).first()
+    return instance.round_id
+
+
+def round_content_changed(sender, instance, **kwargs):
+    round_id = _round_id(instance)
+    if round_id is not None:
+        bump_version(round_id)
+
+
+for _model in _CONTENT_MODELS:
+    post_save.connect(round_content_changed, sender=_model, dispatch_uid=f'round_content_saved_{_model.__name__}')
+    post_delete.connect(round_content_changed, sender=_model, dispatch_uid=f'round_content_deleted_{_model.__name__}')
@@ -1,3 +1,1215 @@
-from django.test import TestCase
+import fcntl
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from io import StringIO
+from types import MappingProxyType, SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import checks, grading_jobs, mcq, round_bundle, views
+from .execution import (
+    calibration, compile_cache, forkserver, grading, java_compiler, java_harness, process, scheduler, socket_worker,
+    toolchains, verdicts, workspaces,
+)
+from .execution.calibration import MIN_TIME_MS, question_limits
+from .execution.cancellation import Cancelled, CancelToken, cancel_key
+from .execution.compile_cache import GRADING, PREVIEW
+from .execution.executor import LocalExecutor, WarmExecutor, create_executor
+from .execution.grading import grade_many, order_by_failure_rate
+from .execution.process import ProcessResult
+from .execution.result_cache import code_key, get_results, store_results
+from .execution.scheduler import grading_slot
+from .execution.toolchains import get_registry
+from .grading_jobs import record_case_outcomes
+from .models import (
+    CandidateEntry, CodeSubmission, CodingQuestion, Event, GradingJob, Question, QuestionOption, QuestionTask, Round,
+    TestCase as CodingTestCase,
+)
+from .regrade import regrade
+from .round_bundle import Case
+
+SUM_PY = "a, b = map(int, input().split())\nprint(a + b)\n"
+SUM_C = (
+    '#include <stdio.h>\n'
+    'int main(void) { int a, b; scanf("%d %d", &a, &b); printf("%d\\n", a + b); return 0; }\n'
+)
+SUM_JAVA = (
+    'import java.io.*;\n'
+    'public class Main {\n'
+    '    public static void main(String[] args) throws IOException {\n'
+    '        String[] parts = new BufferedReader(new InputStreamReader(System.in)).readLine().trim().split(" ");\n'
+    '        System.out.println(Integer.parseInt(parts[0]) + Integer.parseInt(parts[1]));\n'
+    '    }\n'
+    '}\n'
+)
+CASES = [Case(1, 1, '1 2\n', '3', False), Case(2, 2, '5 5\n', '10', False)]
+
+
+def _available(language):
+    return get_registry().get(language).available
+
+
+class GradeManyTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        # A fresh compile cache, so the C answer really has to be compiled
+        self.settings = override_settings(COMPILE_CACHE_DIR=cache_dir, EXECUTION_RESULT_CACHE_ENABLED=False)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    @unittest.skipUnless(_available('c') and _available('python'), 'needs a C compiler and Python')
+    def test_compile_timeout_only_fails_its_own_question(self):
+        with override_settings(EXECUTION_COMPILE_TIMEOUT=0.001):
+            timed_out, graded = grade_many(
+                [(SUM_C, 'c', CASES), (SUM_PY, 'python', CASES)], self.tmp_dir, executor=LocalExecutor(),
+            )
+        self.assertEqual((timed_out.passed, timed_out.total, timed_out.records), (0, 2, []))
+        self.assertEqual((graded.passed, graded.total), (2, 2))
+
+    @unittest.skipUnless(_available('python'), 'needs Python')
+    def test_cases_run_in_parallel_and_results_keep_their_order(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        active = []
+        peak = []
+        guard = threading.Lock()
+
+        class CountingExecutor(LocalExecutor):
+            def run(self, *args, **kwargs):
+                with guard:
+                    active.append(1)
+                    peak.append(len(active))
+                try:
+                    time.sleep(0.2)
+                    return super().run(*args, **kwargs)
+                finally:
+                    with guard:
+                        active.pop()
+
+        cases = [Case(n, n, f'{n} {n}\n', str(2 * n), False) for n in range(1, 5)]
+        wrong = cases[:2] + [cases[2]._replace(expected_output='0')] + cases[3:]
+        with override_settings(GRADING_POOL_SIZE=4, EXECUTION_MAX_CONCURRENCY=4, EXECUTION_LOCK_DIR=lock_dir), \
+                mock.patch.object(grading, '_pool', None):
+            right, mixed = grade_many([(SUM_PY, 'python', cases), (SUM_PY, 'python', wrong)], self.tmp_dir,
+                                      executor=CountingExecutor())
+            grading._pool.shutdown()
+        self.assertGreater(max(peak), 1)
+        self.assertEqual((right.passed, right.total), (4, 4))
+        self.assertEqual([record['passed'] for record in mixed.records], [True, True, False, True])
+
+    @unittest.skipUnless(_available('java'), 'needs a JDK')
+    def test_java_limits_hold_with_and_without_the_harness(self):
+        # Calibrated from a fast C reference: the tightest limits a Java answer can get
+        question = SimpleNamespace(
+            reference_language='c', time_limit_ms=MIN_TIME_MS, reference_cpu_ms=1.0, memory_limit_mb=None,
+        )
+        limits = question_limits(question, 'java')
+        executors = {
+            'harness': WarmExecutor(use_java_harness=True),
+            'jvm per case': WarmExecutor(use_java_harness=False),
+            'local': LocalExecutor(),
+        }
+        for name, executor in executors.items():
+            with self.subTest(name):
+                result, = grade_many(
+                    [(SUM_JAVA, 'java', CASES)], os.path.join(self.tmp_dir, name), executor=executor, limits=[limits],
+                )
+                self.assertEqual((result.passed, result.total), (2, 2))
+                self.assertTrue(result.time_limit_met)
+
+
+class BenchExecutorTests(SimpleTestCase):
+    @unittest.skipUnless(_available('python'), 'needs Python')
+    def test_every_job_succeeds(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report_path = os.path.join(tmp_dir, 'report.json')
+            with override_settings(COMPILE_CACHE_DIR=os.path.join(tmp_dir, 'cache')):
+                call_command(
+                    'bench_executor', languages='python', jobs=2, concurrency='1', variants='warm',
+                    output=report_path, stdout=StringIO(), stderr=StringIO(),
+                )
+            with open(report_path, encoding='utf-8') as f:
+                results = json.load(f)['results']
+        self.assertEqual([r['mode'] for r in results], ['run', 'grade'])
+        for result in results:
+            self.assertEqual((result['ok'], result['errors']), (2, 0))
+
+
+@override_settings(
+    CACHES={'execution': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'result-cache-tests'}},
+    EXECUTION_RESULT_CACHE_ALIAS='execution', EXECUTION_RESULT_CACHE_ENABLED=True,
+)
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['execution'].clear()
+
+    def _record(self, elapsed=0.01):
+        return {'returncode': 0, 'elapsed': elapsed, 'cpu_time': elapsed, 'passed': True}
+
+    def test_run_results_are_shared_with_grading_when_built_the_same(self):
+        store_results(SUM_PY, 'python', CASES[:1], 2, [self._record()], profile=PREVIEW)
+        records = get_results(SUM_PY, 'python', CASES, 2, profile=GRADING)
+        self.assertEqual(records, [self._record(), None])
+
+    def test_c_previews_are_kept_apart_from_grading(self):
+        self.assertEqual(code_key(SUM_JAVA, 'java', profile=PREVIEW), code_key(SUM_JAVA, 'java', profile=GRADING))
+        self.assertNotEqual(code_key(SUM_C, 'c', profile=PREVIEW), code_key(SUM_C, 'c', profile=GRADING))
+        store_results(SUM_C, 'c', CASES, 2, [self._record(), self._record()], profile=PREVIEW)
+        self.assertIsNone(get_results(SUM_C, 'c', CASES, 2, profile=GRADING))
+
+    def test_results_too_slow_for_a_shorter_timeout_are_not_reused(self):
+        store_results(SUM_PY, 'python', CASES[:1], 5, [self._record(elapsed=3)])
+        self.assertIsNone(get_results(SUM_PY, 'python', CASES[:1], 2))
+        self.assertEqual(get_results(SUM_PY, 'python', CASES[:1], 4), [self._record(elapsed=3)])
+
+
+class ContentVersionTests(TestCase):
+    def setUp(self):
+        self.round = Round.objects.create(event=Event.objects.create(name='Event'), round_number=1)
+
+    def _version(self):
+        return Round.objects.values_list('content_version', flat=True).get(id=self.round.id)
+
+    def test_content_changes_bump_the_version(self):
+        question = Question.objects.create(round=self.round, question_text='2 + 2?')
+        question.question_text = '3 + 3?'
+        question.save()
+        question.delete()
+        self.assertEqual(self._version(), 3)
+
+    def test_saving_a_stale_round_keeps_the_bump(self):
+        stale = Round.objects.get(id=self.round.id)
+        Question.objects.create(round=self.round, question_text='2 + 2?')
+        stale.is_started = True
+        stale.save()
+        self.assertEqual(self._version(), 1)
+        self.assertTrue(Round.objects.get(id=self.round.id).is_started)
+
+
+class RunCaseOrderTests(TestCase):
+    def setUp(self):
+        round_obj = Round.objects.create(event=Event.objects.create(name='Event'), round_number=1)
+        self.question = CodingQuestion.objects.create(round=round_obj, title='Sum', problem_statement='Add')
+        self.cases = [
+            CodingTestCase.objects.create(coding_question=self.question, input_data=f'{n} 1', expected_output=str(n + 1),
+                                          order=n, is_sample=True)
+            for n in (1, 2, 3)
+        ]
+        round_bundle._bundles.clear()
+
+    def _run_order(self):
+        bundled = round_bundle.question_bundle('coding', self.question.id)
+        return [case.order for case in order_by_failure_rate(bundled.samples, round_bundle.failure_stats(bundled))]
+
+    def test_failure_rates_are_smoothed_and_ties_keep_their_order(self):
+        self.assertEqual(grading.failure_rate(0, 0), 0.5)
+        self.assertEqual(grading.failure_rate(8, 0), 0.1)
+        cases = [Case(n, n, '', '', True) for n in (1, 2, 3, 4)]
+        ordered = order_by_failure_rate(cases, {2: (8, 0), 3: (3, 3), 4: (0, 0)})
+        self.assertEqual([case.id for case in ordered], [3, 1, 4, 2])
+
+    def test_graded_failures_reorder_run_without_a_content_edit(self):
+        self.assertEqual(self._run_order(), [1, 2, 3])
+        version = Round.objects.values_list('content_version', flat=True).get()
+        records = [{'passed': True}, {'passed': True}, {'passed': False}]
+        record_case_outcomes([(CodingTestCase, self.cases, records)] * 3)
+
+        with mock.patch.object(round_bundle, 'FAILURE_STATS_TTL', 0):
+            self.assertEqual(self._run_order(), [3, 1, 2])
+        self.assertEqual(Round.objects.values_list('content_version', flat=True).get(), version)
+
+    @unittest.skipUnless(_available('python'), 'needs Python')
+    def test_run_stops_at_the_first_failure(self):
+        session = self.client.session
+        session['candidate_entry_id'] = 1
+        session.save()
+        with tempfile.TemporaryDirectory() as lock_dir, override_settings(
+                EXECUTION_LOCK_DIR=lock_dir, EXECUTION_RESULT_CACHE_ENABLED=False):
+            responses = [
+                self.client.post('/api/run-code/', json.dumps({
+                    'language': 'python', 'code': 'print(0)', 'question_id': self.question.id, 'fail_fast': fail_fast,
+                }), content_type='application/json', secure=True).json()
+                for fail_fast in (True, False)
+            ]
+        self.assertEqual([response['stopped_early'] for response in responses], [True, False])
+        self.assertEqual([sum(bool(r.get('skipped')) for r in response['results']) for response in responses], [2, 0])
+
+
+@unittest.skipUnless(_available('python'), 'needs Python')
+class RunCodeStreamTests(TestCase):
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        self.settings = override_settings(EXECUTION_LOCK_DIR=lock_dir, EXECUTION_MAX_CONCURRENCY=1)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        session = self.client.session
+        session['candidate_entry_id'] = 1
+        session.save()
+
+    def _run(self):
+        return self.client.post(
+            '/api/run-code/stream/', json.dumps({'language': 'python', 'code': SUM_PY, 'stdin': '1 2'}),
+            content_type='application/json', secure=True,
+        )
+
+    def test_busy_host_gets_a_real_429(self):
+        with grading_slot():
+            response = self._run()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(response.json()['error_type'], 'busy')
+
+    def test_streams_once_it_has_a_slot(self):
+        response = self._run()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        events = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([e['event'] for e in events], ['running', 'compiled', 'result'])
+        self.assertEqual(events[-1]['response']['output'], '3\n')
+
+
+class GradingStatusTests(TestCase):
+    def setUp(self):
+        event = Event.objects.create(name='Event')
+        round_obj = Round.objects.create(event=event, round_number=1)
+        self.entries = [
+            CandidateEntry.objects.create(event=event, round=round_obj, candidate_name=name) for name in ('Ann', 'Bo')
+        ]
+        for entry in self.entries:
+            GradingJob.objects.create(candidate=entry, status=GradingJob.STATUS_DONE, result={'score': 3})
+        session = self.client.session
+        session['candidate_entry_id'] = self.entries[0].id
+        session.save()
+
+    def _status(self, entry):
+        return self.client.get(f'/api/grading-status/{entry.id}/', secure=True)
+
+    def test_candidate_sees_their_own_score(self):
+        response = self._status(self.entries[0])
+        self.assertEqual((response.status_code, response.json()['score']), (200, 3))
+
+    def test_other_candidates_scores_are_refused(self):
+        self.assertEqual(self._status(self.entries[1]).status_code, 403)
+
+
+class GradingJobQueueTests(TestCase):
+    def setUp(self):
+        event = Event.objects.create(name='Event')
+        round_obj = Round.objects.create(event=event, round_number=1)
+        self.jobs = [
+            GradingJob.objects.create(candidate=CandidateEntry.objects.create(
+                event=event, round=round_obj, candidate_name=name,
+            ))
+            for name in ('Ann', 'Bo')
+        ]
+
+    def _expire(self, job):
+        GradingJob.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_each_job_is_claimed_by_one_worker(self):
+        self.assertEqual(grading_jobs.claim_next('w1').id, self.jobs[0].id)
+        self.assertEqual(grading_jobs.claim_next('w2').id, self.jobs[1].id)
+        self.assertIsNone(grading_jobs.claim_next('w3'))
+        self.assertFalse(grading_jobs.claim(self.jobs[0].id, 'w3'))
+
+    def test_expired_leases_are_claimed_again_until_attempts_run_out(self):
+        job = self.jobs[0]
+        for attempt in range(1, grading_jobs.MAX_ATTEMPTS + 1):
+            self.assertTrue(grading_jobs.claim(job.id, f'w{attempt}'))
+            self._expire(job)
+        self.assertEqual(grading_jobs.claim_next('w9').id, self.jobs[1].id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (GradingJob.STATUS_FAILED, grading_jobs.MAX_ATTEMPTS))
+
+    def test_only_the_owner_renews_a_lease(self):
+        job = grading_jobs.claim_next('w1')
+        self._expire(job)
+        self.assertFalse(grading_jobs.renew_lease(job.id, 'w2'))
+        self.assertTrue(grading_jobs.renew_lease(job.id, 'w1'))
+        job.refresh_from_db()
+        self.assertGreater(job.locked_until, timezone.now())
+
+    def test_a_worker_that_lost_its_lease_commits_nothing(self):
+        job = grading_jobs.claim_next('w1')
+        self._expire(job)
+        breakdown = {'score': 5, 'percentage': 100.0, 'max_score': 5}
+
+        def regrade_elsewhere(job):
+            self.assertTrue(grading_jobs.claim(job.id, 'w2'))
+            return [], breakdown, []
+
+        with mock.patch.object(grading_jobs, '_grade', side_effect=regrade_elsewhere):
+            self.assertEqual(grading_jobs.process(job, 'w1'), GradingJob.STATUS_RUNNING)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.result), (GradingJob.STATUS_RUNNING, 'w2', {}))
+
+        with mock.patch.object(grading_jobs, '_grade', return_value=([], breakdown, [])):
+            self.assertEqual(grading_jobs.process(job, 'w2'), GradingJob.STATUS_DONE)
+        self.assertEqual(CandidateEntry.objects.get(id=job.candidate_id).score, 5)
+
+
+class QuestionTaskTests(TestCase):
+    def setUp(self):
+        round_obj = Round.objects.create(event=Event.objects.create(name='Event'), round_number=1)
+        self.question = CodingQuestion.objects.create(
+            round=round_obj, title='Sum', problem_statement='Add', reference_solution=SUM_PY, reference_language='python',
+        )
+        CodingTestCase.objects.create(coding_question=self.question, input_data='1 2', expected_output='3', order=1)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def _action(self, action):
+        return self.client.post(
+            '/admin/accounts/codingquestion/', {'action': action, '_selected_action': [self.question.id]}, secure=True,
+        )
+
+    def test_admin_actions_only_queue_tasks(self):
+        self._action('calibrate_limits')
+        self._action('regrade_submissions')
+        self._action('regrade_submissions')
+        tasks = QuestionTask.objects.values_list('kind', 'question_id', 'status', 'requested_by')
+        self.assertEqual(sorted(tasks), [
+            ('calibrate', self.question.id, 'pending', 'admin'), ('regrade', self.question.id, 'pending', 'admin'),
+        ])
+        self.question.refresh_from_db()
+        self.assertIsNone(self.question.calibrated_at)
+
+    @unittest.skipUnless(_available('python'), 'needs Python')
+    def test_grade_worker_runs_queued_tasks(self):
+        self._action('calibrate_limits')
+        self._action('regrade_submissions_dry_run')
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))   # the worker installs its own
+        call_command('grade_worker', once=True, stdout=StringIO())
+
+        calibrate, regrade = QuestionTask.objects.order_by('id')
+        self.assertEqual((calibrate.status, regrade.status), ('done', 'done'))
+        self.question.refresh_from_db()
+        self.assertIsNotNone(self.question.calibrated_at)
+        self.assertIn(f'{self.question.time_limit_ms} ms CPU', calibrate.result)
+        self.assertEqual(regrade.result, 'Sum: 0 submission(s) regraded, 0 score(s) would change')
+
+
+@unittest.skipUnless(_available('python'), 'needs Python')
+class ForkServerTests(SimpleTestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+
+    def _script(self, code):
+        path = os.path.join(self.work_dir, 'solution.py')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(code)
+        return path
+
+    def test_runs_scripts_as_main(self):
+        script = self._script(SUM_PY + "import sys\nif __name__ == '__main__':\n    sys.exit(3)\n")
+        result = forkserver.run_python(script, '1 2\n', 5, self.work_dir)
+        self.assertEqual((result.returncode, result.stdout), (3, '3\n'))
+        self.assertTrue(forkserver.get_forkserver().alive())
+
+    def test_timeout_kills_the_script(self):
+        script = self._script('while True:\n    pass\n')
+        with self.assertRaises(subprocess.TimeoutExpired):
+            forkserver.run_python(script, '', 0.5, self.work_dir)
+
+    def test_falls_back_to_a_subprocess(self):
+        script = self._script(SUM_PY)
+        with mock.patch.object(forkserver, 'get_forkserver', side_effect=RuntimeError('no server')):
+            result = forkserver.run_python(script, '1 2\n', 5, self.work_dir)
+        self.assertEqual((result.returncode, result.stdout), (0, '3\n'))
+
+
+class CompileCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.settings = override_settings(COMPILE_CACHE_DIR=self.cache_dir)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_key_covers_toolchain_flags_and_source(self):
+        key = compile_cache.cache_key('c', 'gcc 12', 'solution.c', SUM_C, ['-O2'])
+        self.assertEqual(key, compile_cache.cache_key('c', 'gcc 12', 'solution.c', SUM_C, ['-O2']))
+        self.assertEqual(len({
+            key,
+            compile_cache.cache_key('c', 'gcc 13', 'solution.c', SUM_C, ['-O2']),
+            compile_cache.cache_key('c', 'gcc 12', 'solution.c', SUM_C, ['-O0']),
+            compile_cache.cache_key('c', 'gcc 12', 'solution.c', SUM_C + '\n', ['-O2']),
+            compile_cache.cache_key('java', 'gcc 12', 'solution.c', SUM_C, ['-O2']),
+        }), 5)
+
+    @unittest.skipUnless(_available('c'), 'needs a C compiler')
+    def test_builds_and_errors_are_reused(self):
+        artifact_dir, error = compile_cache.compile_source('c', SUM_C, 'solution.c')
+        self.assertIsNone(error)
+        self.assertTrue(os.path.exists(os.path.join(artifact_dir, 'solution.exe')))
+        _, compile_error = compile_cache.compile_source('c', 'int main(void) { return x; }', 'solution.c')
+        self.assertIn('error', compile_error)
+
+        with mock.patch.object(compile_cache.subprocess, 'run') as run:
+            self.assertEqual(compile_cache.compile_source('c', SUM_C, 'solution.c'), (artifact_dir, None))
+            self.assertEqual(
+                compile_cache.compile_source('c', 'int main(void) { return x; }', 'solution.c'), (None, compile_error),
+            )
+        run.assert_not_called()
+
+    def _entry(self, name, age, size=1000):
+        entry_dir = os.path.join(self.cache_dir, name)
+        os.makedirs(entry_dir)
+        with open(os.path.join(entry_dir, 'solution.exe'), 'wb') as f:
+            f.write(b'\0' * size)
+        marker = os.path.join(entry_dir, compile_cache.USED_MARKER)
+        open(marker, 'w').close()
+        last_used = time.time() - age
+        os.utime(marker, (last_used, last_used))
+
+    @override_settings(COMPILE_CACHE_MAX_BYTES=2500)
+    def test_evicts_least_recently_used_entries(self):
+        for name, age in (('newest', 600), ('oldest', 1800), ('older', 1200), ('in-use', 0)):
+            self._entry(name, age)
+        with mock.patch.object(compile_cache, '_last_eviction', 0.0):
+            compile_cache._evict(self.cache_dir)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['in-use', 'newest'])
+
+    @override_settings(COMPILE_CACHE_MAX_BYTES=500)
+    def test_recently_used_entries_are_never_evicted(self):
+        self._entry('in-use', 0)
+        with mock.patch.object(compile_cache, '_last_eviction', 0.0):
+            compile_cache._evict(self.cache_dir)
+        self.assertEqual(os.listdir(self.cache_dir), ['in-use'])
+
+
+class JavaHarnessTests(SimpleTestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+
+    def test_startup_is_taken_off_one_jvm_per_case_runs(self):
+        result = ProcessResult(['java'], 0, '', '', 0.5, 0.25, 1000)
+        with mock.patch.object(java_harness, 'jvm_startup', return_value=(0.375, 0.125)):
+            java_harness.discount_startup(result)
+            self.assertEqual(java_harness.startup_timeout(2), 2.125)
+        self.assertEqual((result.cpu_time, result.elapsed), (0.0, 0.375))
+
+    def test_runs_cases_separately_without_the_harness(self):
+        with mock.patch.object(java_harness, '_harness_dir', side_effect=RuntimeError('no javac')), \
+                mock.patch.object(java_harness, '_run_separately', return_value=['result']) as run_separately:
+            results = java_harness.run_java_cases('classes', 'Main', ['1 2\n'], 2, self.work_dir)
+        self.assertEqual(results, ['result'])
+        self.assertEqual(run_separately.call_args.args[:5], ('classes', 'Main', ['1 2\n'], 2, self.work_dir))
+
+    @unittest.skipUnless(_available('java'), 'needs a JDK')
+    def test_one_jvm_runs_every_case_and_survives_system_exit(self):
+        source = SUM_JAVA.replace(
+            'System.out.println(', 'int sum = Integer.parseInt(parts[0]) + Integer.parseInt(parts[1]);\n'
+            '        if (sum == 0) System.exit(7);\n        System.out.println(',
+        )
+        class_dir, error = compile_cache.compile_source('java', source, 'Main.java')
+        self.assertIsNone(error)
+        results = java_harness.run_java_cases(class_dir, 'Main', ['1 2\n', '0 0\n', '5 5\n'], 5, self.work_dir)
+        self.assertEqual([(r.returncode, r.stdout) for r in results], [(0, '3\n'), (7, ''), (0, '10\n')])
+
+
+class SchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.lock_dir, ignore_errors=True)
+        self.settings = override_settings(
+            EXECUTION_LOCK_DIR=self.lock_dir, EXECUTION_MAX_CONCURRENCY=2, EXECUTION_PREVIEW_WAIT_SECONDS=0.05,
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_slots_reserved_for_grading(self):
+        for total, reserved, expected in ((8, None, 2), (2, None, 1), (1, None, 0), (4, 9, 3), (4, 0, 0)):
+            with self.subTest(total=total, reserved=reserved), override_settings(
+                    EXECUTION_MAX_CONCURRENCY=total, EXECUTION_GRADING_RESERVED_SLOTS=reserved):
+                self.assertEqual(scheduler.grading_reserved_slots(), expected)
+
+    def test_one_preview_per_candidate(self):
+        with scheduler.preview_slot('ann'):
+            with self.assertRaises(scheduler.Saturated) as raised:
+                with scheduler.preview_slot('ann'):
+                    pass
+        self.assertEqual(raised.exception.retry_after, 1)
+
+    def test_previews_leave_the_reserved_slots_to_grading(self):
+        with scheduler.preview_slot('ann'):
+            with self.assertRaises(scheduler.Saturated):
+                with scheduler.preview_slot('bo'):
+                    pass
+            with grading_slot():
+                pass
+
+    def test_previews_give_way_to_waiting_graders(self):
+        waiting = os.open(os.path.join(self.lock_dir, 'grading-waiting.lock'), os.O_RDWR | os.O_CREAT)
+        self.addCleanup(os.close, waiting)
+        fcntl.flock(waiting, fcntl.LOCK_SH)
+        with self.assertRaises(scheduler.Saturated):
+            with scheduler.preview_slot('ann'):
+                pass
+        fcntl.flock(waiting, fcntl.LOCK_UN)
+        with scheduler.preview_slot('ann'):
+            pass
+
+
+@unittest.skipUnless(_available('python'), 'needs Python')
+class ResourceAccountingTests(SimpleTestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+
+    def _run(self, code, **kwargs):
+        return process.run_process(['python', '-c', code], '', 5, self.work_dir, **kwargs)
+
+    def test_cpu_time_counts_work_not_waiting(self):
+        sleeping = self._run('import time; time.sleep(0.3)')
+        busy = self._run('import time\nend = time.process_time() + 0.3\nwhile time.process_time() < end: pass')
+        self.assertGreaterEqual(sleeping.elapsed, 0.3)
+        self.assertLess(sleeping.cpu_time, 0.2)
+        self.assertGreaterEqual(busy.cpu_time, 0.25)
+
+    def test_peak_memory_and_memory_limit(self):
+        grow = 'block = bytearray(64 * 1024 * 1024)'
+        self.assertGreater(self._run(grow).peak_rss_kb, 60 * 1024)
+        limited = self._run(grow, memory_mb=32)
+        self.assertNotEqual(limited.returncode, 0)
+        self.assertIn('MemoryError', limited.stderr)
+
+    def test_cpu_limit_counts_as_a_timeout(self):
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self._run('while True: pass', cpu_seconds=1)
+        self.assertTrue(process.is_cpu_limit_kill(-signal.SIGXCPU, 0.5, 1))
+        self.assertTrue(process.is_cpu_limit_kill(-signal.SIGKILL, 1.0, 1))
+        self.assertFalse(process.is_cpu_limit_kill(-signal.SIGKILL, 0.1, 1))
+
+    def test_efficiency_marks_use_cpu_time(self):
+        record = {'passed': True, 'returncode': 0, 'aborted': None, 'elapsed': 3.0, 'cpu_time': 0.5, 'peak_rss_kb': 10}
+        result = grading.score_records([record, dict(record, cpu_time=0.7, peak_rss_kb=20)])
+        self.assertTrue(result.time_limit_met)
+        self.assertEqual((round(result.cpu_time_ms), result.peak_memory_kb), (600, 20))
+        self.assertFalse(grading.score_records([record], time_limit_ms=400).time_limit_met)
+
+
+class OutputMonitorTests(SimpleTestCase):
+    def _feed(self, monitor, *chunks):
+        for chunk in chunks:
+            monitor.feed('stdout', chunk)
+        return monitor.aborted
+
+    def test_matching_output_split_across_chunks(self):
+        monitor = process.OutputMonitor('héllo\nworld')
+        self.assertIsNone(self._feed(monitor, b'\n  h\xc3', b'\xa9llo\r', b'\nworld\r\n', b'\n'))
+        self.assertEqual(monitor.stdout, '\n  héllo\r\nworld\r\n\n')
+
+    def test_divergence_is_caught_as_it_streams(self):
+        self.assertEqual(self._feed(process.OutputMonitor('42'), b'4', b'3'), process.WRONG_ANSWER)
+        self.assertEqual(self._feed(process.OutputMonitor('42'), b'42\n', b'7'), process.WRONG_ANSWER)
+        self.assertIsNone(self._feed(process.OutputMonitor(None), b'anything'))
+
+    def test_output_is_capped(self):
+        monitor = process.OutputMonitor(limit=10)
+        self.assertEqual(self._feed(monitor, b'12345678', b'12345678'), process.OUTPUT_LIMIT_EXCEEDED)
+        self.assertEqual(monitor.stdout, '1234567812')
+        monitor = process.OutputMonitor(limit=10)
+        monitor.feed('stderr', b'x' * 11)
+        self.assertEqual((monitor.aborted, monitor.stderr), (process.OUTPUT_LIMIT_EXCEEDED, 'x' * 10))
+        # A long expected answer always fits
+        self.assertIsNone(self._feed(process.OutputMonitor('y' * 50, limit=10), b'y' * 50))
+
+    @unittest.skipUnless(_available('python'), 'needs Python')
+    def test_wrong_answer_stops_the_program(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            result = process.run_process(
+                ['python', '-c', 'import time; print("wrong", flush=True); time.sleep(10)'], '', 20, work_dir,
+                expected='right',
+            )
+        self.assertEqual(result.aborted, process.WRONG_ANSWER)
+        self.assertTrue(result.stdout.startswith('w'))
+        self.assertLess(result.elapsed, 5)
+
+
+class WorkspacePoolTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.settings = override_settings(EXECUTION_WORKSPACE_DIR=self.root, EXECUTION_WORKSPACE_POOL_SIZE=2)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_workspaces_are_pooled_and_emptied(self):
+        with workspaces.workspace() as first:
+            with open(os.path.join(first, 'solution.py'), 'w') as f:
+                f.write(SUM_PY)
+            os.makedirs(os.path.join(first, 'out', 'nested'))
+            with workspaces.workspace() as second:
+                with workspaces.workspace() as overflow:
+                    self.assertEqual(os.path.dirname(overflow), self.root)
+                    self.assertTrue(os.path.basename(overflow).startswith('overflow-'))
+                self.assertFalse(os.path.exists(overflow))
+        self.assertEqual(sorted(os.path.basename(p) for p in (first, second)), ['ws-0', 'ws-1'])
+        self.assertEqual(os.listdir(first), [])
+
+    def test_leftovers_of_a_dead_worker_are_wiped(self):
+        workspaces.provision()
+        for i in range(2):
+            open(os.path.join(self.root, f'ws-{i}', 'stale'), 'w').close()
+        with workspaces.workspace() as path:
+            self.assertEqual(os.listdir(path), [])
+
+
+class ExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+
+    def _socket_executor(self):
+        path = os.path.join(self.work_dir, 'worker.sock')
+        server = socket_worker.WorkerServer(path, executor=LocalExecutor())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return socket_worker.SocketExecutor(path)
+
+    def test_backends_by_name(self):
+        self.assertIsInstance(create_executor('local'), LocalExecutor)
+        self.assertIsInstance(create_executor('warm'), WarmExecutor)
+        self.assertIsInstance(create_executor('socket'), socket_worker.SocketExecutor)
+        with self.assertRaises(ValueError):
+            create_executor('docker')
+
+    @unittest.skipUnless(_available('c') and _available('python'), 'needs a C compiler and Python')
+    def test_every_backend_runs_submissions_alike(self):
+        executors = {
+            'local': LocalExecutor(), 'warm': WarmExecutor(), 'socket': self._socket_executor(),
+            'socket, no worker': socket_worker.SocketExecutor(os.path.join(self.work_dir, 'missing.sock')),
+        }
+        for name, executor in executors.items():
+            for language, code in (('python', SUM_PY), ('c', SUM_C)):
+                with self.subTest(name, language=language):
+                    prepared, error = executor.prepare(code, language, os.path.join(self.work_dir, name, language))
+                    self.assertIsNone(error)
+                    results = executor.run_cases(prepared, ['1 2\n', '5 5\n'], 5, ['3', '10'])
+                    self.assertEqual([(r.returncode, r.stdout) for r in results], [(0, '3\n'), (0, '10\n')])
+
+    def test_unknown_languages_and_compile_errors(self):
+        executor = LocalExecutor()
+        self.assertEqual(executor.prepare('x', 'cobol', self.work_dir), (None, 'Unsupported language: cobol'))
+        if _available('c'):
+            prepared, error = executor.prepare('int main(void) { return x; }', 'c', self.work_dir)
+            self.assertIsNone(prepared)
+            self.assertIn('error', error)
+
+
+class ToolchainRegistryTests(SimpleTestCase):
+    def _registry_without(self, *missing):
+        resolved = {
+            language: toolchains.Toolchain(
+                language, {name: None if language in missing else f'/usr/bin/{name}' for name in spec['binaries']},
+                None if language in missing else f'{language} 1.0',
+            )
+            for language, spec in toolchains.LANGUAGES.items()
+        }
+        return toolchains.Registry(MappingProxyType({'PATH': '/usr/bin'}), resolved)
+
+    def test_resolved_once_and_read_only(self):
+        registry = get_registry()
+        self.assertIs(get_registry(), registry)
+        with self.assertRaises(TypeError):
+            registry.env['PATH'] = '/tmp'
+
+    def test_missing_toolchains_are_hidden_and_reported(self):
+        with mock.patch.object(toolchains, '_registry', self._registry_without('java')):
+            self.assertEqual(toolchains.available_languages(), [('c', 'C'), ('python', 'Python')])
+            warnings = checks.toolchains_check(None)
+            prepared, error = LocalExecutor().prepare(SUM_JAVA, 'java', tempfile.gettempdir())
+        self.assertEqual(
+            [(w.id, w.msg) for w in warnings], [('accounts.W001', 'Toolchains not available on this host: Java')],
+        )
+        self.assertEqual((prepared, error), (None, toolchains.LANGUAGES['java']['missing']))
+
+    def test_nothing_to_report_when_every_toolchain_is_there(self):
+        with mock.patch.object(toolchains, '_registry', self._registry_without()):
+            self.assertEqual(checks.toolchains_check(None), [])
+
+
+@unittest.skipUnless(_available('python'), 'needs Python')
+@override_settings(EXECUTION_RESULT_CACHE_ENABLED=False)
+class SampleRunTests(TestCase):
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        self.settings = override_settings(EXECUTION_LOCK_DIR=lock_dir)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        round_obj = Round.objects.create(event=Event.objects.create(name='Event'), round_number=1)
+        self.question = CodingQuestion.objects.create(
+            round=round_obj, title='Sum', problem_statement='Add', sample_input='1 2', sample_output='3',
+        )
+        for order, (stdin, expected, is_sample) in enumerate((('4 4', '8', True), ('5 5', '10', False)), 1):
+            CodingTestCase.objects.create(
+                coding_question=self.question, input_data=stdin, expected_output=expected, order=order,
+                is_sample=is_sample,
+            )
+        round_bundle._bundles.clear()
+        session = self.client.session
+        session['candidate_entry_id'] = 1
+        session.save()
+
+    def _run(self):
+        return self.client.post(
+            '/api/run-code/', json.dumps({'language': 'python', 'code': SUM_PY, 'question_id': self.question.id}),
+            content_type='application/json', secure=True,
+        ).json()
+
+    def test_run_checks_only_the_samples(self):
+        response = self._run()
+        self.assertEqual(response['total'], 2)
+        self.assertEqual([(r['order'], r['input'], r['passed']) for r in response['results']], [
+            (0, '1 2', True), (1, '4 4', True),
+        ])
+        bundled = round_bundle.question_bundle('coding', self.question.id)
+        self.assertEqual([case.order for case in bundled.cases], [1, 2])
+
+    def test_questions_without_samples_say_so(self):
+        CodingQuestion.objects.filter(id=self.question.id).update(sample_output='')
+        CodingTestCase.objects.update(is_sample=False)
+        round_bundle._bundles.clear()
+        response = self._run()
+        self.assertEqual(response['mode'], 'simple')
+        self.assertIn('no sample test cases', response['note'])
+
+
+class CompileProfileTests(SimpleTestCase):
+    def test_profile_flags(self):
+        self.assertEqual(compile_cache.compile_flags('c', PREVIEW), ['-O0'])
+        self.assertEqual(compile_cache.compile_flags('c', GRADING), ['-O2'])
+        self.assertEqual(compile_cache.compile_flags('python', GRADING), [])
+        with override_settings(COMPILE_PROFILES={'c': {GRADING: ['-O3']}}):
+            self.assertEqual(compile_cache.compile_flags('c', GRADING), ['-O3'])
+            self.assertEqual(compile_cache.compile_flags('c', PREVIEW), ['-O0'])
+
+    @unittest.skipUnless(_available('c'), 'needs a C compiler')
+    def test_previews_and_grading_builds_are_cached_apart(self):
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(COMPILE_CACHE_DIR=cache_dir):
+            builds = {
+                profile: compile_cache.compile_source('c', SUM_C, 'solution.c', profile=profile)[0]
+                for profile in (PREVIEW, GRADING)
+            }
+            self.assertNotEqual(builds[PREVIEW], builds[GRADING])
+            for profile, artifact_dir in builds.items():
+                with open(os.path.join(artifact_dir, compile_cache.META_FILE), encoding='utf-8') as f:
+                    meta = json.load(f)
+                self.assertEqual((meta['profile'], meta['flags']), (profile, compile_cache.compile_flags('c', profile)))
+
+
+class JavaCompileServerTests(SimpleTestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+
+    def _fake_server(self, diagnostics):
+        """A loopback listener answering one request the way CompileServer does"""
+        listener = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(listener.close)
+        requests = []
+
+        def serve():
+            conn, _ = listener.accept()
+            with conn, conn.makefile('rb') as f:
+                header = [f.readline().decode().rstrip('\n') for _ in range(4)]
+                flags = [f.readline().decode().rstrip('\n') for _ in range(int(header[3]))]
+                source = f.read(int(f.readline()))
+                requests.append((header[:3], flags, source))
+                reply = diagnostics.encode('utf-8')
+                conn.sendall(f'RC 1 {len(reply)}\n'.encode('utf-8') + reply)
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        daemon = java_compiler.CompileDaemon()
+        daemon.port, daemon.token = listener.getsockname()[1], 'secret'
+        return daemon, requests
+
+    def test_compiles_through_the_server_like_javac(self):
+        source_path = os.path.join(os.path.abspath(self.work_dir), 'Main.java')
+        daemon, requests = self._fake_server(f'{source_path}:1: error: class, interface, or enum expected\n')
+        result = daemon.compile(self.work_dir, 'Main.java', 'clas Main {}', ['-g:none'], 5)
+        self.assertEqual(requests, [(
+            ['secret', os.path.abspath(self.work_dir), 'Main.java'], ['-g:none'], b'clas Main {}',
+        )])
+        self.assertEqual(result.args, ['javac', '-g:none', 'Main.java'])
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(result.stderr, 'Main.java:1: error: class, interface, or enum expected\n')
+
+    def test_falls_back_to_javac(self):
+        completed = subprocess.CompletedProcess(['javac'], 0, '', '')
+        with mock.patch.object(java_compiler, 'get_daemon', side_effect=RuntimeError('no JVM')), \
+                mock.patch.object(java_compiler, 'shutdown') as shutdown, \
+                mock.patch.object(java_compiler.subprocess, 'run', return_value=completed) as run:
+            self.assertIs(java_compiler.compile_java(self.work_dir, 'Main.java', SUM_JAVA, [], 5), completed)
+        shutdown.assert_called_once_with()
+        self.assertEqual(run.call_args.args[0], ['javac', 'Main.java'])
+        self.assertEqual(run.call_args.kwargs['cwd'], self.work_dir)
+
+    def test_a_stuck_server_is_stopped(self):
+        daemon = mock.Mock()
+        daemon.compile.side_effect = subprocess.TimeoutExpired(['javac'], 5)
+        with mock.patch.object(java_compiler, 'get_daemon', return_value=daemon), \
+                mock.patch.object(java_compiler, 'shutdown') as shutdown, \
+                mock.patch.object(java_compiler.subprocess, 'run') as run:
+            with self.assertRaises(subprocess.TimeoutExpired):
+                java_compiler.compile_java(self.work_dir, 'Main.java', SUM_JAVA, [], 5)
+        shutdown.assert_called_once_with()
+        run.assert_not_called()
+
+
+class CancellationTests(SimpleTestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.lock_dir, ignore_errors=True)
+        self.settings = override_settings(EXECUTION_LOCK_DIR=self.lock_dir)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_a_newer_run_supersedes_the_older_one(self):
+        older, newer = CancelToken(), CancelToken()
+        older.claim(('ann', 'coding', 1))
+        self.assertFalse(older.cancelled())
+        newer.claim(('ann', 'coding', 1))
+        with self.assertRaises(Cancelled):
+            older.check()
+        older.release()
+        self.assertFalse(newer.cancelled())
+        # A worker process holding a copy of the token sees the cancellation too
+        copy = CancelToken.load(newer.dump())
+        cancel_key(('ann', 'coding', 1))
+        self.assertTrue(copy.cancelled())
+
+    @unittest.skipUnless(_available('python'), 'needs Python')
+    def test_cancelling_kills_the_program(self):
+        script = os.path.join(self.lock_dir, 'solution.py')
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write('import time\ntime.sleep(30)\n')
+        for name, run in (
+                ('subprocess', lambda token: process.run_process(['python', script], '', 30, self.lock_dir, cancel=token)),
+                ('fork-server', lambda token: forkserver.run_python(script, '', 30, self.lock_dir, cancel=token))):
+            with self.subTest(name):
+                token = CancelToken()
+                timer = threading.Timer(0.2, token.cancel)
+                timer.start()
+                started = time.monotonic()
+                with self.assertRaises(Cancelled):
+                    run(token)
+                timer.join()
+                self.assertLess(time.monotonic() - started, 5)
+
+
+class CalibrationTests(TestCase):
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        self.settings = override_settings(EXECUTION_LOCK_DIR=lock_dir, EXECUTION_RUN_TIMEOUT=5)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        round_obj = Round.objects.create(event=Event.objects.create(name='Event'), round_number=1)
+        self.question = CodingQuestion.objects.create(
+            round=round_obj, title='Sum', problem_statement='Add', reference_solution=SUM_C, reference_language='c',
+        )
+
+    def test_uncalibrated_questions_keep_the_defaults(self):
+        self.assertEqual(question_limits(None, 'python'), calibration.default_limits())
+        self.assertEqual(question_limits(self.question, 'python'), (5, None, None, grading.TIME_LIMIT_MS))
+
+    def test_limits_scale_by_language(self):
+        question = SimpleNamespace(reference_language='c', time_limit_ms=100, memory_limit_mb=64, reference_cpu_ms=30)
+        self.assertEqual(question_limits(question, 'c'), (1.5, 0.25, 64, 100))
+        self.assertEqual(question_limits(question, 'python'), (2.0, 0.5, None, 300))
+        with override_settings(CALIBRATION_LANGUAGE_FACTORS={'c': 1.0, 'python': 2.0}):
+            self.assertEqual(question_limits(question, 'python'), (1.5, 0.25, None, 120))
+        question.time_limit_ms = 10000
+        self.assertEqual(question_limits(question, 'c').timeout, 5)
+
+    def _calibrate(self, *passes):
+        """Calibrate with each pass of the reference over the cases replaced by (CPU seconds, peak KB, passed) triples"""
+        for order in (1, 2):
+            CodingTestCase.objects.create(
+                coding_question=self.question, input_data='1 2', expected_output='3', order=order,
+            )
+        executor = mock.Mock()
+        executor.prepare.return_value = (object(), None)
+        records = [
+            [{'cpu_time': cpu, 'peak_rss_kb': kb, 'passed': passed} for cpu, kb, passed in cases] for cases in passes
+        ]
+        with mock.patch.object(calibration, '_run_all', side_effect=records) as run_all:
+            limits = calibration.calibrate(self.question, executor=executor, runs=2)
+        self.question.refresh_from_db()
+        return limits, run_all
+
+    def test_limits_come_from_the_slowest_runs(self):
+        limits, run_all = self._calibrate(
+            [(0.05, 20000, True), (0.1, 30000, True)],
+            [(0.04, 40000, True), (0.06, 25000, True)],
+            [(0.05, 20000, True), (0.05, 20000, True)],    # the check under the new limits
+        )
+        question = self.question
+        self.assertEqual((question.time_limit_ms, question.memory_limit_mb, question.reference_cpu_ms), (300, 157, 75.0))
+        self.assertIsNotNone(question.calibrated_at)
+        self.assertEqual(limits, question_limits(question, 'c'))
+        self.assertEqual(run_all.call_args.args[3], limits)
+
+    def test_memory_limit_is_dropped_if_the_reference_needs_more(self):
+        passing = [(0.01, 1000, True)] * 2
+        limits, _ = self._calibrate(passing, passing, [(0.01, 1000, False)] * 2, passing)
+        self.assertEqual((self.question.time_limit_ms, self.question.memory_limit_mb), (calibration.MIN_TIME_MS, None))
+        self.assertIsNone(limits.memory_mb)
+
+    def test_questions_that_cannot_be_calibrated(self):
+        with self.assertRaisesMessage(calibration.CalibrationError, 'No test cases'):
+            calibration.calibrate(self.question)
+        self.question.reference_solution = ''
+        with self.assertRaisesMessage(calibration.CalibrationError, 'No reference solution'):
+            calibration.calibrate(self.question)
+
+
+@unittest.skipUnless(_available('python'), 'needs Python')
+class ReferenceOutputTests(SimpleTestCase):
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        self.settings = override_settings(EXECUTION_LOCK_DIR=lock_dir, COMPILE_CACHE_DIR=os.path.join(lock_dir, 'cache'))
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_reference_prints_the_expected_outputs(self):
+        self.assertEqual(calibration.reference_outputs(SUM_PY, 'python', ['1 2', '5 5\r\n']), ['3', '10'])
+        with self.assertRaisesMessage(calibration.CalibrationError, 'failed on input 2 (exit code 1'):
+            calibration.reference_outputs(SUM_PY, 'python', ['1 2', 'x'])
+        if _available('c'):
+            with self.assertRaisesMessage(calibration.CalibrationError, 'does not compile'):
+                calibration.reference_outputs('int main(void) { return x; }', 'c', ['1 2'])
+
+    def test_blank_outputs_are_filled_in_and_typos_caught(self):
+        sample_output, cases = views._check_with_reference(
+            SUM_PY, 'python', '1 2', '', [['2 2', '', True], ['5 5', '10', False]],
+        )
+        self.assertEqual((sample_output, cases), ('3', [['2 2', '4', True], ['5 5', '10', False]]))
+        with self.assertRaisesMessage(calibration.CalibrationError, "test case #2 (reference prints '10')"):
+            views._check_with_reference(SUM_PY, 'python', '', '', [['2 2', '', False], ['5 5', '11', False]])
+        with self.assertRaisesMessage(calibration.CalibrationError, 'the sample output does not match'):
+            views._check_with_reference(SUM_PY, 'python', '1 2', '4', [])
+
+
+@unittest.skipUnless(_available('python'), 'needs Python')
+@override_settings(EXECUTION_RESULT_CACHE_ENABLED=False)
+class RegradeTests(TestCase):
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        self.settings = override_settings(EXECUTION_LOCK_DIR=lock_dir)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        event = Event.objects.create(name='Event')
+        round_obj = Round.objects.create(event=event, round_number=1)
+        self.question = CodingQuestion.objects.create(round=round_obj, title='Sum', problem_statement='Add')
+        self.cases = [
+            CodingTestCase.objects.create(coding_question=self.question, input_data=stdin, expected_output=out, order=n)
+            for n, (stdin, out) in enumerate((('1 2', '3'), ('5 5', '10')), 1)
+        ]
+        self.entry = CandidateEntry.objects.create(
+            event=event, round=round_obj, candidate_name='Ann', score=0, total_questions=8,
+        )
+        self.job = GradingJob.objects.create(
+            candidate=self.entry, status=GradingJob.STATUS_DONE, result={'score': 0, 'max_score': 8},
+        )
+        # Graded before the test cases were last changed
+        self.submission = CodeSubmission.objects.create(
+            candidate=self.entry, question_id=self.question.id, code=SUM_PY, language='python', total_test_cases=2,
+        )
+        round_bundle._bundles.clear()
+
+    def _scores(self):
+        self.submission.refresh_from_db()
+        self.entry.refresh_from_db()
+        self.job.refresh_from_db()
+        return self.submission.total_score, self.entry.score, self.job.result['score']
+
+    def test_dry_run_only_reports(self):
+        changes = regrade('coding', self.question.id, dry_run=True)
+        self.assertEqual([(c.candidate, c.old_score, c.new_score, c.new_passed) for c in changes], [('Ann', 0, 8, 2)])
+        self.assertEqual(self._scores(), (0, 0, 0))
+
+    def test_only_stale_submissions_are_regraded(self):
+        self.assertEqual(len(regrade('coding', self.question.id)), 1)
+        self.assertEqual(self._scores(), (8, 8, 8))
+        self.assertEqual(regrade('coding', self.question.id), [])
+
+        self.cases[1].expected_output = '11'
+        self.cases[1].save()
+        changes = regrade('coding', self.question.id)
+        self.assertEqual([(c.old_score, c.new_score) for c in changes], [(8, 6)])
+        self.assertEqual(self._scores(), (6, 6, 6))
+        self.assertEqual(self.job.result['percentage'], 75.0)
+        case_verdicts = verdicts.unpack(self.submission.case_verdicts, self.submission.case_cpu_us)
+        self.assertEqual([code for code, _ in case_verdicts], [verdicts.ACCEPTED, verdicts.WRONG])
+
+
+class VerdictTests(SimpleTestCase):
+    def _record(self, **fields):
+        return dict({'passed': False, 'returncode': 0, 'aborted': None, 'cpu_time': 0.0}, **fields)
+
+    def test_verdict_of_each_outcome(self):
+        records = [
+            self._record(passed=True), self._record(), self._record(aborted=process.WRONG_ANSWER, returncode=-9),
+            self._record(returncode=None), self._record(returncode=1),
+            self._record(returncode=-9, aborted=process.OUTPUT_LIMIT_EXCEEDED),
+        ]
+        self.assertEqual(
+            [verdicts.LABELS[verdicts.verdict(record)] for record in records], ['AC', 'WA', 'WA', 'TLE', 'RE', 'OLE'],
+        )
+
+    def test_pack_round_trip(self):
+        records = [self._record(passed=True, cpu_time=0.0123456), self._record(returncode=None, cpu_time=5000.0)]
+        case_verdicts, case_cpu_us = verdicts.pack(records, 2)
+        self.assertEqual((len(case_verdicts), len(case_cpu_us)), (2, 8))
+        self.assertEqual(verdicts.unpack(case_verdicts, case_cpu_us), [
+            (verdicts.ACCEPTED, 12.346), (verdicts.TIME_LIMIT, (2 ** 32 - 1) / 1000),
+        ])
+
+    def test_nothing_ran_and_older_rows(self):
+        self.assertEqual(verdicts.unpack(*verdicts.pack([], 3)), [(verdicts.NOT_RUN, 0.0)] * 3)
+        self.assertEqual(
+            verdicts.unpack(memoryview(b'\x00\x01'), b''), [(verdicts.ACCEPTED, None), (verdicts.WRONG, None)],
+        )
+        self.assertEqual(verdicts.unpack(None, None), [])
+
+
+class RoundBundleTests(TestCase):
+    def setUp(self):
+        self.round = Round.objects.create(event=Event.objects.create(name='Event'), round_number=1)
+        self.question = Question.objects.create(round=self.round, question_text='2 + 2?')
+        self.options = [
+            QuestionOption.objects.create(question=self.question, option_text=text, option_number=n, is_correct=n == 2)
+            for n, text in enumerate(('3', '4'), 1)
+        ]
+        coding = CodingQuestion.objects.create(round=self.round, title='Sum', problem_statement='Add')
+        CodingTestCase.objects.create(coding_question=coding, input_data='1 2\r\n', expected_output='3\r\n', order=1)
+        self.coding_id = coding.id
+        round_bundle._bundles.clear()
+
+    def test_bundle_is_reused_until_the_round_changes(self):
+        bundle = round_bundle.get_bundle(self.round.id)
+        self.assertEqual(round_bundle.mcq_total(bundle), 1)
+        self.assertEqual([round_bundle.is_correct(bundle, self.question.id, o.id) for o in self.options], [False, True])
+        self.assertEqual(bundle.coding[self.coding_id].cases[0][2:4], ('1 2\n', '3'))
+        with self.assertNumQueries(1):
+            self.assertIs(round_bundle.get_bundle(self.round.id), bundle)
+        with self.assertNumQueries(0):
+            self.assertIs(round_bundle.get_bundle(self.round.id, bundle.version), bundle)
+
+        self.options[0].is_correct = True
+        self.options[0].save()
+        rebuilt = round_bundle.get_bundle(self.round.id)
+        self.assertGreater(rebuilt.version, bundle.version)
+        self.assertTrue(round_bundle.is_correct(rebuilt, self.question.id, self.options[0].id))
+
+    def test_options_of_other_questions_are_not_answers(self):
+        bundle = round_bundle.get_bundle(self.round.id)
+        other = Question.objects.create(round=self.round, question_text='1 + 1?')
+        self.assertIsNone(round_bundle.is_correct(bundle, other.id, self.options[1].id))
+        self.assertIsNone(round_bundle.is_correct(bundle, self.question.id, 0))
+
+    def test_only_recent_rounds_are_kept(self):
+        other = Round.objects.create(event=self.round.event, round_number=2)
+        with mock.patch.object(round_bundle, 'MAX_BUNDLES', 1):
+            round_bundle.get_bundle(self.round.id)
+            round_bundle.get_bundle(other.id)
+        self.assertEqual(list(round_bundle._bundles), [other.id])
+
+
+class McqResponseTests(TestCase):
+    def setUp(self):
+        self.round = Round.objects.create(event=Event.objects.create(name='Event'), round_number=1)
+        self.questions = [Question.objects.create(round=self.round, question_text=f'Q{n}') for n in (1, 2)]
+        # options[q][n]: option n + 1 of question q; option 1 is correct
+        self.options = [
+            [QuestionOption.objects.create(question=q, option_text=str(n), option_number=n, is_correct=n == 1)
+             for n in (1, 2)]
+            for q in self.questions
+        ]
+        round_bundle._bundles.clear()
+
+    def _answers(self, *picks):
+        """{question id: option id} for the option index picked per question (None for no answer)"""
+        return {
+            q.id: options[pick].id for q, options, pick in zip(self.questions, self.options, picks) if pick is not None
+        }
+
+    def test_pack_round_trip(self):
+        responses = {7: 2 ** 32 - 1, 2 ** 31: 5, 3: 9}
+        packed = mcq.pack_responses(responses)
+        self.assertEqual(len(packed), 24)
+        self.assertEqual(mcq.unpack_responses(packed), responses)
+        self.assertEqual(list(mcq.unpack_responses(packed)), [3, 7, 2 ** 31])
+        self.assertEqual(mcq.unpack_responses(None), {})
+
+    def test_score_all(self):
+        bundle = round_bundle.get_bundle(self.round.id)
+        packed = [
+            mcq.pack_responses(self._answers(0, 0)), None, mcq.pack_responses(self._answers(1, 0)),
+            mcq.pack_responses({}), mcq.pack_responses(self._answers(None, 1)),
+        ]
+        self.assertEqual(mcq.score_all(bundle, packed), [2, 0, 1, 0, 0])
+
+    def _candidate(self, name, picks, status=GradingJob.STATUS_DONE):
+        responses = None if picks is None else mcq.pack_responses(self._answers(*picks))
+        score = 0 if picks is None else sum(pick == 0 for pick in picks)
+        entry = CandidateEntry.objects.create(
+            event=self.round.event, round=self.round, candidate_name=name, is_submitted=True, score=score + 4,
+            total_questions=10, mcq_responses=responses,
+        )
+        done = status == GradingJob.STATUS_DONE
+        GradingJob.objects.create(
+            candidate=entry, status=status, mcq_score=score, mcq_total=2,
+            result={'score': score + 4, 'max_score': 10, 'total_questions': 2} if done else {},
+        )
+        return entry
+
+    def test_rescore_round_after_the_answer_key_changes(self):
+        ann, bo = self._candidate('Ann', (0, 0)), self._candidate('Bo', (1, 0))
+        self._candidate('Cy', None)
+        self._candidate('Di', (1, 1), status=GradingJob.STATUS_RUNNING)
+        self.options[0][1].is_correct = True
+        self.options[0][1].save()
+
+        changes, skipped = mcq.rescore_round(self.round.id, dry_run=True)
+        self.assertEqual(([(c.candidate, c.old_score, c.new_score) for c in changes], skipped), ([('Bo', 1, 2)], 2))
+        bo.refresh_from_db()
+        self.assertEqual(bo.score, 5)
+
+        mcq.rescore_round(self.round.id)
+        ann.refresh_from_db()
+        bo.refresh_from_db()
+        self.assertEqual((ann.score, bo.score, bo.percentage), (6, 6, 60.0))
+        job = GradingJob.objects.get(candidate=bo)
+        self.assertEqual((job.mcq_score, job.result['score'], job.result['percentage']), (2, 6, 60.0))
+        self.assertEqual(mcq.rescore_round(self.round.id), ([], 2))
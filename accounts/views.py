@@ -1,12 +1,22 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.http import JsonResponse
-from .models import Event, Round, Question, QuestionOption, CandidateEntry, CodingQuestion, DubbingQuestion, TestCase, DubbingTestCase
+from django.conf import settings
+from django.db import transaction
+from .models import Event, Round, Question, QuestionOption, CandidateEntry, CodingQuestion, DubbingQuestion, TestCase, DubbingTestCase, GradingJob
+from . import grading_jobs
+from .execution.calibration import CalibrationError
+from .execution.toolchains import available_languages
+from .round_bundle import failure_stats, get_bundle, is_correct, mcq_total, question_bundle
+from .mcq import pack_responses
 from datetime import timedelta
 from django.utils import timezone
 from django.db.models import Count, Prefetch
+import asyncio
 import json
 import logging
 import random
@@ -234,7 +244,7 @@ def round_details(request, event_id, round_number):
             
             if duration:
                 round_obj.duration_minutes = int(duration)
-                round_obj.save()
+                round_obj.save(update_fields=['duration_minutes'])
                 messages.success(request, 'Round settings updated successfully!')
                 return redirect('round_details', event_id=event_id, round_number=round_number)
         
@@ -354,31 +364,46 @@ def add_coding_question(request, event_id, round_number):
         try:
             event = Event.objects.get(id=event_id)
             round_obj = Round.objects.get(event=event, round_number=round_number)
+            reference = request.POST.get('reference_solution', '').strip()
+            reference_language = request.POST.get('reference_language', 'python') if reference else ''
+            sample_input = request.POST.get('sample_input', '').strip()
+            sample_output = request.POST.get('sample_output', '').strip()
+            cases = _posted_test_cases(request, bool(reference))
+            if reference:
+                sample_output, cases = _check_with_reference(
+                    reference, reference_language, sample_input, sample_output, cases
+                )
 
-            coding_q = CodingQuestion.objects.create(
-                round=round_obj,
-                title=request.POST.get('title', '').strip(),
-                problem_statement=request.POST.get('problem_statement', '').strip(),
-                input_format=request.POST.get('input_format', '').strip(),
-                output_format=request.POST.get('output_format', '').strip(),
-                constraints=request.POST.get('constraints', '').strip(),
-                sample_input=request.POST.get('sample_input', '').strip(),
-                sample_output=request.POST.get('sample_output', '').strip(),
-            )
+            with transaction.atomic():
+                coding_q = CodingQuestion.objects.create(
+                    round=round_obj,
+                    title=request.POST.get('title', '').strip(),
+                    problem_statement=request.POST.get('problem_statement', '').strip(),
+                    input_format=request.POST.get('input_format', '').strip(),
+                    output_format=request.POST.get('output_format', '').strip(),
+                    constraints=request.POST.get('constraints', '').strip(),
+                    sample_input=sample_input,
+                    sample_output=sample_output,
+                    reference_solution=reference,
+                    reference_language=reference_language,
+                )
 
-            # Save test cases (up to 10)
-            for i in range(1, 11):
-                tc_input = request.POST.get(f'tc_input_{i}', '').strip()
-                tc_output = request.POST.get(f'tc_output_{i}', '').strip()
-                if tc_output:  # Only save if expected output is provided
-                    TestCase.objects.create(
-                        coding_question=coding_q,
-                        input_data=tc_input,
-                        expected_output=tc_output,
-                        order=i
-                    )
+                # Save test cases (only those with an expected output)
+                for i, (tc_input, tc_output, is_sample) in enumerate(cases, 1):
+                    if tc_output:
+                        TestCase.objects.create(
+                            coding_question=coding_q,
+                            input_data=tc_input,
+                            expected_output=tc_output,
+                            order=i,
+                            is_sample=is_sample,
+                        )
 
             messages.success(request, 'Coding question added successfully!')
+            if reference:
+                _calibrate_new_question(request, coding_q)
+        except CalibrationError as e:
+            messages.error(request, f'Coding question not saved: {str(e)}')
         except Exception as e:
             messages.error(request, f'Error adding coding question: {str(e)}')
     return redirect('round_details', event_id=event_id, round_number=round_number)
@@ -391,34 +416,121 @@ def add_dubbing_question(request, event_id, round_number):
         try:
             event = Event.objects.get(id=event_id)
             round_obj = Round.objects.get(event=event, round_number=round_number)
+            language = request.POST.get('language', 'python')
+            # The fixed snippet; it runs in the snippet's language
+            reference = request.POST.get('reference_solution', '').strip()
+            sample_input = request.POST.get('sample_input', '').strip()
+            sample_output = request.POST.get('sample_output', '').strip()
+            cases = _posted_test_cases(request, bool(reference))
+            if reference:
+                sample_output, cases = _check_with_reference(reference, language, sample_input, sample_output, cases)
+
+            with transaction.atomic():
+                dubbing_q = DubbingQuestion.objects.create(
+                    round=round_obj,
+                    title=request.POST.get('title', '').strip(),
+                    description=request.POST.get('description', '').strip(),
+                    language=language,
+                    code_snippet=request.POST.get('code_snippet', '').strip(),
+                    sample_input=sample_input,
+                    sample_output=sample_output,
+                    reference_solution=reference,
+                )
 
-            dubbing_q = DubbingQuestion.objects.create(
-                round=round_obj,
-                title=request.POST.get('title', '').strip(),
-                description=request.POST.get('description', '').strip(),
-                language=request.POST.get('language', 'python'),
-                code_snippet=request.POST.get('code_snippet', '').strip(),
-                sample_input=request.POST.get('sample_input', '').strip(),
-                sample_output=request.POST.get('sample_output', '').strip(),
-            )
-
-            # Save test cases (up to 10)
-            for i in range(1, 11):
-                tc_input = request.POST.get(f'tc_input_{i}', '').strip()
-                tc_output = request.POST.get(f'tc_output_{i}', '').strip()
-                if tc_output:  # Only save if expected output is provided
-                    DubbingTestCase.objects.create(
-                        dubbing_question=dubbing_q,
-                        input_data=tc_input,
-                        expected_output=tc_output,
-                        order=i
-                    )
+                # Save test cases (only those with an expected output)
+                for i, (tc_input, tc_output, is_sample) in enumerate(cases, 1):
+                    if tc_output:
+                        DubbingTestCase.objects.create(
+                            dubbing_question=dubbing_q,
+                            input_data=tc_input,
+                            expected_output=tc_output,
+                            order=i,
+                            is_sample=is_sample,
+                        )
             messages.success(request, 'Dubbing question added successfully!')
+            if reference:
+                _calibrate_new_question(request, dubbing_q)
+        except CalibrationError as e:
+            messages.error(request, f'Dubbing question not saved: {str(e)}')
         except Exception as e:
             messages.error(request, f'Error adding dubbing question: {str(e)}')
     return redirect('round_details', event_id=event_id, round_number=round_number)
 
 
+MAX_UPLOADED_INPUTS = 50
+
+
+def _posted_test_cases(request, has_reference):
+    """
+    [input, expected output, is_sample] for every test case row that was
+    filled in, then one per uploaded input file (with no expected output).
+    """
+    cases = []
+    for i in range(1, 11):
+        tc_input = request.POST.get(f'tc_input_{i}', '').strip()
+        tc_output = request.POST.get(f'tc_output_{i}', '').strip()
+        if tc_input or tc_output:
+            cases.append([tc_input, tc_output, bool(request.POST.get(f'tc_sample_{i}'))])
+    uploads = request.FILES.getlist('tc_input_files')
+    if uploads and not has_reference:
+        raise CalibrationError('uploaded inputs need a reference solution to generate their expected outputs')
+    if len(uploads) > MAX_UPLOADED_INPUTS:
+        raise ValueError(f'At most {MAX_UPLOADED_INPUTS} input files can be uploaded at once')
+    for upload in sorted(uploads, key=lambda f: f.name):
+        cases.append([upload.read().decode('utf-8', errors='replace').strip(), '', False])
+    return cases
+
+
+def _check_with_reference(reference, language, sample_input, sample_output, cases):
+    """
+    Run the reference solution on the sample and every test case input.
+    Blank expected outputs are filled in with what it prints; a typed one
+    that differs raises CalibrationError, so a typo never reaches grading.
+    Returns (sample_output, cases).
+    """
+    from .execution.calibration import reference_outputs
+    from .execution.grading import normalize
+
+    has_sample = bool(sample_input or sample_output)
+    inputs = ([sample_input] if has_sample else []) + [tc_input for tc_input, _, _ in cases]
+    outputs = reference_outputs(reference, language, inputs)
+    if has_sample:
+        sample_actual, outputs = outputs[0], outputs[1:]
+        if sample_output and normalize(sample_output) != sample_actual:
+            raise CalibrationError(
+                f'the sample output does not match the reference solution, which prints:\n{sample_actual[:200]}'
+            )
+        sample_output = sample_output or sample_actual
+
+    mismatched = []
+    for n, (case, actual) in enumerate(zip(cases, outputs), 1):
+        if not case[1]:
+            case[1] = actual
+        elif normalize(case[1]) != actual:
+            mismatched.append(f'#{n} (reference prints {actual[:50]!r})')
+    if mismatched:
+        raise CalibrationError(
+            f'expected output of test case {", ".join(mismatched)} does not match the reference solution'
+        )
+    return sample_output, cases
+
+
+def _calibrate_new_question(request, question):
+    """Record the reference's timing as the question's limits (see calibration.py)"""
+    from .execution.calibration import calibrate
+
+    try:
+        calibrate(question)
+    except CalibrationError as e:
+        messages.warning(request, f'Time limits not calibrated: {str(e)}')
+    else:
+        messages.info(
+            request,
+            f'Reference solution takes {question.reference_cpu_ms:.1f} ms per case; '
+            f'time limit set to {question.time_limit_ms} ms',
+        )
+
+
 # API: Verify event password
 @csrf_exempt
 def verify_event_password(request, event_id):
@@ -546,7 +658,9 @@ def quiz_test(request, event_id, round_number):
             'dubbing_questions': dubbing_questions,
             'total_questions': questions.count() + coding_questions.count() + dubbing_questions.count(),
             'candidate_name': candidate_name,
-            'candidate_entry_id': candidate_entry_id
+            'candidate_entry_id': candidate_entry_id,
+            # Only offer languages this host can compile and run
+            'languages': available_languages(),
         }
         return render(request, 'quiz_test.html', context)
     except Exception as e:
@@ -560,24 +674,6 @@ def submit_quiz(request):
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
 
-    # Setup environment with Java path
-    import os
-    import shutil
-    env = os.environ.copy()
-    
-    # Check for local Java installation (.java in project root)
-    # Render Python Native caches the project directory, so we store java there
-    cwd = os.getcwd()
-    local_java_home = os.path.join(cwd, '.java')
-    
-    if os.path.exists(os.path.join(local_java_home, 'bin', 'javac')):
-        env['JAVA_HOME'] = local_java_home
-        env['PATH'] = os.path.join(local_java_home, 'bin') + ':' + env.get('PATH', '')
-    elif os.path.exists('/tmp/java/bin/javac'):
-        env['JAVA_HOME'] = '/tmp/java'
-        env['PATH'] = '/tmp/java/bin:' + env.get('PATH', '')
-    # If using Docker or other setup, javac might already be inPATH
-
     try:
         data = json.loads(request.body)
         event_id = data.get('event_id')
@@ -592,13 +688,16 @@ def submit_quiz(request):
         if not isinstance(answers, dict):
             return JsonResponse({'success': False, 'error': 'Invalid answers format'}, status=400)
 
-        # Get event and round
-        event = Event.objects.get(id=event_id)
-        # Optimize: prefetch questions with their options to avoid N+1 queries
-        round_obj = Round.objects.prefetch_related(
-            Prefetch('questions', Question.objects.prefetch_related('options'))
-        ).get(event=event, round_number=round_number)
-        questions = round_obj.questions.all()
+        # Get the round; its answer key comes from the cached grading bundle
+        round_row = Round.objects.filter(event_id=event_id, round_number=round_number).values_list(
+            'id', 'content_version'
+        ).first()
+        if round_row is None:
+            if not Event.objects.filter(id=event_id).exists():
+                raise Event.DoesNotExist
+            raise Round.DoesNotExist
+        round_id, content_version = round_row
+        bundle = get_bundle(round_id, content_version)
 
         # Get candidate info
         candidate_name = data.get('candidate_name', 'Anonymous')
@@ -607,11 +706,7 @@ def submit_quiz(request):
         score = 0
         answered_count = 0
         answers_dict = {}
-        # Cache questions and options in memory to avoid repeated queries
-        questions_cache = {q.id: q for q in questions}
-        options_cache = {}
-        for q in questions:
-            options_cache[q.id] = {o.id: o for o in q.options.all()}
+        responses = {}  # question id -> option id, kept on the candidate for rescoring
 
         for question_id_str, option_id_str in answers.items():
             try:
@@ -627,22 +722,17 @@ def submit_quiz(request):
                 # Convert option ID to int
                 option_id = int(option_id_str)
 
-                # Use cached data instead of querying database
-                if question_id not in questions_cache:
-                    continue
-                
-                question = questions_cache[question_id]
-                
-                if option_id not in options_cache.get(question_id, {}):
+                # Skip options that are not one of this question's
+                correct = is_correct(bundle, question_id, option_id)
+                if correct is None:
                     continue
-                
-                option = options_cache[question_id][option_id]
 
                 answers_dict[f'question_{question_id}'] = option_id
+                responses[question_id] = option_id
                 answered_count += 1
 
                 # Check if correct
-                if option.is_correct:
+                if correct:
                     score += 1
             except (ValueError, TypeError) as e:
                 logger.warning(f"Error processing answer for question {question_id_str}: {str(e)}")
@@ -651,103 +741,28 @@ def submit_quiz(request):
                 logger.warning(f"Unexpected error processing answer for question {question_id_str}: {str(e)}")
                 continue
 
-        total_questions = questions.count()
+        total_questions = mcq_total(bundle)
         percentage = (score / total_questions * 100) if total_questions > 0 else 0
 
-        # Initialize scoring breakdown variables
-        total_testcase_score = 0
-        total_output_score = 0
-        total_efficiency_score = 0
-        total_test_cases_passed = 0
-        total_test_cases = 0
-        total_max_possible_score = total_questions  # Start with MCQ max score
+        # Code answers are graded by the grade_worker; the response carries the MCQ result
+        # and the quiz page polls grading_status for the final breakdown
+        job = None
+        coding_subs = {}
+        dubbing_subs = {}
 
         # Mark candidate as submitted with score and time
         # Find the specific candidate entry that submitted (by name and round)
         try:
-            from .models import CandidateEntry, CodeSubmission, CodingQuestion, DubbingQuestion
-            import subprocess, tempfile, os, shutil, re, time
-            
             # Use more specific criteria to avoid updating wrong candidates
             candidate_entry = CandidateEntry.objects.filter(
-                round=round_obj,
+                round_id=round_id,
                 candidate_name=candidate_name,
                 is_waiting=False,  # Should have started the quiz
                 is_submitted=False  # Not already submitted
             ).first()
             
             if candidate_entry:
-                # === GRADE CODE SUBMISSIONS ===
-                def run_eval(code, language, test_cases, tmp_dir):
-                    if not code: return 0, 0, False, 0.0, False
-                    
-                    # prepare
-                    timeout = 5
-                    runner = None
-                    cmd_args = []
-                    compile_err = None
-                    if language == 'python':
-                        src = os.path.join(tmp_dir, 'solution.py')
-                        with open(src, 'w', encoding='utf-8') as f: f.write(code)
-                        runner, cmd_args = 'python', [src]
-                    elif language == 'c':
-                        src = os.path.join(tmp_dir, 'solution.c')
-                        exe = os.path.join(tmp_dir, 'solution.exe')
-                        with open(src, 'w', encoding='utf-8') as f: f.write(code)
-                        try:
-                            comp = subprocess.run(['gcc', src, '-o', exe, '-lm'], capture_output=True, text=True, timeout=15, cwd=tmp_dir)
-                            if comp.returncode != 0: compile_err = comp.stderr
-                        except FileNotFoundError:
-                            compile_err = "C compiler (gcc) not found. System configuration error."
-                        runner, cmd_args = 'exe', [exe]
-                    elif language == 'java':
-                        m = re.search(r'public\s+class\s+(\w+)', code)
-                        class_name = m.group(1) if m else 'Solution'
-                        src = os.path.join(tmp_dir, f'{class_name}.java')
-                        with open(src, 'w', encoding='utf-8') as f: f.write(code)
-                        try:
-                            comp = subprocess.run(['javac', src], capture_output=True, text=True, timeout=15, cwd=tmp_dir, env=env)
-                            if comp.returncode != 0: compile_err = comp.stderr
-                        except FileNotFoundError:
-                            compile_err = "Java compiler (javac) not found. System configuration error."
-                        runner, cmd_args = 'java', ['-cp', tmp_dir, class_name]
-                    
-                    if compile_err or not runner:
-                        return 0, len(test_cases), False, 0.0, False
-                        
-                    passed = 0
-                    total_time = 0.0
-                    output_success = False
-                    
-                    for tc in test_cases:
-                        clean_input = tc.input_data.replace('\r\n', '\n').replace('\r', '\n')
-                        if runner == 'python': cmd = ['python'] + cmd_args
-                        elif runner == 'exe': cmd = cmd_args
-                        elif runner == 'java': cmd = ['java'] + cmd_args
-                        
-                        start_t = time.time()
-                        try:
-                            res = subprocess.run(cmd, input=clean_input, capture_output=True, text=True, timeout=timeout, cwd=tmp_dir, env=env)
-                            elapsed = time.time() - start_t
-                            total_time += elapsed
-                            if res.returncode == 0:
-                                output_success = True
-                            actual = res.stdout.strip().replace('\r\n', '\n').replace('\r', '\n')
-                            expected = tc.expected_output.strip().replace('\r\n', '\n').replace('\r', '\n')
-                            if actual == expected and res.returncode == 0:
-                                passed += 1
-                        except subprocess.TimeoutExpired:
-                            total_time += timeout
-                    
-                    avg_time_ms = (total_time / len(test_cases) * 1000) if test_cases else 0.0
-                    time_met = avg_time_ms < 1000.0 if test_cases else False
-                    if not test_cases and runner: # if no testcases but compiles visually run once if we want to check output success
-                        pass
-                    return passed, len(test_cases), output_success, avg_time_ms, time_met
-
                 # Group coding answers by question_id
-                coding_subs = {}
-                dubbing_subs = {}
                 for k, v in answers.items():
                     if k.startswith('coding_code_'):
                         qid = int(k.split('_')[2])
@@ -766,99 +781,52 @@ def submit_quiz(request):
                         if qid not in dubbing_subs: dubbing_subs[qid] = {'lang': v, 'code': ''}
                         else: dubbing_subs[qid]['lang'] = v
 
-                tmp_dir = tempfile.mkdtemp(prefix='quiz_submit_')
-                
-                try:
-                    def evaluate_and_save(q_dict, q_type, model_cls):
-                        nonlocal score, total_testcase_score, total_output_score, total_efficiency_score
-                        nonlocal total_test_cases_passed, total_test_cases, total_max_possible_score
-                        for qid, payload in q_dict.items():
-                            try:
-                                q_obj = model_cls.objects.get(id=qid)
-                                tcs = list(q_obj.test_cases.all())
-                                passed, total, out_ok, exec_ms, time_met = run_eval(payload['code'], payload['lang'], tcs, tmp_dir)
-                                
-                                # Scoring Logic
-                                # Test Cases: 2 marks per passing test case
-                                tc_marks = passed * 2
-                                
-                                # Output Success: 2 marks if output is correct
-                                out_marks = 2 if out_ok else 0
-                                
-                                # Efficiency: 2 marks if time limit met
-                                eff_marks = 2 if (time_met and passed > 0) else 0
-                                
-                                # Total: sum of all marks
-                                q_score = tc_marks + out_marks + eff_marks
-                                score += q_score
-                                
-                                # Max possible score for this question
-                                # = (test_cases * 2) + 2 (output) + 2 (efficiency)
-                                q_max_score = (total * 2) + 2 + 2
-                                total_max_possible_score += q_max_score
-                                
-                                # Accumulate breakdown scores
-                                total_testcase_score += tc_marks
-                                total_output_score += out_marks
-                                total_efficiency_score += eff_marks
-                                total_test_cases_passed += passed
-                                total_test_cases += total
-                                
-                                CodeSubmission.objects.create(
-                                    candidate=candidate_entry,
-                                    question_type=q_type,
-                                    question_id=qid,
-                                    question_title=q_obj.title,
-                                    code=payload['code'],
-                                    language=payload['lang'],
-                                    passed_test_cases=passed,
-                                    total_test_cases=total,
-                                    output_success=out_ok,
-                                    execution_time_ms=exec_ms,
-                                    time_limit_met=time_met,
-                                    testcase_score=tc_marks,
-                                    output_score=out_marks,
-                                    efficiency_score=eff_marks,
-                                    total_score=q_score
-                                )
-                            except model_cls.DoesNotExist:
-                                logger.warning(f"{q_type.capitalize()} question {qid} not found")
-                            except Exception as e:
-                                logger.error(f"Error evaluating {q_type} question {qid}: {str(e)}")
-
-                    evaluate_and_save(coding_subs, 'coding', CodingQuestion)
-                    evaluate_and_save(dubbing_subs, 'dubbing', DubbingQuestion)
-                finally:
-                    shutil.rmtree(tmp_dir, ignore_errors=True)
-
-                # Calculate percentage based on actual max possible score BEFORE saving
-                actual_percentage = (score / total_max_possible_score * 100) if total_max_possible_score > 0 else 0
-
-                candidate_entry.is_submitted = True
-                candidate_entry.score = score
-                candidate_entry.percentage = actual_percentage  # Save percentage
-                candidate_entry.total_questions = total_max_possible_score  # Store max possible score for display
-                candidate_entry.time_taken_seconds = time_taken_seconds
-                candidate_entry.save(update_fields=['is_submitted', 'score', 'percentage', 'total_questions', 'time_taken_seconds'])
+                job = grading_jobs.enqueue(
+                    candidate_entry, coding_subs, dubbing_subs,
+                    mcq_score=score, mcq_total=total_questions,
+                    attended=answered_count + len(coding_subs) + len(dubbing_subs),
+                    time_taken_seconds=time_taken_seconds,
+                    mcq_responses=pack_responses(responses),
+                )
+
+                # Nothing to execute, or no background worker configured: grade right here
+                queue_enabled = getattr(settings, 'GRADING_QUEUE_ENABLED', True)
+                if not (coding_subs or dubbing_subs) or not queue_enabled:
+                    worker_id = f'inline:{request.META.get("REMOTE_ADDR", "")}:{job.id}'
+                    if grading_jobs.claim(job.id, worker_id):
+                        job.refresh_from_db()
+                        # Without a worker a job left pending would never finish
+                        grading_jobs.process(job, worker_id, retry=queue_enabled)
+                    job.refresh_from_db()
         except Exception as e:
             logger.error(f"Error updating candidate submission: {str(e)}")
 
-        # Get counts for attended questions
-        num_coding = len(coding_subs) if 'coding_subs' in locals() else 0
-        num_dubbing = len(dubbing_subs) if 'dubbing_subs' in locals() else 0
+        if job is not None:
+            data = grading_jobs.status_payload(job)
+            if job.status != GradingJob.STATUS_DONE:
+                data['status_url'] = reverse('grading_status', args=[job.candidate_id])
+                data.update({
+                    'score': score,
+                    'total_questions': total_questions,
+                    'attended': job.attended,
+                    'percentage': percentage,
+                    'max_score': total_questions,
+                })
+            return JsonResponse(data)
 
         return JsonResponse({
             'success': True,
+            'status': GradingJob.STATUS_DONE,
             'score': score,
             'total_questions': total_questions,
-            'attended': answered_count + num_coding + num_dubbing if 'num_coding' in locals() else answered_count,
-            'percentage': actual_percentage,
-            'testcase_score': total_testcase_score,
-            'output_score': total_output_score,
-            'efficiency_score': total_efficiency_score,
-            'test_cases_passed': total_test_cases_passed,
-            'test_cases_total': total_test_cases,
-            'max_score': total_max_possible_score
+            'attended': answered_count,
+            'percentage': percentage,
+            'testcase_score': 0,
+            'output_score': 0,
+            'efficiency_score': 0,
+            'test_cases_passed': 0,
+            'test_cases_total': 0,
+            'max_score': total_questions
         })
 
     except Event.DoesNotExist:
@@ -872,6 +840,19 @@ def submit_quiz(request):
         return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
 
 
+@csrf_exempt
+def grading_status(request, candidate_entry_id):
+    """API endpoint polled by the quiz page until the candidate's code answers are graded"""
+    # Only the candidate who submitted may see their score (entry ids are sequential)
+    if _candidate_key(request) != candidate_entry_id:
+        return JsonResponse({'success': False, 'error': 'Not your submission'}, status=403)
+    try:
+        job = GradingJob.objects.get(candidate_id=candidate_entry_id)
+        return JsonResponse(grading_jobs.status_payload(job))
+    except GradingJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'No submission found'}, status=404)
+
+
 @csrf_exempt
 def check_round_started(request, event_id, round_number):
     """API endpoint to check if admin has started the round"""
@@ -994,29 +975,182 @@ def check_connectivity(request):
 
 
 @csrf_exempt
-def run_code(request):
+async def run_code(request):
     """
-    Execute candidate code locally using subprocess.
+    Execute candidate code with the configured executor (see accounts/execution/executor.py).
     If question_id is provided for a coding question, run against all stored test cases.
+
+    The work happens in a thread.  A newer Run of the same question supersedes
+    this one, and under ASGI a client disconnect cancels it; either way its
+    programs are killed (see accounts/execution/cancellation.py).
+    """
+    from .execution.cancellation import CancelToken
+    cancel = CancelToken()
+    try:
+        return await sync_to_async(_run_code)(request, cancel)
+    except asyncio.CancelledError:
+        cancel.cancel()
+        raise
+
+
+def _run_code(request, cancel):
+    for event in _run_code_events(request, cancel):
+        pass
+    return _result_response(event)
+
+
+def _result_response(event):
+    """The JsonResponse for a 'result' event of _run_code_events"""
+    response = JsonResponse(event['response'], status=event['status'])
+    if 'retry_after' in event:
+        response['Retry-After'] = str(event['retry_after'])
+    return response
+
+
+def _candidate_key(request):
     """
+    The candidate a Run belongs to, from their session, or None.  Not the
+    client address: candidates behind one proxy or lab NAT share it, and
+    would supersede or stop each other's runs.
+    """
+    return request.session.get('candidate_entry_id')
+
+
+def _run_key(candidate_key, question_type, question_id):
+    """Runs with the same key supersede each other (see accounts/execution/cancellation.py)"""
+    return f'{candidate_key}:{question_type}:{question_id or ""}'
+
+
+@csrf_exempt
+def stop_run(request):
+    """Stop the candidate's in-flight Run of a question, e.g. once they have seen a failing case"""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+    from .execution.cancellation import cancel_key
+    candidate_key = _candidate_key(request)
+    if candidate_key is None:
+        return JsonResponse({'success': False, 'error': 'Not in a quiz session'}, status=403)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid request data'}, status=400)
+    cancel_key(_run_key(candidate_key, data.get('question_type', 'coding'), data.get('question_id')))
+    return JsonResponse({'success': True})
 
-    import subprocess, tempfile, os, shutil, re
 
-    # Setup environment with Java path
-    env = os.environ.copy()
-    
-    # Check for local Java installation (.java in project root)
-    cwd = os.getcwd()
-    local_java_home = os.path.join(cwd, '.java')
-    
-    if os.path.exists(os.path.join(local_java_home, 'bin', 'javac')):
-        env['JAVA_HOME'] = local_java_home
-        env['PATH'] = os.path.join(local_java_home, 'bin') + ':' + env.get('PATH', '')
-    elif os.path.exists('/tmp/java/bin/javac'):
-        env['JAVA_HOME'] = '/tmp/java'
-        env['PATH'] = '/tmp/java/bin:' + env.get('PATH', '')
+@csrf_exempt
+def run_code_stream(request):
+    """
+    Same as run_code, but streams its progress as JSON lines
+    (application/x-ndjson): the compile result, then each test case's verdict
+    as soon as it is known, then run_code's response as the last line.
+    Closing the connection cancels the run.
+
+    Nothing is sent until the Run holds a preview slot: a Run that is
+    rejected (e.g. 429 with Retry-After on a busy host) or needs no slot,
+    because every result was cached, gets run_code's plain JSON response.
+    """
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import StreamingHttpResponse
+    from .execution.cancellation import CancelToken
+
+    cancel = CancelToken()
+    events = _run_code_events(request, cancel)
+    head = []
+    for event in events:
+        if event['event'] == 'result':
+            return _result_response(event)
+        head.append(event)
+        if event['event'] == 'running':
+            break
+    events = _resume(head, events)
+    if isinstance(request, ASGIRequest):
+        # ASGI would read a plain generator to the end before sending anything
+        lines = _lines_from_thread(events, cancel)
+    else:
+        lines = (json.dumps(event) + '\n' for event in events)
+    response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'   # don't let a proxy hold the lines back
+    return response
+
+
+def _resume(head, events):
+    """The events already read, then the rest; closing it closes `events`"""
+    yield from head
+    yield from events
+
+
+async def _lines_from_thread(events, cancel):
+    """Drive the blocking event generator from a thread, cancelling the run if the client goes away"""
+    try:
+        while True:
+            event = await sync_to_async(next)(events, None)
+            if event is None:
+                break
+            yield json.dumps(event) + '\n'
+    except asyncio.CancelledError:
+        cancel.cancel()
+        raise
+    finally:
+        await sync_to_async(events.close)()
+
+
+def _run_code_events(request, cancel):
+    """
+    The work behind run_code and run_code_stream, as a sequence of events:
+
+      {'event': 'start', 'total': n, 'cases': [...]}   test cases, in the order they run
+      {'event': 'running'}                               a preview slot was granted (not sent if nothing had to run)
+      {'event': 'compiled'}                              the code built (not sent if nothing had to run)
+      {'event': 'case', **row}                           one test case's verdict, as soon as it is known
+      {'event': 'result', 'status': ..., 'response': {...}}   always last; run_code's JSON response
+    """
+    def result(response, status=200, **extra):
+        return dict(extra, event='result', status=status, response=response)
+
+    if request.method != 'POST':
+        yield result({'success': False, 'error': 'Method not allowed'}, 405)
+        return
+
+    import subprocess
+    from .execution.cancellation import Cancelled
+    from .execution.compile_cache import PREVIEW
+    from .execution.executor import get_executor
+    from .execution.process import OUTPUT_LIMIT_EXCEEDED
+    from .execution.scheduler import preview_slot, Saturated
+    from .execution.workspaces import workspace
+    from .execution.calibration import question_limits
+    from .execution.grading import case_record, order_by_failure_rate, run_case
+    from .execution.result_cache import get_results, store_results
+    executor = get_executor()
+    env = executor.env
+
+    def case_row(tc, record):
+        row = {
+            'event':    'case',
+            'order':    tc.order,
+            'input':    tc.input_data[:200],
+            'expected': tc.expected_output[:200],
+        }
+        if record is None:
+            # not run: an earlier case failed in fail-fast mode
+            return dict(row, passed=False, skipped=True, actual='Not run (stopped at the first failure)')
+        if record['returncode'] is None:
+            shown = 'Time Limit Exceeded'
+        elif record['aborted'] == OUTPUT_LIMIT_EXCEEDED:
+            shown = 'Output Limit Exceeded'
+        elif record['aborted'] or record['returncode'] == 0:
+            shown = record['stdout']  # a wrong answer is shown up to where it went wrong
+        else:
+            shown = record['stderr']
+        return dict(row, passed=record['passed'], actual=shown)
+
+    # Runs are keyed by candidate (preview slot, superseding, Stop)
+    candidate_key = _candidate_key(request)
+    if candidate_key is None:
+        yield result({'success': False, 'error': 'Not in a quiz session'}, 403)
+        return
 
     try:
         data = json.loads(request.body)
@@ -1027,166 +1161,208 @@ def run_code(request):
         question_type = data.get('question_type', 'coding')
 
         if not code:
-            return JsonResponse({'success': False, 'error': 'No code provided'}, status=400)
-
-        TIMEOUT = 10
-
-        # ── Helper: compile code once, return (exe_path, tmp_dir, error) ──
-        def prepare_code(code, language, tmp_dir):
-            if language == 'python':
-                src = os.path.join(tmp_dir, 'solution.py')
-                with open(src, 'w', encoding='utf-8') as f:
-                    f.write(code)
-                return ('python', [src], None)
-
-            elif language == 'c':
-                src = os.path.join(tmp_dir, 'solution.c')
-                exe = os.path.join(tmp_dir, 'solution.exe')
-                with open(src, 'w', encoding='utf-8') as f:
-                    f.write(code)
-                try:
-                    comp = subprocess.run(
-                        ['gcc', src, '-o', exe, '-lm'],
-                        capture_output=True, text=True, timeout=30, cwd=tmp_dir
-                    )
-                    if comp.returncode != 0:
-                        return (None, None, comp.stderr)
-                except FileNotFoundError:
-                    return (None, None, "C compiler (gcc) not found. System configuration error.")
-                return ('exe', [exe], None)
-
-            elif language == 'java':
-                m = re.search(r'public\s+class\s+(\w+)', code)
-                class_name = m.group(1) if m else 'Solution'
-                src = os.path.join(tmp_dir, f'{class_name}.java')
-                with open(src, 'w', encoding='utf-8') as f:
-                    f.write(code)
-                try:
-                    comp = subprocess.run(
-                        ['javac', src],
-                        capture_output=True, text=True, timeout=30, cwd=tmp_dir, env=env
-                    )
-                    if comp.returncode != 0:
-                        return (None, None, comp.stderr)
-                except FileNotFoundError:
-                    return (None, None, "Java compiler (javac) not found. System configuration error.")
-                return ('java', ['-cp', tmp_dir, class_name], None)
-
-            return (None, None, f'Unsupported language: {language}')
-
-        # ── Helper: run compiled code with given stdin ──
-        def execute(runner, cmd_args, stdin_data, tmp_dir):
-            if runner == 'python':
-                cmd = ['python'] + cmd_args
-            elif runner == 'exe':
-                cmd = cmd_args
-            elif runner == 'java':
-                cmd = ['java'] + cmd_args
-            else:
-                return '', 'Unknown runner', 1
-
-            result = subprocess.run(
-                cmd, input=stdin_data, capture_output=True, text=True,
-                timeout=TIMEOUT, cwd=tmp_dir, env=env
-            )
-            return result.stdout, result.stderr, result.returncode
+            yield result({'success': False, 'error': 'No code provided'}, 400)
+            return
 
-        # ── Fetch test cases if question_id is provided ──
+        # ── Fetch the sample test cases if question_id is provided ──
+        # Run only checks the visible cases (and the statement's example); hidden ones run when the answer is
+        # submitted.  They come from the round's cached grading bundle, already normalised.
         test_cases = []
-        if question_id:
-            if question_type == 'coding':
-                try:
-                    coding_q = CodingQuestion.objects.get(id=question_id)
-                    test_cases = list(coding_q.test_cases.all())
-                except CodingQuestion.DoesNotExist:
-                    pass
-            elif question_type == 'dubbing':
-                try:
-                    dubbing_q = DubbingQuestion.objects.get(id=question_id)
-                    test_cases = list(dubbing_q.test_cases.all())
-                except DubbingQuestion.DoesNotExist:
-                    pass
-
-        tmp_dir = tempfile.mkdtemp(prefix='quiz_run_')
-        try:
-            runner, cmd_args, compile_err = prepare_code(code, language, tmp_dir)
-            if compile_err:
-                return JsonResponse({
-                    'success': False,
-                    'output': compile_err,
-                    'error_type': 'compile_error'
-                })
+        question = None
+        stats = {}
+        if question_id and question_type in ('coding', 'dubbing'):
+            bundled = question_bundle(question_type, question_id)
+            if bundled is not None:
+                question = bundled.question
+                test_cases = list(bundled.samples)
+                stats = failure_stats(bundled)
+
+        # Same limits as final grading (the question's calibrated ones, if any), so what passes here passes on submit
+        limits = question_limits(question, language)
+        TIMEOUT = limits.timeout
+
+        # A newer Run of the same question, in any worker, stops this one
+        cancel.claim(_run_key(candidate_key, question_type, question_id))
+
+        # Normalize manual stdin if provided
+        if stdin:
+            stdin = stdin.replace('\r\n', '\n').replace('\r', '\n')
+
+        # Likely failures first; with fail-fast the Run stops at the first failing case
+        test_cases = order_by_failure_rate(test_cases, stats)
+        fail_fast = bool(data.get('fail_fast', getattr(settings, 'EXECUTION_PREVIEW_FAIL_FAST', True)))
+        if test_cases and not stdin:
+            yield {'event': 'start', 'total': len(test_cases), 'cases': [tc.order for tc in test_cases]}
+
+        # Same code against the same test cases as an earlier Run: reuse its results
+        records = [None] * len(test_cases)
+        if test_cases and not stdin:
+            records = get_results(code, language, test_cases, TIMEOUT, env, profile=PREVIEW, limits=limits) or records
+        to_run = []
+        for tc, record in zip(test_cases, records):
+            if record is None:
+                to_run.append(tc)
+                continue
+            yield case_row(tc, record)
+            if fail_fast and not record['passed']:
+                break   # nothing after a case already known to fail needs to run
 
-            # Normalize manual stdin if provided
-            if stdin:
-                stdin = stdin.replace('\r\n', '\n').replace('\r', '\n')
-
-            # ── Run against test cases ──
-            if test_cases and not stdin:
-                results = []
-                passed = 0
-                for tc in test_cases:
-                    # Normalize test case input
-                    clean_input = tc.input_data.replace('\r\n', '\n').replace('\r', '\n')
-                    try:
-                        stdout, stderr, rc = execute(runner, cmd_args, clean_input, tmp_dir)
-                        actual = stdout.strip().replace('\r\n', '\n').replace('\r', '\n')
-                        expected = tc.expected_output.strip().replace('\r\n', '\n').replace('\r', '\n')
-                        
-                        is_pass = (actual == expected and rc == 0)
-                        if is_pass:
-                            passed += 1
-                        
-                        results.append({
-                            'order':    tc.order,
-                            'passed':   is_pass,
-                            'input':    tc.input_data[:200],
-                            'expected': expected[:200],
-                            'actual':   actual[:200] if rc == 0 else stderr[:200],
-                        })
-                    except subprocess.TimeoutExpired:
-                        results.append({
-                            'order':  tc.order,
-                            'passed': False,
-                            'input':  tc.input_data[:200],
-                            'expected': tc.expected_output.strip()[:200],
-                            'actual': 'Time Limit Exceeded',
-                        })
-
-                return JsonResponse({
-                    'success': passed == len(test_cases),
-                    'mode': 'test_cases',
-                    'passed': passed,
-                    'total': len(test_cases),
-                    'results': results,
-                })
+        if to_run or not test_cases or stdin:
+            # One in-flight run per candidate, and only while the host has spare execution capacity
+            try:
+                with preview_slot(candidate_key, cancel):
+                    yield {'event': 'running'}
+                    with workspace() as tmp_dir:
+                        # Quick unoptimised build; final grading compiles with the fixed optimised profile
+                        prepared, compile_err = executor.prepare(code, language, tmp_dir, profile=PREVIEW)
+                        cancel.check()
+                        if prepared is not None and limits.memory_mb:
+                            prepared = prepared._replace(memory_mb=limits.memory_mb)
+                        if compile_err:
+                            yield result({
+                                'success': False,
+                                'output': compile_err,
+                                'error_type': 'compile_error'
+                            })
+                            return
+                        yield {'event': 'compiled'}
+
+                        # ── Simple run (no test cases or dubbing) ──
+                        if not test_cases or stdin:
+                            try:
+                                res = executor.run(prepared, stdin, TIMEOUT, cancel=cancel)
+                            except subprocess.TimeoutExpired:
+                                yield result({
+                                    'success': False,
+                                    'output': f'⏱ Time Limit Exceeded ({TIMEOUT}s)',
+                                    'error_type': 'tle'
+                                })
+                                return
+
+                            if res.aborted == OUTPUT_LIMIT_EXCEEDED:
+                                yield result({
+                                    'success': False,
+                                    'output': (res.stdout or res.stderr)[:10000] + '\n⚠ Output Limit Exceeded',
+                                    'error_type': 'output_limit'
+                                })
+                                return
+
+                            response = {
+                                'success': res.returncode == 0,
+                                'mode': 'simple',
+                                'output': res.stdout if res.stdout else res.stderr,
+                                'exit_code': res.returncode,
+                            }
+                            if question is not None and not stdin:
+                                response['note'] = (
+                                    'This question has no sample test cases, so your program ran once with no input. '
+                                    'Its test cases run when you submit.'
+                                )
+                            yield result(response)
+                            return
+
+                        # ── Run against test cases ──
+                        # Each run stops as soon as its output goes wrong
+                        inputs = [tc.input_data for tc in to_run]
+                        expected = [tc.expected_output for tc in to_run]
+                        fresh = [None] * len(to_run)
+                        batched = executor.batches(prepared)
+                        if batched:
+                            # e.g. Java: every case inside one JVM instead of one JVM per case
+                            # (they share one start-up, so fail-fast does not stop them)
+                            runs = _batch_runs(executor, prepared, inputs, TIMEOUT, expected, cancel, limits.cpu_limit)
+                        else:
+                            runs = (
+                                (i, run_case(
+                                    executor, prepared, clean_input, TIMEOUT, tc.expected_output, cancel,
+                                    limits.cpu_limit,
+                                ))
+                                for i, (clean_input, tc) in enumerate(zip(inputs, to_run))
+                            )
+                        for i, run in runs:
+                            fresh[i] = case_record(run, to_run[i])
+                            yield case_row(to_run[i], fresh[i])
+                            if fail_fast and not fresh[i]['passed'] and not batched:
+                                break
+                        done = [i for i, record in enumerate(fresh) if record is not None]
+                        store_results(
+                            code, language, [to_run[i] for i in done], TIMEOUT, [fresh[i] for i in done], env,
+                            profile=PREVIEW, limits=limits,
+                        )
+                        by_case = {id(tc): record for tc, record in zip(to_run, fresh)}
+                        records = [
+                            record if record is not None else by_case.get(id(tc))
+                            for tc, record in zip(test_cases, records)
+                        ]
+            except Saturated as e:
+                yield result({'success': False, 'error': str(e), 'error_type': 'busy'}, 429, retry_after=e.retry_after)
+                return
+
+        results = []
+        for tc, record in zip(test_cases, records):
+            row = case_row(tc, record)
+            del row['event']
+            results.append(row)
+        results.sort(key=lambda r: r['order'])
+        passed = sum(1 for r in results if r['passed'])
+
+        yield result({
+            'success': passed == len(test_cases),
+            'mode': 'test_cases',
+            'passed': passed,
+            'total': len(test_cases),
+            'stopped_early': any(r.get('skipped') for r in results),
+            'results': results,
+        })
 
-            # ── Simple run (no test cases or dubbing) ──
-            else:
-                try:
-                    stdout, stderr, rc = execute(runner, cmd_args, stdin, tmp_dir)
-                except subprocess.TimeoutExpired:
-                    return JsonResponse({
-                        'success': False,
-                        'output': f'⏱ Time Limit Exceeded ({TIMEOUT}s)',
-                        'error_type': 'tle'
-                    })
+    except Cancelled:
+        yield result({'success': False, 'error': 'Run cancelled by a newer run', 'error_type': 'cancelled'})
+    except json.JSONDecodeError:
+        yield result({'success': False, 'error': 'Invalid request data'}, 400)
+    except Exception as e:
+        logger.error(f'run_code error: {e}')
+        yield result({'success': False, 'error': str(e)}, 500)
+    finally:
+        cancel.release()
 
-                return JsonResponse({
-                    'success': rc == 0,
-                    'mode': 'simple',
-                    'output': stdout if stdout else stderr,
-                    'exit_code': rc,
-                })
 
+def _batch_runs(executor, prepared, inputs, timeout, expected, cancel, cpu_limit=None):
+    """
+    Run a batch (see grading.run_batch) in a thread and yield (index, CaseRun)
+    as each case finishes.  Closing the generator early cancels the batch.
+    """
+    import queue
+    import threading
+    from .execution.grading import run_batch
+
+    finished = queue.Queue()
+    failure = []
+
+    def work():
+        try:
+            run_batch(
+                executor, prepared, inputs, timeout, expected, cancel,
+                on_run=lambda i, run: finished.put((i, run)), cpu_limit=cpu_limit,
+            )
+        except BaseException as e:
+            failure.append(e)
         finally:
-            shutil.rmtree(tmp_dir, ignore_errors=True)
+            finished.put(None)
 
-    except json.JSONDecodeError:
-        return JsonResponse({'success': False, 'error': 'Invalid request data'}, status=400)
-    except Exception as e:
-        logger.error(f'run_code error: {e}')
-        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    thread = threading.Thread(target=work, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = finished.get()
+            if item is None:
+                break
+            yield item
+        if failure:
+            raise failure[0]
+    finally:
+        if thread.is_alive():
+            cancel.cancel()
+            thread.join()
 
 
 
@@ -1358,7 +1534,7 @@ def api_start_hosting(request, event_id, round_number):
         round_obj.access_code = generate_access_code()
         round_obj.is_hosting = True
         round_obj.is_started = False
-        round_obj.save()
+        round_obj.save(update_fields=['access_code', 'is_hosting', 'is_started'])
         
         return JsonResponse({
             'success': True,
@@ -1383,7 +1559,7 @@ def api_end_hosting(request, event_id, round_number):
         round_obj.is_hosting = False
         round_obj.is_started = False
         round_obj.access_code = None  # Clear the access code
-        round_obj.save()
+        round_obj.save(update_fields=['is_hosting', 'is_started', 'access_code'])
         
         return JsonResponse({
             'success': True,
@@ -1405,7 +1581,7 @@ def api_start_test(request, event_id, round_number):
     try:
         round_obj = Round.objects.select_related('event').get(event_id=event_id, round_number=round_number)
         round_obj.is_started = True
-        round_obj.save()
+        round_obj.save(update_fields=['is_started'])
         
         return JsonResponse({
             'success': True,
@@ -1500,7 +1676,9 @@ def api_get_candidates(request, event_id, round_number):
                         'out_score': cs.output_score,
                         'eff_score': cs.efficiency_score,
                         'total_score': cs.total_score,
-                        'time_ms': round(cs.execution_time_ms, 2)
+                        'time_ms': round(cs.execution_time_ms, 2),
+                        'cpu_ms': round(cs.cpu_time_ms, 2),
+                        'memory_kb': cs.peak_memory_kb,
                     })
 
                 candidates_data.append({
@@ -1587,7 +1765,7 @@ def end_round(request, event_id, round_number):
         
         if request.method == 'POST':
             round_obj.is_started = False
-            round_obj.save()
+            round_obj.save(update_fields=['is_started'])
             messages.success(request, 'Round has been ended successfully!')
             return redirect('round_details', event_id=event_id, round_number=round_number)
         else:
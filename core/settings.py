@@ -140,6 +140,15 @@ CACHES = {
         'OPTIONS': {
             'MAX_ENTRIES': 5000,
         }
+    },
+    # Code execution results, shared by all web workers and grade workers on the host
+    'execution': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('EXECUTION_RESULT_CACHE_DIR', '/tmp/quiz_result_cache'),
+        'TIMEOUT': 6 * 60 * 60,  # a round's worth
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        }
     }
 }
 
@@ -236,3 +245,85 @@ if DEBUG:
     SECURE_HSTS_PRELOAD = False
     # Allow browsers to cache static files
     STATIC_DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# ============================================
+# CODE EXECUTION
+# ============================================
+
+# Run Python submissions through a warm, pre-imported fork-server instead of
+# starting a new interpreter per test case (falls back to subprocess if unavailable)
+PYTHON_FORKSERVER_ENABLED = os.environ.get('PYTHON_FORKSERVER_ENABLED', 'true').lower() == 'true'
+
+# Compiled C/Java artifacts are cached on disk by hash(language, toolchain version, source)
+# and shared by all workers; least recently used entries are evicted past the size budget
+COMPILE_CACHE_DIR = os.environ.get('COMPILE_CACHE_DIR', '/tmp/quiz_compile_cache')
+COMPILE_CACHE_MAX_BYTES = int(os.environ.get('COMPILE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Run all test cases of a Java submission inside one JVM (fresh class loader per case)
+JAVA_HARNESS_ENABLED = os.environ.get('JAVA_HARNESS_ENABLED', 'true').lower() == 'true'
+
+# Worker threads used to compile and run test cases in parallel during grading
+# (defaults to the number of CPU cores)
+GRADING_POOL_SIZE = int(os.environ.get('GRADING_POOL_SIZE', 0)) or None
+
+# Code answers are graded by `manage.py grade_worker` from a DB-backed queue.
+# Set to false to grade inside the submit request instead (no worker needed).
+GRADING_QUEUE_ENABLED = os.environ.get('GRADING_QUEUE_ENABLED', 'true').lower() == 'true'
+# A worker's claim on a job expires this long after it was last renewed (workers renew it
+# while grading), so jobs survive worker crashes
+GRADING_JOB_LEASE_SECONDS = int(os.environ.get('GRADING_JOB_LEASE_SECONDS', 600))
+
+# Host-wide cap on concurrently running compiles/programs, shared by all workers
+# (defaults to the number of CPU cores). Some slots are kept for final grading;
+# Run previews that cannot get a slot quickly get HTTP 429 with Retry-After.
+EXECUTION_MAX_CONCURRENCY = int(os.environ.get('EXECUTION_MAX_CONCURRENCY', 0)) or None
+EXECUTION_GRADING_RESERVED_SLOTS = None  # default: a quarter of the slots, at least one
+EXECUTION_PREVIEW_WAIT_SECONDS = 2.0
+EXECUTION_LOCK_DIR = os.environ.get('EXECUTION_LOCK_DIR', '/tmp/quiz_scheduler')
+
+# Address-space limit (MB) for each candidate program; Java gets it as its max heap
+# instead. Programs also get a CPU-time limit matching their run timeout. 0 disables.
+EXECUTION_MEMORY_LIMIT_MB = int(os.environ.get('EXECUTION_MEMORY_LIMIT_MB', 256))
+
+# Most bytes of stdout/stderr captured per run; a program that prints more is stopped
+# ("Output Limit Exceeded"). Raised automatically for test cases with longer expected output.
+EXECUTION_OUTPUT_LIMIT_BYTES = int(os.environ.get('EXECUTION_OUTPUT_LIMIT_BYTES', 1024 * 1024))
+
+# Submissions compile and run in a fixed pool of recycled workspaces, claimed with file
+# locks and emptied after each use. Defaults to /dev/shm/quiz_runs (RAM-backed) when
+# /dev/shm is large enough, else /tmp/quiz_runs; pool size defaults to 2x the concurrency cap.
+EXECUTION_WORKSPACE_DIR = os.environ.get('EXECUTION_WORKSPACE_DIR', '')
+EXECUTION_WORKSPACE_POOL_SIZE = int(os.environ.get('EXECUTION_WORKSPACE_POOL_SIZE', 0)) or None
+
+# Per-test-case results are cached by hash(code, language, test cases) in the
+# 'execution' cache, so a submission that was just Run is not executed again
+EXECUTION_RESULT_CACHE_ENABLED = os.environ.get('EXECUTION_RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+
+# How submissions are compiled and run, for both Run and grading (accounts/execution/executor.py):
+# 'warm' (fork-server + Java harness), 'local' (a plain subprocess per run), or 'socket'
+# (hand every run to `manage.py exec_worker` listening on EXECUTION_WORKER_SOCKET)
+EXECUTION_BACKEND = os.environ.get('EXECUTION_BACKEND', 'warm')
+EXECUTION_WORKER_SOCKET = os.environ.get('EXECUTION_WORKER_SOCKET', '/tmp/quiz_exec_worker.sock')
+# Seconds per compile and per test case run, the same for Run previews and final grading
+EXECUTION_COMPILE_TIMEOUT = int(os.environ.get('EXECUTION_COMPILE_TIMEOUT', 30))
+EXECUTION_RUN_TIMEOUT = int(os.environ.get('EXECUTION_RUN_TIMEOUT', 5))
+
+# Run previews stop at the first failing test case (likeliest failures run first);
+# a request can still send "fail_fast": false. Final grading always runs every case.
+EXECUTION_PREVIEW_FAIL_FAST = os.environ.get('EXECUTION_PREVIEW_FAIL_FAST', 'true').lower() == 'true'
+
+# Compiler flags per toolchain and profile: 'preview' builds for Run, 'grading' builds for
+# final scores (must stay fixed during a round so efficiency marks are comparable).
+# Leave empty for the defaults: C -O0 / -O2, Java no extra flags. Example:
+#   COMPILE_PROFILES = {'c': {'preview': ['-O0'], 'grading': ['-O2', '-std=gnu11']}}
+COMPILE_PROFILES = {}
+
+# Java compiles go to a resident javac (accounts/execution/java_compiler.py) that each worker
+# keeps warm, instead of starting a javac JVM per compile; falls back to javac if it is down
+JAVA_COMPILE_DAEMON_ENABLED = os.environ.get('JAVA_COMPILE_DAEMON_ENABLED', 'true').lower() == 'true'
+
+# Questions with a reference solution can be calibrated (`manage.py calibrate_limits`, see
+# accounts/execution/calibration.py): CPU limit = slowest reference case x this multiplier,
+# scaled per language by CALIBRATION_LANGUAGE_FACTORS. Uncalibrated questions use EXECUTION_RUN_TIMEOUT.
+CALIBRATION_TIME_MULTIPLIER = float(os.environ.get('CALIBRATION_TIME_MULTIPLIER', 3))
+CALIBRATION_LANGUAGE_FACTORS = {'c': 1.0, 'java': 1.5, 'python': 5.0}